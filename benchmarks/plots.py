@@ -0,0 +1,371 @@
+"""
+Per-plot benchmark suite on synthetic samples.
+
+Every plot class is rendered on synthetic salt output files (see ``gnn-plots synth``) of several
+sizes, each run in a fresh process with the derived-column cache disabled. The wall time of each
+run is split into the phases of a plot from its traced stages (see ``plotter.tracing``):
+
+    load      opening the sample files and reading their columns
+    draw      drawing of the figures
+    save      writing of the figures
+    compute   everything else: histograms, efficiencies, matrices
+
+together with the peak resident memory of the process and its growth during the run. With
+``--draft`` every plot is also rendered in draft mode (see ``plotter.draft``), reported as
+``<plot>:draft``, so that the draft and final timings can be compared. Results can be stored as
+a JSON baseline and later runs compared against it, flagging the regressions.
+
+    python benchmarks/plots.py [--scales 10000,100000] [--plots roc,jetpt] [--repeat 3]
+    python benchmarks/plots.py --draft [--draft-dpi 72]
+    python benchmarks/plots.py --save-baseline
+    python benchmarks/plots.py --compare [--tolerance 0.25]
+"""
+
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+
+import yaml
+
+from plotter.draft import DRAFT_DPI
+from plotter.synthetic import GENERATOR_VERSION, make_sample
+from plotter.tracing import peak_rss, recorded_events, reset_peak_rss
+
+
+# jets of the synthetic samples of each default scale
+DEFAULT_SCALES = (10_000, 100_000)
+
+# default baseline file
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# relative slowdown of a phase, or growth of the memory, flagged as a regression
+DEFAULT_TOLERANCE = 0.25
+
+# phases are compared with at least this time, shorter ones being too noisy, in seconds
+MIN_COMPARED_TIME = 0.05
+
+PHASES = ("load", "compute", "draw", "save")
+
+# phase of each traced stage, the time of a plot outside of them is compute
+STAGE_PHASES = {"open": "load", "read": "load", "draw": "draw", "savefig": "save"}
+
+STYLE = {
+    "figsize": (6, 5),
+    "atlas_second_tag": "Synthetic samples",
+    "fontsize": 13,
+    "label_fontsize": 13,
+    "dpi": 100,
+}
+
+# config of each benchmarked plot, the samples are filled in for each scale
+PLOTS = {
+    "roc": {
+        "class": "roc",
+        "samples": "both",
+        "file_name": "roc.png",
+        "target_label": "isDisplaced",
+        "range": (0.95, 1, 100),
+        "show_cuts": True,
+        "cut_values": [0.6, 0.8],
+        "leg_inside": True,
+        "leg_fontsize": 12,
+        "reference_label": "nominal",
+        "style": dict(STYLE, n_ratio_panels=0),
+    },
+    "discrim": {
+        "class": "discrim",
+        "samples": "jets",
+        "low": 0.0,
+        "high": 1.0,
+        "file_name": "discrim.png",
+        "style": dict(STYLE, logy=True),
+    },
+    "jetpt": {
+        "class": "jetpt",
+        "samples": "both",
+        "sig_eff_filename": "eff_pt.png",
+        "bkg_rej_filename": "rej_pt.png",
+        "working_point": 0.9,
+        "binedges": [0.2, 0.4, 0.8, 1.2, 2.25],
+        "sig_eff_leg_loc": "lower right",
+        "bkg_rej_leg_loc": "upper left",
+        "style": dict(STYLE, grid=True),
+    },
+    "num_vert": {
+        "class": "num_vert",
+        "samples": "both",
+        "sample_df_name": "tracks",
+        "sig_eff_filename": "eff_numvert.png",
+        "bkg_rej_filename": "rej_numvert.png",
+        "working_point": 0.9,
+        "binedges": [0, 1, 2, 3, 4, 6],
+        "sig_eff_leg_loc": "lower right",
+        "bkg_rej_leg_loc": "upper right",
+        "style": dict(STYLE, grid=True),
+    },
+    "confusion_matrix": {
+        "class": "confusion_matrix",
+        "samples": "tracks",
+        "task_type": "track_origin",
+        "style": dict(STYLE, xlabel="Predicted", ylabel="Truth", show_entries=True),
+    },
+    "sample_info": {
+        "class": "sample_info",
+        "samples": "both",
+        "file_name": "info.png",
+        "info_df_name": "tracks",
+        "info_type": "z0SinTheta",
+        "num_bins": 100,
+        "style": dict(STYLE, logy=True, in_TeV=False),
+    },
+    "num_vert_compare": {
+        "class": "num_vert_compare",
+        "samples": "tracks",
+        "filename": "numvert.pdf",
+        "max_val": 10,
+        "disp_only": True,
+        "style": dict(STYLE),
+    },
+    "vertex": {
+        "class": "vertex",
+        "samples": "tracks",
+        "file_name": "vi.png",
+        "jet_num": 20,
+        "zoom": True,
+        "style": dict(STYLE, figsize=(10, 5)),
+    },
+}
+
+
+def sample_paths(workdir, n_jets, max_tracks, max_vertices):
+    """
+    Return the paths of the reference and comparison samples of a scale, writing the missing ones.
+    """
+    paths = []
+    for seed in (1, 2):
+        name = f"synthetic-v{GENERATOR_VERSION}-{n_jets}-{max_tracks}-{max_vertices}-{seed}.h5"
+        path = os.path.join(workdir, name)
+        if not os.path.exists(path):
+            print(f"Writing {path}")
+            make_sample(path + ".tmp", n_jets, max_tracks, max_vertices, seed=seed)
+            os.replace(path + ".tmp", path)
+        paths.append(path)
+    return paths
+
+
+def plot_config(name, paths):
+    """
+    Return the config of a benchmarked plot on the given samples.
+    """
+    config = dict(PLOTS[name])
+    reference, other = paths
+    kind = config.pop("samples")
+    df_name = config.pop("sample_df_name", "jets")
+    if kind == "both":
+        config["samples"] = {
+            "A": {"path": reference, "label": "A", "reference": True, "df_name": df_name},
+            "B": {"path": other, "label": "B", "reference": False, "df_name": df_name},
+        }
+    else:
+        config["samples"] = {"path": reference, "label": "A", "df_name": kind}
+    return config
+
+
+def run_plot(config_file, output_dir, output, draft_dpi=None):
+    """
+    Render the plot of a config in this process and send its measurements to the output pipe,
+    as a draft of the given resolution if ``draft_dpi`` is set.
+    """
+    import matplotlib
+
+    from plotter.main import gnn_plots
+    from plotter.server import PLOTTING_MODULES
+
+    # imports are not part of the measurements
+    matplotlib.use("Agg")
+    for module_name in PLOTTING_MODULES:
+        importlib.import_module(module_name)
+
+    # the outputs are written in the working directory
+    os.makedirs(output_dir, exist_ok=True)
+    os.chdir(output_dir)
+
+    reset_peak_rss()
+    rss_before = peak_rss()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            failures = gnn_plots(
+                config_file, use_cache=False, draft_dpi=draft_dpi, force=True, trace="summary"
+            )
+        error = failures[0][1].strip().splitlines()[-1] if failures else None
+    except Exception as err:
+        error = repr(err)
+
+    result = dict.fromkeys(PHASES + ("total",), 0.0)
+    for event in recorded_events():
+        seconds = event["dur"] / 1e6
+        if event["cat"] == "plot":
+            result["total"] += seconds
+        elif event["cat"] in STAGE_PHASES:
+            result[STAGE_PHASES[event["cat"]]] += seconds
+    result["compute"] = max(0.0, result["total"] - sum(result[phase] for phase in PHASES))
+    peak = peak_rss() or 0
+    result["peak_mb"] = peak / 1024**2
+    result["growth_mb"] = (peak - (rss_before or 0)) / 1024**2
+    result["error"] = error
+    output.send(result)
+    output.close()
+
+
+def measure(config_file, output_dir, draft_dpi=None):
+    """
+    Render the plot of a config in a fresh process and return its measurements.
+    """
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=run_plot, args=(config_file, output_dir, sender, draft_dpi))
+    process.start()
+    sender.close()
+    try:
+        result = receiver.recv()
+    except EOFError:
+        result = {"error": f"benchmark process exited with code {process.exitcode}"}
+    process.join()
+    return result
+
+
+def median_result(results):
+    """
+    Median of each measurement over the repeated runs of a plot.
+    """
+    errors = [result["error"] for result in results if result.get("error")]
+    if errors:
+        return {"error": errors[0]}
+    keys = PHASES + ("total", "peak_mb", "growth_mb")
+    return {key: statistics.median(result[key] for result in results) for key in keys}
+
+
+def compare(results, baseline, tolerance):
+    """
+    Return the regressions of the results with respect to the baseline, as printable lines.
+    """
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None or "error" in base or "error" in result:
+            continue
+        for phase in PHASES + ("total",):
+            # short phases are compared with the noise floor rather than their own time
+            reference = max(base[phase], MIN_COMPARED_TIME)
+            if result[phase] > reference * (1 + tolerance):
+                regressions.append(
+                    f"{key}: {phase} {base[phase]:.3f} s -> {result[phase]:.3f} s "
+                    f"(+{result[phase] / reference - 1:.0%})"
+                )
+        if result["growth_mb"] > base["growth_mb"] * (1 + tolerance) + 10:
+            regressions.append(
+                f"{key}: memory growth {base['growth_mb']:.0f} MB -> {result['growth_mb']:.0f} MB"
+            )
+    return regressions
+
+
+def format_row(key, result):
+    if "error" in result:
+        return f"{key:<28}failed: {result['error']}"
+    times = "".join(f"{result[phase]:9.3f}" for phase in PHASES + ("total",))
+    return f"{key:<28}{times}{result['peak_mb']:10.0f}{result['growth_mb']:10.0f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-plot benchmark of gnn-plots")
+    parser.add_argument(
+        "--scales",
+        default=",".join(str(scale) for scale in DEFAULT_SCALES),
+        help="Comma separated numbers of jets of the samples",
+    )
+    parser.add_argument(
+        "--plots", default=",".join(PLOTS), help="Comma separated plots to benchmark"
+    )
+    parser.add_argument("--max-tracks", type=int, default=40, help="Track slots per jet")
+    parser.add_argument("--max-vertices", type=int, default=5, help="Vertices per emerging jet")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs of each plot")
+    parser.add_argument(
+        "--draft", action="store_true", help="Also render every plot in draft mode"
+    )
+    parser.add_argument(
+        "--draft-dpi",
+        type=int,
+        default=DRAFT_DPI,
+        help=f"Resolution of the drafts (default: {DRAFT_DPI})",
+    )
+    parser.add_argument(
+        "--workdir",
+        default=os.path.join(tempfile.gettempdir(), "gnn-plots-bench"),
+        help="Directory of the synthetic samples and outputs",
+    )
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="Store the results as the baseline"
+    )
+    parser.add_argument(
+        "--compare", action="store_true", help="Flag the regressions with respect to the baseline"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help=f"Relative slowdown flagged as a regression (default: {DEFAULT_TOLERANCE})",
+    )
+    args = parser.parse_args()
+
+    plots = args.plots.split(",")
+    unknown = set(plots) - set(PLOTS)
+    if unknown:
+        parser.error(f"unknown plots {', '.join(sorted(unknown))}, choose from {', '.join(PLOTS)}")
+
+    os.makedirs(args.workdir, exist_ok=True)
+    output_dir = os.path.join(args.workdir, "output")
+    config_file = os.path.join(args.workdir, "config.yaml")
+
+    header = "".join(f"{name:>9}" for name in PHASES + ("total",))
+    print(f"{'plot':<28}{header}   peak MB growth MB")
+    # draft resolution of every rendering of a plot, None for the final rendering
+    modes = [None, args.draft_dpi] if args.draft else [None]
+    results = {}
+    for scale in (int(scale) for scale in args.scales.split(",")):
+        paths = sample_paths(args.workdir, scale, args.max_tracks, args.max_vertices)
+        for name in plots:
+            with open(config_file, "w") as f:
+                # the tuples of the configs are written with the tags read by gnn-plots
+                yaml.dump({"output_dir": output_dir, "plots": {name: plot_config(name, paths)}}, f)
+            for draft_dpi in modes:
+                key = f"{name}@{scale}" if draft_dpi is None else f"{name}:draft@{scale}"
+                results[key] = median_result(
+                    [measure(config_file, output_dir, draft_dpi) for _ in range(args.repeat)]
+                )
+                print(format_row(key, results[key]))
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+
+    if args.compare:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions with respect to {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Startup-time benchmark of the gnn-plots command line.
+
+Runs ``--help``, ``--list-plots`` and ``--check`` on a config in fresh interpreters and fails if
+the median wall time of any of them exceeds the budget, or if they import the plotting stack.
+
+    python benchmarks/startup.py [--config configs/roc.yaml] [--budget 0.5] [--repeat 5]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+# default wall time budget of each command, in seconds
+DEFAULT_BUDGET = 0.5
+
+# modules the commands must not import
+PLOTTING_STACK = ("matplotlib", "puma", "pandas", "atlasify", "ftag")
+
+# runs the command line in-process, then reports the plotting modules it imported
+PROBE = """
+import sys
+sys.argv = ["gnn-plots"] + sys.argv[1:]
+from plotter.main import main
+try:
+    main()
+except SystemExit:
+    pass
+print("IMPORTED:" + ",".join(name for name in {stack} if name in sys.modules), file=sys.stderr)
+"""
+
+
+def run(args):
+    """
+    Run the command line with the given arguments in a fresh interpreter.
+
+    Returns:
+    -------
+        tuple of (wall time in seconds, list of the plotting modules imported)
+    """
+    probe = PROBE.format(stack=repr(PLOTTING_STACK))
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", probe, *args], capture_output=True, text=True, check=False
+    )
+    elapsed = time.perf_counter() - start
+    imported = result.stderr.rsplit("IMPORTED:", 1)[-1].strip()
+    return elapsed, [name for name in imported.split(",") if name]
+
+
+def main():
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description="Startup-time benchmark of gnn-plots")
+    parser.add_argument(
+        "--config",
+        default=os.path.join(repo, "configs", "roc.yaml"),
+        help="Config validated by the --check run",
+    )
+    parser.add_argument(
+        "--budget", type=float, default=DEFAULT_BUDGET, help="Wall time budget in seconds"
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="Number of runs of each command")
+    args = parser.parse_args()
+
+    commands = {
+        "--help": ["--help"],
+        "--list-plots": ["--list-plots"],
+        "--check": ["--config", args.config, "--check"],
+    }
+
+    failed = False
+    for label, command in commands.items():
+        times = []
+        for _ in range(args.repeat):
+            elapsed, imported = run(command)
+            times.append(elapsed)
+        median = statistics.median(times)
+        status = "ok"
+        if median > args.budget:
+            status = f"over budget ({args.budget:.2f} s)"
+            failed = True
+        if imported:
+            status = f"imports {', '.join(imported)}"
+            failed = True
+        print(f"{label:<14}{median:8.3f} s   {status}")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
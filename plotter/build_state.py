@@ -0,0 +1,146 @@
+"""
+Build state of the plots of a config, to skip the plots whose inputs did not change.
+
+For every plot the state records a hash of its resolved config block, the fingerprints of the
+sample files it reads and the modification times of the outputs it wrote. A plot is up to date
+when all three still match, and is re-rendered otherwise.
+"""
+
+import hashlib
+import json
+import os
+
+from plotter.cache import file_fingerprint
+from plotter.loader import normalize_path
+
+
+# name of the build state file in the output directory
+BUILD_STATE_FILE = ".gnn-plots-state.json"
+
+
+def config_hash(plot_config):
+    """
+    Return a hash of the resolved config block of a plot.
+
+    Parameters:
+    ----------
+        plot_config: dict of the config of the plot, including its class
+    Returns:
+    -------
+        hexadecimal hash string
+    """
+    key = json.dumps(plot_config, sort_keys=True, default=str)
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def input_paths(plot_config):
+    """
+    Return the sample files read by a plot, the ``path`` entries anywhere in its config.
+    """
+    paths = set()
+    if isinstance(plot_config, dict):
+        for key, value in plot_config.items():
+            if key == "path" and isinstance(value, str):
+                paths.add(normalize_path(value))
+            else:
+                paths.update(input_paths(value))
+    elif isinstance(plot_config, (list, tuple)):
+        for value in plot_config:
+            paths.update(input_paths(value))
+    return sorted(paths)
+
+
+def output_mtimes(outputs):
+    """
+    Return the modification times of the output files, None for the missing ones.
+    """
+    mtimes = {}
+    for output in outputs:
+        try:
+            mtimes[output] = os.stat(output).st_mtime_ns
+        except OSError:
+            mtimes[output] = None
+    return mtimes
+
+
+class BuildState:
+    """
+    Signatures of the plots rendered by previous runs, stored as a JSON file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path) as f:
+                self._plots = json.load(f)
+        except (OSError, ValueError):
+            self._plots = {}
+
+    def signature(self, plot_config):
+        """
+        Return the signature of a plot: the hash of its config and the fingerprints of its
+        input files.
+
+        Parameters:
+        ----------
+            plot_config: dict of the resolved config of the plot
+        Returns:
+        -------
+            JSON serialisable dict, or None if an input file cannot be fingerprinted
+        """
+        fingerprints = {}
+        for path in input_paths(plot_config):
+            try:
+                fingerprints[path] = file_fingerprint(path)
+            except OSError:
+                return None
+        return {"config": config_hash(plot_config), "inputs": fingerprints}
+
+    def is_up_to_date(self, name, signature, outputs):
+        """
+        Return True if a plot was rendered with the same signature and its outputs were not
+        modified since.
+
+        Parameters:
+        ----------
+            name: name of the plot in the config
+            signature: current signature of the plot
+            outputs: list of the output files of the plot, or None if they are not known
+        """
+        entry = self._plots.get(name)
+        if signature is None or outputs is None or entry is None:
+            return False
+        if entry["signature"] != signature or sorted(entry["outputs"]) != sorted(outputs):
+            return False
+        mtimes = output_mtimes(outputs)
+        return all(
+            mtime is not None and mtime == entry["outputs"][output]
+            for output, mtime in mtimes.items()
+        )
+
+    def record(self, name, signature, outputs):
+        """
+        Record the signature and the outputs of a plot that was rendered.
+        """
+        if signature is None or outputs is None:
+            self._plots.pop(name, None)
+            return
+        self._plots[name] = {"signature": signature, "outputs": output_mtimes(outputs)}
+
+    def forget(self, name):
+        """
+        Drop the record of a plot, so that it is rendered by the next run.
+        """
+        self._plots.pop(name, None)
+
+    def save(self):
+        """
+        Write the build state file.
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._plots, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
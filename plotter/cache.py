@@ -0,0 +1,234 @@
+"""
+Persistent cache of per-jet quantities derived from the sample files.
+
+Derived arrays are stored as compressed ``.npz`` files in a cache directory next to the plot
+output. Entries are keyed on a cheap fingerprint of the input file (size, modification time and
+a hash of its first and last blocks) together with the name and parameters of the derivation,
+so they are invalidated as soon as the input file changes. The least recently used entries are
+evicted once the cache grows beyond its size cap.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+from plotter.loader import normalize_path
+
+
+# size of the blocks hashed at the start and the end of a file to fingerprint it
+FINGERPRINT_BLOCK = 1 << 20
+
+# default size cap of the cache directory
+DEFAULT_CACHE_SIZE = 2 * 1024**3
+
+
+def file_fingerprint(path, block_size=FINGERPRINT_BLOCK):
+    """
+    Compute a cheap fingerprint of a file from its size, modification time and a hash of its
+    first and last blocks.
+
+    Parameters:
+    ----------
+        path: path to the file
+        block_size: number of bytes hashed at each end of the file
+    Returns:
+    -------
+        hexadecimal fingerprint string
+    """
+    stat = os.stat(path)
+    digest = hashlib.sha1(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+    with open(path, "rb") as f:
+        digest.update(f.read(block_size))
+        if stat.st_size > block_size:
+            f.seek(max(stat.st_size - block_size, block_size))
+            digest.update(f.read(block_size))
+    return digest.hexdigest()
+
+
+def write_entry(entry, write, mode="wb"):
+    """
+    Write a cache entry through a temporary file of its own, so that concurrent readers never
+    see partial entries and concurrent writers, in other processes or threads, never share a
+    temporary file.
+
+    Parameters:
+    ----------
+        entry: path of the cache file
+        write: function writing the content to an open file
+        mode: mode of the file, "wb" or "w"
+    """
+    # named after the process and the thread, as mkstemp would not honour the umask
+    tmp = f"{entry}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, mode) as f:
+            write(f)
+        os.replace(tmp, entry)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class DerivedCache:
+    """
+    Directory of cached derived arrays with least-recently-used eviction.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_CACHE_SIZE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._fingerprints = {}  # path -> fingerprint, computed once per run
+
+    def fingerprint(self, path):
+        """
+        Return the fingerprint of a sample file, computing it once per run.
+        """
+        path = normalize_path(path)
+        if path not in self._fingerprints:
+            self._fingerprints[path] = file_fingerprint(path)
+        return self._fingerprints[path]
+
+    def entry(self, path, name, params):
+        """
+        Return the cache file of a derivation of a sample file.
+
+        Parameters:
+        ----------
+            path: path to the sample file the quantity is derived from
+            name: name of the derived quantity
+            params: JSON serialisable dict of the parameters of the derivation
+        Returns:
+        -------
+            path of the .npz cache file
+        """
+        key = json.dumps([self.fingerprint(path), name, params], sort_keys=True, default=str)
+        return os.path.join(self.directory, f"{name}-{hashlib.sha1(key.encode()).hexdigest()}.npz")
+
+    def contains(self, path, name, params):
+        """
+        Return True if a derivation of a sample file is cached.
+        """
+        return os.path.exists(self.entry(path, name, params))
+
+    def get(self, path, name, params):
+        """
+        Return the cached arrays of a derivation, or None if they are not cached.
+        """
+        entry = self.entry(path, name, params)
+        try:
+            with np.load(entry) as data:
+                arrays = {key: data[key] for key in data.files}
+        except (OSError, ValueError):
+            return None
+
+        # the modification time records the last use of the entry for the eviction
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+        return arrays
+
+    def put(self, path, name, params, arrays):
+        """
+        Store the arrays of a derivation and evict old entries if the cache is too large.
+
+        Parameters:
+        ----------
+            path: path to the sample file the quantity is derived from
+            name: name of the derived quantity
+            params: JSON serialisable dict of the parameters of the derivation
+            arrays: dict of numpy arrays
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        entry = self.entry(path, name, params)
+
+        write_entry(entry, lambda f: np.savez_compressed(f, **arrays))
+
+        self.evict()
+
+    def get_or_compute(self, path, name, params, compute):
+        """
+        Return the cached arrays of a derivation, computing and storing them on a miss.
+
+        Parameters:
+        ----------
+            path: path to the sample file the quantity is derived from
+            name: name of the derived quantity
+            params: JSON serialisable dict of the parameters of the derivation
+            compute: function without arguments returning the dict of arrays
+        Returns:
+        -------
+            dict of numpy arrays
+        """
+        arrays = self.get(path, name, params)
+        if arrays is None:
+            arrays = compute()
+            self.put(path, name, params, arrays)
+        return arrays
+
+    def manifest(self, path, build, fields=None):
+        """
+        Return the statistics manifest of a sample file, building and storing it on a miss.
+        Manifests are stored as JSON entries keyed on the fingerprint of the file and the
+        scanned fields.
+
+        Parameters:
+        ----------
+            path: path to the sample file
+            build: function taking the path, and the ``fields`` keyword if they are given, and
+                returning the JSON serialisable manifest
+            fields: dict of the fields needed in every dataset, by default every field of every
+                dataset
+        Returns:
+        -------
+            manifest dict
+        """
+        fingerprint = self.fingerprint(path)
+        entries = [os.path.join(self.directory, f"manifest-{fingerprint}.json")]
+        if fields is not None:
+            # the manifest of the whole file, e.g. from gnn-plots index, also holds the fields
+            key = json.dumps({dataset: sorted(names) for dataset, names in fields.items()})
+            key = hashlib.sha1(key.encode()).hexdigest()
+            entries.append(os.path.join(self.directory, f"manifest-{fingerprint}-{key}.json"))
+        for entry in entries:
+            try:
+                with open(entry) as f:
+                    manifest = json.load(f)
+                os.utime(entry)
+                return manifest
+            except (OSError, ValueError):
+                pass
+
+        manifest = build(path) if fields is None else build(path, fields=fields)
+        os.makedirs(self.directory, exist_ok=True)
+        write_entry(entries[-1], lambda f: json.dump(manifest, f, indent=1), mode="w")
+
+        self.evict()
+        return manifest
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits in its size cap.
+        """
+        entries = []
+        for file_name in os.listdir(self.directory):
+            if not file_name.endswith((".npz", ".json")):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, file_name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, file_name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, file_name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, file_name))
+            except FileNotFoundError:
+                pass
+            total -= size
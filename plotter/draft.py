@@ -0,0 +1,115 @@
+"""
+Draft rendering mode, trading output quality for rendering speed while iterating on plots.
+
+In draft mode every figure is rendered with the Agg backend at a low resolution, without the
+extra layout pass of ``bbox_inches="tight"``, and with the artists drawing many elements
+(images, meshes and large scatter collections) rasterized in vector outputs. Draft outputs are
+written next to the final ones with a separate suffix, so they never overwrite them.
+
+All plot classes, and the puma plots they use, save their figures through
+``matplotlib.figure.Figure.savefig``, which is wrapped once when the mode is enabled.
+"""
+
+import functools
+import os
+
+
+# resolution of the draft outputs
+DRAFT_DPI = 72
+
+# suffix added to the file names of the draft outputs, before the extension
+DRAFT_SUFFIX = "_draft"
+
+# collections with more elements than this are rasterized in draft outputs
+RASTERIZE_MIN_ELEMENTS = 1000
+
+# settings of the enabled draft mode, None when rendering final outputs
+_DRAFT = None
+
+
+def draft_enabled():
+    """
+    Return True if the draft mode is enabled.
+    """
+    return _DRAFT is not None
+
+
+def output_name(file_name):
+    """
+    Return the name an output is written to, with the draft suffix in draft mode.
+
+    Parameters:
+    ----------
+        file_name: name of the final output
+    Returns:
+    -------
+        name of the output for the current mode
+    """
+    if _DRAFT is None:
+        return file_name
+    root, ext = os.path.splitext(os.fspath(file_name))
+    if root.endswith(DRAFT_SUFFIX):
+        return file_name
+    return f"{root}{DRAFT_SUFFIX}{ext}"
+
+
+def rasterize_heavy_artists(fig):
+    """
+    Rasterize the images, meshes and large collections of a figure, so that vector outputs
+    embed them as a single bitmap instead of one path per element.
+    """
+    from matplotlib.collections import Collection, QuadMesh
+    from matplotlib.image import AxesImage
+
+    for artist in fig.findobj():
+        if isinstance(artist, (AxesImage, QuadMesh)):
+            artist.set_rasterized(True)
+        elif isinstance(artist, Collection):
+            if len(artist.get_paths()) + len(artist.get_offsets()) > RASTERIZE_MIN_ELEMENTS:
+                artist.set_rasterized(True)
+
+
+def enable_draft(dpi=DRAFT_DPI):
+    """
+    Switch every following savefig call to draft rendering.
+
+    Parameters:
+    ----------
+        dpi: resolution of the draft outputs
+    """
+    global _DRAFT
+
+    import matplotlib
+    from matplotlib.figure import Figure
+
+    matplotlib.use("Agg", force=True)
+
+    # Figure.savefig is wrapped once, the wrapper renders final outputs while disabled
+    if not getattr(Figure.savefig, "draft_wrapper", False):
+        final_savefig = Figure.savefig
+
+        @functools.wraps(final_savefig)
+        def draft_savefig(fig, fname, *args, **kwargs):
+            if _DRAFT is None:
+                return final_savefig(fig, fname, *args, **kwargs)
+            kwargs["dpi"] = _DRAFT["dpi"]
+            if kwargs.get("bbox_inches") == "tight":
+                kwargs.pop("bbox_inches")
+            rasterize_heavy_artists(fig)
+            # file objects, e.g. the pages of a PdfPages, are named by their creator
+            if isinstance(fname, (str, os.PathLike)):
+                fname = output_name(fname)
+            return final_savefig(fig, fname, *args, **kwargs)
+
+        draft_savefig.draft_wrapper = True
+        Figure.savefig = draft_savefig
+
+    _DRAFT = {"dpi": dpi}
+
+
+def disable_draft():
+    """
+    Switch the following savefig calls back to final rendering.
+    """
+    global _DRAFT
+    _DRAFT = None
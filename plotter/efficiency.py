@@ -0,0 +1,223 @@
+"""
+Efficiencies and rejections of discriminant cuts in bins of a jet variable, from histograms
+filled chunk by chunk.
+
+The jets of each class are counted in a 2D histogram of (variable bin, cut interval), the cut
+intervals being delimited by the sorted cut values. A reverse cumulative sum along the cut axis
+then gives the number of jets passing every cut in every bin, so any number of working points is
+evaluated from a single pass over the jets. With a fine grid of cuts (see ``score_cuts``) the
+histogram also gives the per-bin quantiles of the signal discriminant, i.e. the cuts of a flat
+signal efficiency.
+
+The counts follow ``puma.VarVsEff``: the variable is binned with ``np.digitize``, jets outside
+the bins are dropped, a jet passes a cut if its discriminant is strictly greater than it, the
+comparison being done in the dtype of the discriminant, and jets with a NaN discriminant fail
+every cut.
+"""
+
+import numpy as np
+
+from plotter.roc import roc_bin_edges
+
+
+# default number of cuts of the grid of the flat-efficiency mode
+FLAT_SCORE_BINS = 10_000
+
+# uncertainties of the efficiencies and rejections
+UNCERTAINTIES = ("binomial", "clopper_pearson")
+
+# coverage of the Clopper-Pearson intervals, that of one standard deviation
+CLOPPER_PEARSON_COVERAGE = 0.6827
+
+
+def score_cuts(working_points, disc_dtype, n_bins=0):
+    """
+    Return the cuts delimiting the discriminant intervals of the histograms.
+
+    Parameters:
+    ----------
+        working_points: discriminant cuts that should be exact
+        disc_dtype: dtype of the discriminant, in which the cuts are compared
+        n_bins: number of cuts of the grid in [0, 1] added for the flat-efficiency mode, with
+            the binning of the streaming ROC histograms, 0 for none
+    Returns:
+    -------
+        increasing array of distinct cuts, in the dtype of the discriminant
+    """
+    cuts = np.asarray(working_points, dtype=disc_dtype)
+    if n_bins:
+        cuts = np.concatenate([cuts, roc_bin_edges(n_bins)[1:-1].astype(disc_dtype)])
+    return np.unique(cuts)
+
+
+def fill_cut_histogram(counts, bin_edges, cuts, x, disc):
+    """
+    Add jets to the counts of a (variable bin, cut interval) histogram.
+
+    Parameters:
+    ----------
+        counts: array of shape (len(bin_edges) - 1, len(cuts) + 1), updated in place
+        bin_edges: increasing bin edges of the variable
+        cuts: increasing cut values, in the dtype of the discriminant
+        x: array of the variable of the jets
+        disc: array of the discriminant of the jets
+    """
+    n_bins, n_intervals = counts.shape
+    x_bins = np.digitize(x, bin_edges) - 1
+    in_range = (x_bins >= 0) & (x_bins < n_bins)
+
+    # number of cuts the discriminant is strictly greater than
+    intervals = np.searchsorted(cuts, disc, side="left")
+    intervals[np.isnan(disc)] = 0
+
+    index = x_bins[in_range] * n_intervals + intervals[in_range]
+    counts += np.bincount(index, minlength=counts.size).reshape(counts.shape)
+
+
+def passing_counts(counts):
+    """
+    Return the number of jets passing every cut in every bin of a (variable bin, cut interval)
+    histogram.
+
+    Returns:
+    -------
+        (n_bins, n_cuts + 1) array, the first column being the total counts
+    """
+    return np.cumsum(counts[:, ::-1], axis=1)[:, ::-1]
+
+
+def clopper_pearson(n_pass, n_total, coverage=CLOPPER_PEARSON_COVERAGE):
+    """
+    Return the Clopper-Pearson intervals of binomial efficiencies, [0, 1] in the bins without
+    jets.
+
+    Parameters:
+    ----------
+        n_pass: array of the numbers of passing jets
+        n_total: array of the total numbers of jets
+        coverage: probability covered by the intervals
+    Returns:
+    -------
+        tuple of the arrays of lower and upper bounds
+    """
+    from scipy.special import betaincinv
+
+    n_pass = np.asarray(n_pass, dtype=np.float64)
+    n_fail = np.asarray(n_total, dtype=np.float64) - n_pass
+    alpha = (1 - coverage) / 2
+    with np.errstate(invalid="ignore"):
+        lower = np.where(n_pass > 0, betaincinv(n_pass, n_fail + 1, alpha), 0.0)
+        upper = np.where(n_fail > 0, betaincinv(n_pass + 1, n_fail, 1 - alpha), 1.0)
+    return lower, upper
+
+
+def binned_efficiency(n_pass, n_total, uncertainty="binomial"):
+    """
+    Return the efficiencies and their uncertainties, zero in the bins without jets. The binomial
+    uncertainties are those of ``puma.VarVsEff.efficiency``, the Clopper-Pearson ones are half
+    the width of the intervals.
+    """
+    n_pass = np.asarray(n_pass, dtype=np.float64)
+    n_total = np.asarray(n_total, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        eff = np.where(n_total > 0, n_pass / n_total, 0.0)
+        if uncertainty == "clopper_pearson":
+            lower, upper = clopper_pearson(n_pass, n_total)
+            err = np.where(n_total > 0, (upper - lower) / 2, 0.0)
+        else:
+            err = np.where(n_total > 0, np.sqrt(eff * (1 - eff) / n_total), 0.0)
+    return eff, err
+
+
+def binned_rejection(n_pass, n_total, uncertainty="binomial"):
+    """
+    Return the rejections and their uncertainties, NaN in the bins where no jet passes. The
+    binomial uncertainties are those of ``puma.VarVsEff.rejection``, the Clopper-Pearson ones are
+    half the width of the inverted efficiency intervals.
+    """
+    n_pass = np.asarray(n_pass, dtype=np.float64)
+    n_total = np.asarray(n_total, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rej = np.where(n_pass > 0, n_total / n_pass, np.nan)
+        if uncertainty == "clopper_pearson":
+            lower, upper = clopper_pearson(n_pass, n_total)
+            err = np.where(n_pass > 0, (1 / lower - 1 / upper) / 2, np.nan)
+        else:
+            eff = 1 / rej
+            err = rej**2 * np.sqrt(eff * (1 - eff) / n_total)
+    return rej, err
+
+
+class CutEfficiencies:
+    """
+    Signal efficiencies and background rejections of discriminant cuts in bins of a variable.
+    """
+
+    def __init__(self, bin_edges, cuts, sig_counts, bkg_counts, uncertainty="binomial"):
+        """
+        Parameters:
+        ----------
+            bin_edges: increasing bin edges of the variable
+            cuts: increasing cuts delimiting the intervals of the histograms, in the dtype of
+                the discriminant
+            sig_counts: (variable bin, cut interval) histogram of the signal jets
+            bkg_counts: same histogram of the background jets
+            uncertainty: "binomial" or "clopper_pearson"
+        """
+        if uncertainty not in UNCERTAINTIES:
+            raise ValueError(f"CutEfficiencies: unknown uncertainty '{uncertainty}'")
+        self.bin_edges = np.asarray(bin_edges, dtype=np.float64)
+        self.cuts = np.asarray(cuts)
+        self.uncertainty = uncertainty
+        self._sig = passing_counts(np.asarray(sig_counts))
+        self._bkg = passing_counts(np.asarray(bkg_counts))
+
+    @property
+    def bin_centres(self):
+        return (self.bin_edges[:-1] + self.bin_edges[1:]) / 2
+
+    @property
+    def bin_widths(self):
+        return self.bin_edges[1:] - self.bin_edges[:-1]
+
+    def _columns(self, cut):
+        """
+        Return the column of the passing counts of a cut, or of one cut per bin. A cut of -inf
+        keeps every jet.
+        """
+        n_bins = len(self.bin_edges) - 1
+        cut = np.broadcast_to(np.asarray(cut, dtype=self.cuts.dtype), (n_bins,))
+        columns = np.searchsorted(self.cuts, cut, side="left")
+        found = self.cuts[np.minimum(columns, len(self.cuts) - 1)] == cut
+        no_cut = np.isneginf(cut)
+        if not np.all(found | no_cut):
+            raise ValueError(f"CutEfficiencies: cuts {cut[~(found | no_cut)]} not in histograms")
+        return np.where(no_cut, 0, columns + 1)
+
+    def sig_eff(self, cut):
+        """
+        Return the signal efficiency of a cut, or of one cut per bin, in every bin with its
+        uncertainty.
+        """
+        n_pass = np.take_along_axis(self._sig, self._columns(cut)[:, None], axis=1)[:, 0]
+        return binned_efficiency(n_pass, self._sig[:, 0], self.uncertainty)
+
+    def bkg_rej(self, cut):
+        """
+        Return the background rejection of a cut, or of one cut per bin, in every bin with its
+        uncertainty.
+        """
+        n_pass = np.take_along_axis(self._bkg, self._columns(cut)[:, None], axis=1)[:, 0]
+        return binned_rejection(n_pass, self._bkg[:, 0], self.uncertainty)
+
+    def flat_cuts(self, sig_eff):
+        """
+        Return the cut of every bin giving a flat signal efficiency: the highest cut keeping at
+        least ``sig_eff`` of the signal jets of the bin, i.e. the quantile of the signal
+        discriminant at the resolution of the cuts. Bins without signal jets get -inf.
+        """
+        with np.errstate(divide="ignore", invalid="ignore"):
+            effs = self._sig / self._sig[:, :1]
+        # the efficiencies decrease with the cut, the passing cuts are the first ones
+        columns = np.maximum(np.sum(effs >= sig_eff, axis=1) - 1, 0)
+        return np.concatenate([[-np.inf], self.cuts])[columns].astype(self.cuts.dtype)
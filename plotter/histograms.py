@@ -0,0 +1,52 @@
+"""
+Streaming histogram helpers, filling counts chunk by chunk so that the histogrammed values are
+never held in memory at once. The counts follow puma's conventions, so they can be passed to
+``puma.Histogram`` as filled histograms.
+"""
+
+import numpy as np
+
+
+def fill_folded(counts, edges, values, weights=None):
+    """
+    Add values to histogram counts, folding the underflow into the first bin and the overflow
+    into the last one as puma's HistogramPlot does. NaN values are skipped.
+
+    Parameters:
+    ----------
+        counts: array of the counts of the len(edges) - 1 bins, updated in place, int64 or
+            float64 with weights
+        edges: increasing bin edges
+        values: array of values
+        weights: array of the weights of the values, of the same shape, or None
+    """
+    values = np.ravel(values).astype(np.float64)
+    filled = ~np.isnan(values)
+    if weights is not None:
+        weights = np.ravel(weights)[filled]
+    counts += np.histogram(
+        np.clip(values[filled], edges[0], edges[-1]), bins=edges, weights=weights
+    )[0]
+
+
+def update_range(value_range, values):
+    """
+    Extend a (min, max) range to cover the non-NaN values of an array.
+
+    Parameters:
+    ----------
+        value_range: tuple of (min, max), or None for an empty range
+        values: array of values
+    Returns:
+    -------
+        updated tuple of (min, max), or None if no value was seen yet
+    """
+    values = np.ravel(values)
+    if np.issubdtype(values.dtype, np.floating):
+        values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return value_range
+    low, high = values.min(), values.max()
+    if value_range is not None:
+        low, high = min(low, value_range[0]), max(high, value_range[1])
+    return low, high
@@ -0,0 +1,77 @@
+"""
+Columnar table of the jets of a sample, replacing the pandas DataFrames built by the plots.
+
+The columns are kept as the numpy arrays read from the HDF5 file, in their stored dtype and
+without copies. Missing values are handled with a validity mask instead of dropping rows, and
+the columns selected for a jet class are computed once and reused.
+"""
+
+import numpy as np
+
+
+class JetTable:
+    """
+    Numpy columns of the jets of a sample with the label of their class.
+    """
+
+    def __init__(self, columns, label="isDisplaced", valid_fields=None):
+        """
+        Parameters:
+        ----------
+            columns: dict mapping field name to numpy array, all of the same length
+            label: name of the field holding the class label of the jets
+            valid_fields: fields whose NaN entries make a jet invalid, all fields by default
+        """
+        self.columns = dict(columns)
+        self.label = label
+        self.valid_fields = list(self.columns) if valid_fields is None else list(valid_fields)
+
+        self._valid = None
+        self._masks = {}  # class label -> boolean mask of the valid jets of the class
+        self._selected = {}  # (field, class label) -> column of the valid jets of the class
+
+    def __len__(self):
+        return len(self.columns[self.label])
+
+    def __getitem__(self, field):
+        return self.columns[field]
+
+    @property
+    def valid(self):
+        """
+        Boolean mask of the jets without a NaN entry in any of the ``valid_fields``.
+        """
+        if self._valid is None:
+            valid = np.ones(len(self), dtype=bool)
+            for field in self.valid_fields:
+                column = self.columns[field]
+                if np.issubdtype(column.dtype, np.floating):
+                    valid &= ~np.isnan(column)
+            self._valid = valid
+        return self._valid
+
+    def mask(self, class_label):
+        """
+        Return the boolean mask of the valid jets with the given class label.
+        """
+        if class_label not in self._masks:
+            self._masks[class_label] = self.valid & (self.columns[self.label] == class_label)
+        return self._masks[class_label]
+
+    def select(self, field, class_label):
+        """
+        Return a column for the valid jets with the given class label, in the stored dtype.
+        The selection is computed once and shared between calls, so it must not be modified.
+
+        Parameters:
+        ----------
+            field: name of the column
+            class_label: value of the label field of the selected jets
+        Returns:
+        -------
+            numpy array of the selected entries
+        """
+        key = (field, class_label)
+        if key not in self._selected:
+            self._selected[key] = self.columns[field][self.mask(class_label)]
+        return self._selected[key]
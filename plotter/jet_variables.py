@@ -0,0 +1,109 @@
+"""
+Per-jet quantities derived from the tracks of the jets, computed block by block from the padded
+(n_jets, n_tracks) track arrays.
+"""
+
+import numpy as np
+
+
+# track fields needed to count true and predicted vertices per jet
+VERTEX_COUNT_FIELDS = (
+    "truthVertexIndex",
+    "truthOriginLabel",
+    "VertexIndex",
+    "valid",
+    "pileup",
+    "fake",
+    "prompt",
+    "displaced",
+)
+
+
+def count_unique_per_row(values, mask):
+    """
+    Count the distinct values in each row of a padded 2D array, only considering the entries
+    selected by the mask. Every row is sorted with the unselected entries pushed to its end, so
+    that the distinct values are the changes between adjacent selected entries.
+
+    Parameters:
+    ----------
+        values: (n_rows, n_columns) array
+        mask: boolean array of the same shape selecting the entries to count
+    Returns:
+    -------
+        array with the number of distinct selected values in each row
+    """
+    if np.issubdtype(values.dtype, np.integer):
+        fill = np.iinfo(values.dtype).max
+    else:
+        fill = np.inf
+    filled = np.where(mask, values, fill)
+    filled.sort(axis=1)
+
+    # the selected values are the first n_selected entries of each sorted row
+    n_selected = mask.sum(axis=1)
+    in_row = np.arange(1, values.shape[1]) < n_selected[:, None]
+    changes = (filled[:, 1:] != filled[:, :-1]) & in_row
+    return changes.sum(axis=1) + (n_selected > 0)
+
+
+def count_true_vertices(tracks, disp_only):
+    """
+    Count the true vertices of every jet in a block of tracks: the distinct truth vertex
+    indices of the tracks with a displaced truth origin (``disp_only``) or of all tracks with a
+    truth vertex.
+    """
+    truthVI = tracks["truthVertexIndex"]
+    if disp_only:
+        true_mask = tracks["truthOriginLabel"] == 3
+    else:
+        true_mask = truthVI >= 0
+    return count_unique_per_row(truthVI, true_mask)
+
+
+def count_pred_vertices(tracks, disp_only):
+    """
+    Count the predicted vertices of every jet in a block of tracks: the distinct vertex indices
+    of the valid tracks whose highest origin score is displaced, or displaced or prompt when not
+    ``disp_only``.
+    """
+    # a track is assigned to the vertices of the origin with the highest score
+    best = np.maximum.reduce(
+        [tracks["pileup"], tracks["fake"], tracks["prompt"], tracks["displaced"]]
+    )
+    pred_mask = tracks["displaced"] == best
+    if not disp_only:
+        pred_mask |= tracks["prompt"] == best
+    pred_mask &= tracks["valid"].astype(bool)
+    return count_unique_per_row(tracks["VertexIndex"], pred_mask)
+
+
+def count_jet_vertices(tracks, disp_only):
+    """
+    Count the true and predicted vertices of every jet in a block of tracks.
+
+    Parameters:
+    ----------
+        tracks: dict of (n_jets, n_tracks) arrays of the VERTEX_COUNT_FIELDS
+        disp_only: only count displaced vertices
+    Returns:
+    -------
+        tuple of (true number of vertices, predicted number of vertices) per jet
+    """
+    return count_true_vertices(tracks, disp_only), count_pred_vertices(tracks, disp_only)
+
+
+def count_tracks(tracks, disp_only):
+    """
+    Count the valid tracks of every jet in a block of tracks.
+    """
+    return tracks["valid"].astype(bool).sum(axis=1)
+
+
+# per-jet quantities derived from the tracks: name -> (track fields, function of a block of
+# tracks and of the disp_only option)
+TRACK_VARIABLES = {
+    "n_tracks": (("valid",), count_tracks),
+    "true_vertices": (("truthVertexIndex", "truthOriginLabel"), count_true_vertices),
+    "pred_vertices": (VERTEX_COUNT_FIELDS, count_pred_vertices),
+}
@@ -0,0 +1,408 @@
+"""
+Shared column loading for the plot classes.
+
+Every plot class declares the HDF5 columns it reads through ``PlotBase.requirements``. Before
+any plot runs, ``gnn_plots`` merges these requests into a plan, so that the first plot reading
+a dataset pulls the union of all planned fields in a single pass and the other plots are served
+from memory.
+"""
+
+import os
+import time
+from collections import namedtuple
+
+import h5py
+import numpy as np
+
+from plotter.progress import read_progress
+from plotter.tracing import span
+
+
+# default number of rows per chunk when streaming a dataset
+DEFAULT_CHUNK_ROWS = 100_000
+
+# a single read request: fields of a dataset in a file
+ColumnRequest = namedtuple("ColumnRequest", ["path", "dataset", "fields"])
+
+
+def normalize_path(path):
+    """
+    Return the canonical form of a sample path, so that two samples pointing at the same file
+    share their loaded columns.
+    """
+    return os.path.realpath(os.path.expanduser(path))
+
+
+def open_file(path):
+    """
+    Open an HDF5 sample file for reading.
+    """
+    with span("open", path=path):
+        return h5py.File(path, "r")
+
+
+def whole_chunk_rows(ds, chunk_rows):
+    """
+    Round a number of rows up to whole HDF5 chunks of a dataset, so that no chunk is
+    decompressed twice when it is read block by block.
+    """
+    if ds.chunks is not None:
+        return -(-chunk_rows // ds.chunks[0]) * ds.chunks[0]
+    return chunk_rows
+
+
+def coalesce_rows(rows, max_gap=1):
+    """
+    Split sorted row indices into groups of rows that can be read as one contiguous block.
+
+    Parameters:
+    ----------
+        rows: sorted array of unique row indices
+        max_gap: largest distance between consecutive rows of the same block
+    Returns:
+    -------
+        list of arrays of row indices, one per block
+    """
+    if len(rows) == 0:
+        return []
+    breaks = np.nonzero(np.diff(rows) > max_gap)[0] + 1
+    return np.split(rows, breaks)
+
+
+class ColumnStore:
+    """
+    In-memory table of the columns read from the sample files of a run.
+
+    Columns are kept per (file, dataset) as views into the structured array returned by h5py,
+    so reading several fields at once does not create extra copies. Datasets are loaded lazily
+    on first use and released once every plot that planned to read them has run.
+    """
+
+    def __init__(self, keep_loaded=False, max_kept_bytes=None):
+        """
+        Parameters:
+        ----------
+            keep_loaded: keep the datasets in memory once their plots have run, so that later
+                runs sharing the store do not read them again
+            max_kept_bytes: size cap of the kept datasets, the least recently used ones being
+                dropped beyond it, no cap by default
+        """
+        self.keep_loaded = keep_loaded
+        self.max_kept_bytes = max_kept_bytes
+        self._plan = {}  # (path, dataset) -> set of planned fields
+        self._consumers = {}  # (path, dataset) -> number of plots still to read it
+        self._columns = {}  # (path, dataset) -> {field: ndarray}
+        self._schemas = {}  # (path, dataset) -> (dtype, shape)
+
+    def plan(self, requests):
+        """
+        Register the column requests of one plot.
+
+        Parameters:
+        ----------
+            requests: iterable of ColumnRequest
+        """
+        keys = set()
+        for request in requests:
+            key = (normalize_path(request.path), request.dataset)
+            self._plan.setdefault(key, set()).update(request.fields)
+            keys.add(key)
+        for key in keys:
+            self._consumers[key] = self._consumers.get(key, 0) + 1
+
+    def release(self, requests):
+        """
+        Mark the requests of one plot as consumed, dropping datasets no other plot needs.
+
+        Parameters:
+        ----------
+            requests: iterable of ColumnRequest previously passed to ``plan``
+        """
+        keys = {(normalize_path(request.path), request.dataset) for request in requests}
+        for key in keys:
+            if key not in self._consumers:
+                continue
+            self._consumers[key] -= 1
+            if self._consumers[key] <= 0:
+                del self._consumers[key]
+                self._plan.pop(key, None)
+                if not self.keep_loaded:
+                    self._columns.pop(key, None)
+        if self.keep_loaded:
+            self.evict()
+
+    def loaded_bytes(self, key):
+        """
+        Return the in-memory size of the loaded columns of a (path, dataset) key.
+        """
+        return sum(column.nbytes for column in self._columns.get(key, {}).values())
+
+    def evict(self):
+        """
+        Drop the least recently used kept datasets until they fit in ``max_kept_bytes``. The
+        datasets that plots still plan to read are never dropped.
+        """
+        if self.max_kept_bytes is None:
+            return
+        total = sum(self.loaded_bytes(key) for key in self._columns)
+        # the columns are ordered from the least to the most recently used
+        for key in list(self._columns):
+            if total <= self.max_kept_bytes:
+                break
+            if key in self._consumers:
+                continue
+            total -= self.loaded_bytes(key)
+            del self._columns[key]
+
+    def drop(self, path):
+        """
+        Forget the columns and schemas read from a file, e.g. after it was modified.
+
+        Parameters:
+        ----------
+            path: path to the HDF5 file
+        """
+        path = normalize_path(path)
+        for table in (self._columns, self._schemas):
+            for key in [key for key in table if key[0] == path]:
+                del table[key]
+
+    def describe(self, path, dataset):
+        """
+        Return the dtype and shape of a dataset without reading any data.
+
+        Parameters:
+        ----------
+            path: path to the HDF5 file
+            dataset: name of the compound dataset
+        Returns:
+        -------
+            tuple of (numpy dtype, shape)
+        """
+        key = (normalize_path(path), dataset)
+        if key not in self._schemas:
+            with open_file(key[0]) as hdf_file:
+                self._schemas[key] = (hdf_file[dataset].dtype, hdf_file[dataset].shape)
+        return self._schemas[key]
+
+    def schema(self, path, dataset):
+        """
+        Return the field names of a compound dataset without reading any data.
+
+        Parameters:
+        ----------
+            path: path to the HDF5 file
+            dataset: name of the compound dataset
+        Returns:
+        -------
+            list of field names, in file order
+        """
+        return list(self.describe(path, dataset)[0].fields.keys())
+
+    def nbytes(self, path, dataset, fields):
+        """
+        Return the in-memory size of the requested columns of a dataset.
+        """
+        dtype, shape = self.describe(path, dataset)
+        return int(np.prod(shape)) * sum(dtype[field].itemsize for field in fields)
+
+    def preload(self, requests=None, min_consumers=2):
+        """
+        Read every planned dataset that at least ``min_consumers`` plots will use.
+
+        Parameters:
+        ----------
+            requests: only consider the datasets of these ColumnRequests, default all
+            min_consumers: minimum number of plots planning to read a dataset
+        Returns:
+        -------
+            number of bytes held in memory for the preloaded datasets
+        """
+        keys = None
+        if requests is not None:
+            keys = {(normalize_path(request.path), request.dataset) for request in requests}
+
+        loaded = 0
+        for (path, dataset), consumers in self._consumers.items():
+            if keys is not None and (path, dataset) not in keys:
+                continue
+            if consumers >= min_consumers:
+                fields = sorted(self._plan[(path, dataset)])
+                self.read(path, dataset, fields)
+                loaded += self.nbytes(path, dataset, fields)
+        return loaded
+
+    def is_loaded(self, path, dataset, fields):
+        """
+        Return True if all requested columns of a dataset are held in memory.
+        """
+        columns = self._columns.get((normalize_path(path), dataset), {})
+        return all(field in columns for field in fields)
+
+    def read(self, path, dataset, fields):
+        """
+        Return the requested columns of a dataset, reading the file only if they are not
+        already in memory. The first read of a dataset also pulls every field planned for it,
+        in blocks of whole HDF5 chunks so that its progress is reported as it goes.
+
+        Parameters:
+        ----------
+            path: path to the HDF5 file
+            dataset: name of the compound dataset
+            fields: iterable of field names
+        Returns:
+        -------
+            dict mapping field name to numpy array
+        """
+        key = (normalize_path(path), dataset)
+        # move the dataset to the end of the least recently used order
+        columns = self._columns.pop(key, {})
+        self._columns[key] = columns
+
+        missing = [field for field in fields if field not in columns]
+        if missing:
+            planned = [field for field in self._plan.get(key, ()) if field not in columns]
+            to_read = sorted(set(missing) | set(planned))
+            with open_file(key[0]) as hdf_file, span("read", dataset, path=key[0]) as args:
+                ds = hdf_file[dataset]
+                data = np.empty(ds.shape, dtype=ds.fields(to_read)[0:0].dtype)
+                chunk_rows = whole_chunk_rows(ds, DEFAULT_CHUNK_ROWS)
+                progress = read_progress(key[0], dataset, ds.shape[0], ds)
+                try:
+                    for start in range(0, ds.shape[0], chunk_rows):
+                        begin = time.perf_counter()
+                        block = data[start : start + chunk_rows]
+                        block[...] = ds.fields(to_read)[start : start + chunk_rows]
+                        progress.update(len(block), time.perf_counter() - begin)
+                finally:
+                    progress.close()
+                args.update(rows=len(data), bytes=data.nbytes)
+            for field in to_read:
+                columns[field] = data[field]
+
+        return {field: columns[field] for field in fields}
+
+    def read_rows(self, path, dataset, fields, rows):
+        """
+        Return selected rows of the requested columns. Rows are taken from memory when the
+        columns are already loaded, otherwise only those rows are read from the file. A list of
+        rows is read in increasing order as a few contiguous blocks, and returned in the
+        requested order.
+
+        Parameters:
+        ----------
+            path: path to the HDF5 file
+            dataset: name of the compound dataset
+            fields: iterable of field names
+            rows: row index, slice or list of row indices
+        Returns:
+        -------
+            dict mapping field name to numpy array
+        """
+        key = (normalize_path(path), dataset)
+        columns = self._columns.get(key, {})
+
+        if all(field in columns for field in fields):
+            return {field: columns[field][rows] for field in fields}
+
+        with open_file(key[0]) as hdf_file, span("read", dataset, path=key[0]) as args:
+            ds = hdf_file[dataset]
+            start = time.perf_counter()
+            if isinstance(rows, (int, np.integer, slice)):
+                data = ds.fields(list(fields))[rows]
+            else:
+                rows = np.asarray(rows, dtype=np.int64)
+                unique_rows = np.unique(rows)
+
+                # rows closer than an HDF5 chunk are read in the same block, as the chunk
+                # between them is decompressed anyway
+                max_gap = ds.chunks[0] if ds.chunks is not None else 1
+                blocks = []
+                for block in coalesce_rows(unique_rows, max_gap):
+                    data = ds.fields(list(fields))[block[0] : block[-1] + 1]
+                    blocks.append(data[block - block[0]])
+                data = np.concatenate(blocks) if blocks else ds.fields(list(fields))[0:0]
+                data = data[np.searchsorted(unique_rows, rows)]
+            n_read = data.shape[0] if data.ndim else 1
+            progress = read_progress(key[0], dataset, n_read, ds)
+            progress.update(n_read, time.perf_counter() - start)
+            progress.close()
+            args.update(rows=n_read, bytes=data.nbytes)
+        return {field: data[field] for field in fields}
+
+    def iter_chunks(self, path, dataset, fields, chunk_rows=DEFAULT_CHUNK_ROWS):
+        """
+        Iterate over consecutive row blocks of the requested columns. Blocks are sliced from
+        memory when the columns are already loaded, otherwise they are read from the file one at
+        a time, so that the memory used is bounded by the block size.
+
+        Parameters:
+        ----------
+            path: path to the HDF5 file
+            dataset: name of the compound dataset
+            fields: iterable of field names
+            chunk_rows: number of rows per block, rounded up to whole HDF5 chunks
+        Yields:
+        -------
+            dict mapping field name to numpy array for each block of rows
+        """
+        fields = list(fields)
+        key = (normalize_path(path), dataset)
+        columns = self._columns.get(key, {})
+
+        if all(field in columns for field in fields):
+            n_rows = len(columns[fields[0]]) if fields else 0
+            for start in range(0, n_rows, chunk_rows):
+                yield {field: columns[field][start : start + chunk_rows] for field in fields}
+            return
+
+        with open_file(key[0]) as hdf_file:
+            ds = hdf_file[dataset]
+            chunk_rows = whole_chunk_rows(ds, chunk_rows)
+            progress = read_progress(key[0], dataset, ds.shape[0], ds)
+            try:
+                for start in range(0, ds.shape[0], chunk_rows):
+                    with span("read", dataset, path=key[0]) as args:
+                        begin = time.perf_counter()
+                        data = ds.fields(fields)[start : start + chunk_rows]
+                        progress.update(len(data), time.perf_counter() - begin)
+                        args.update(rows=len(data), bytes=data.nbytes)
+                    yield {field: data[field] for field in fields}
+            finally:
+                progress.close()
+
+    def iter_rows(self, path, dataset, fields, rows, chunk_rows=DEFAULT_CHUNK_ROWS):
+        """
+        Iterate over selected rows of the requested columns in blocks. The dataset is walked in
+        windows of ``chunk_rows`` rows and only the selected rows of each window are read, as a
+        few contiguous blocks, so that the memory used is bounded by the window size.
+
+        Parameters:
+        ----------
+            path: path to the HDF5 file
+            dataset: name of the compound dataset
+            fields: iterable of field names
+            rows: sorted array of unique row indices
+            chunk_rows: number of dataset rows per window
+        Yields:
+        -------
+            dict mapping field name to numpy array of the selected rows of each window
+        """
+        fields = list(fields)
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows) == 0:
+            return
+
+        n_rows = self.describe(path, dataset)[1][0]
+        # the reads of the windows are reported as a single one
+        progress = read_progress(normalize_path(path), dataset, len(rows))
+        try:
+            for start in range(0, n_rows, chunk_rows):
+                low, high = np.searchsorted(rows, [start, start + chunk_rows])
+                if high > low:
+                    begin = time.perf_counter()
+                    chunk = self.read_rows(path, dataset, fields, rows[low:high])
+                    progress.update(high - low, time.perf_counter() - begin)
+                    yield chunk
+        finally:
+            progress.close()
@@ -1,10 +1,39 @@
 import argparse
+import json
 import yaml
 import sys
-import importlib
+import os
+import time
 
+from plotter.build_state import BUILD_STATE_FILE, BuildState, input_paths
+from plotter.cache import DEFAULT_CACHE_SIZE, DerivedCache
+from plotter.draft import DRAFT_DPI, disable_draft, enable_draft
+from plotter.loader import ColumnStore
+from plotter.manifest import build_manifest, format_manifest
+from plotter.progress import disable_progress, enable_progress, format_read_summary
+from plotter.registry import check_class, format_plot_classes, load_class, resolve_class
+from plotter.scheduler import parse_memory, run_parallel, run_serial
+from plotter.tracing import disable_tracing, enable_tracing, report
+
+# options of the run config that can also be set per plot
+SUBSAMPLE_KEYS = ("max_jets", "sample_fraction", "subsample_seed")
+
+# seconds between two polls of the watched files
+WATCH_INTERVAL = 2.0
+
+
+def load_config(config_file):
+    """
+    Read a YAML run config, exiting on syntax errors.
+
+    Parameters:
+    ----------
+        config_file: path to the YAML config file
+    Returns:
+    -------
+        dict of the run config
+    """
 
-def gnn_plots(config_file):
     def tuple_constructor(loader, node):
         """
         Custom constructor reading python tuples in yaml files
@@ -30,30 +59,443 @@ def gnn_plots(config_file):
         except Exception as err:
             print("A YAML exception occurred:\n", err)
             sys.exit(1)
+    return run_config
+
+
+def gnn_plots(
+    config_file,
+    jobs=1,
+    memory_budget=None,
+    use_cache=True,
+    draft_dpi=None,
+    force=False,
+    only=None,
+    store=None,
+    trace=None,
+    profile=False,
+    progress=False,
+):
+    # draft rendering must be set up before the plot classes import pyplot
+    if draft_dpi is not None:
+        enable_draft(draft_dpi)
+    else:
+        disable_draft()
+
+    run_config = load_config(config_file)
+
+    if only:
+        unknown = set(only) - set(run_config["plots"])
+        if unknown:
+            raise ValueError(f"No plots named {', '.join(sorted(unknown))} in {config_file}")
+
+    # plots whose config, inputs and outputs did not change since their last run are skipped
+    output_dir = run_config.get("output_dir", ".")
+    state = BuildState(os.path.join(output_dir, BUILD_STATE_FILE))
+
+    # the stages of every plot are traced for the report or the profiles
+    if trace is not None or profile:
+        enable_tracing(os.path.join(output_dir, "profiles") if profile else None)
+    else:
+        disable_tracing()
+
+    if progress:
+        enable_progress()
+    else:
+        disable_progress()
 
     # extracting the plot classes
-    for _, plot_config in run_config["plots"].items():
+    names = []
+    plot_objs = []
+    signatures = []
+    for name, plot_config in run_config["plots"].items():
+        if only and name not in only:
+            continue
         if "class" not in plot_config:
             raise ValueError("YAML configuration must contain a 'class' property")
         class_name = plot_config.pop("class")
-        module_name, class_name = class_name.rsplit(".", 1)
-        try:
-            module = importlib.import_module(module_name)
-            cls = getattr(module, class_name)
-        except (ImportError, AttributeError) as e:
-            raise ImportError(f"Cannot find class {class_name} in module {module_name}") from e
+        cls = load_class(class_name)
+        class_path = ".".join(resolve_class(class_name))
+
+        # the subsampling options of the config apply to every plot that does not set them
+        for key in SUBSAMPLE_KEYS:
+            if key in run_config:
+                plot_config.setdefault(key, run_config[key])
 
         # # make plot object from YAML config file plot configs
         plot_obj = cls(**plot_config)
-        plot_obj.plot()
+        signature = state.signature(dict(plot_config, **{"class": class_path, "draft": draft_dpi}))
+        if not force and state.is_up_to_date(name, signature, plot_obj.outputs()):
+            print(f"Plot '{name}' is up to date")
+            continue
+        names.append(name)
+        plot_objs.append(plot_obj)
+        signatures.append(signature)
+
+    # derived per-jet quantities are cached on disk between runs, keyed on the input files
+    cache = None
+    if use_cache:
+        cache = DerivedCache(
+            os.path.join(output_dir, ".gnn-plots-cache"),
+            parse_memory(run_config.get("cache_size", DEFAULT_CACHE_SIZE)),
+        )
+
+    # plan the reads of all plots, so each dataset is read once and shared between plots
+    if store is None:
+        store = ColumnStore()
+    requirements = []
+    for plot_obj in plot_objs:
+        plot_obj.store = store
+        plot_obj.cache = cache
+        requirements.append(plot_obj.column_requests())
+        store.plan(requirements[-1])
+
+    if jobs > 1:
+        failures = run_parallel(names, plot_objs, requirements, store, jobs, memory_budget)
+    else:
+        failures = run_serial(names, plot_objs, requirements, store)
+
+    # record the rendered plots, the failed ones are rendered again by the next run
+    failed = {name for name, _ in failures}
+    for name, plot_obj, signature in zip(names, plot_objs, signatures):
+        if name in failed:
+            state.forget(name)
+        else:
+            state.record(name, signature, plot_obj.outputs())
+    state.save()
+
+    # report the plots that failed once all the others are done
+    for name, error in failures:
+        print(f"Plot '{name}' failed:\n{error}")
+    if failures:
+        print(f"{len(failures)} of {len(plot_objs)} plots failed")
+
+    if progress:
+        summary = format_read_summary()
+        if summary is not None:
+            print(summary)
+
+    if trace is not None:
+        report(trace, output_dir)
+
+    return failures
+
+
+def validate_config(run_config):
+    """
+    Check the structure of a run config and the plot classes it names, without importing them.
+
+    Parameters:
+    ----------
+        run_config: dict of the run config
+    Returns:
+    -------
+        list of error messages, empty if the config is valid
+    """
+    if not isinstance(run_config, dict) or not isinstance(run_config.get("plots"), dict):
+        return ["YAML configuration must contain a 'plots' mapping"]
+
+    errors = []
+    for name, plot_config in run_config["plots"].items():
+        if not isinstance(plot_config, dict) or "class" not in plot_config:
+            errors.append(f"Plot '{name}': YAML configuration must contain a 'class' property")
+            continue
+        error = check_class(plot_config["class"])
+        if error is not None:
+            errors.append(f"Plot '{name}': {error}")
+    return errors
+
+
+def file_states(paths):
+    """
+    Return the size and modification time of files, None for the missing ones.
+    """
+    states = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            states[path] = (stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            states[path] = None
+    return states
+
+
+def watched_files(config_file):
+    """
+    Return the config file and the sample files referenced by its plots.
+    """
+    run_config = load_config(config_file)
+    return [config_file] + input_paths(run_config.get("plots", {}))
+
+
+def watch(config_file, interval=WATCH_INTERVAL, **options):
+    """
+    Render the plots of a config, then keep polling the config and the sample files and render
+    the affected plots again whenever they change. The loaded columns are kept in memory
+    between runs, so plots of unchanged files are not read from disk again.
+
+    Parameters:
+    ----------
+        config_file: path to the YAML config file
+        interval: seconds between two polls of the files
+        options: keyword arguments of ``gnn_plots``
+    """
+    store = ColumnStore(keep_loaded=True)
+    options = dict(options)
+    last = {}
+    while True:
+        # a config being edited can be invalid for a while, it is read again on the next change
+        try:
+            paths = watched_files(config_file)
+        except (Exception, SystemExit) as err:
+            print(f"Cannot read {config_file}: {err}")
+            paths = list(last) or [config_file]
+        current = file_states(paths)
+
+        if current != last:
+            # files still being written are only read once they stop changing
+            time.sleep(interval)
+            if file_states(paths) != current:
+                continue
+
+            # columns read from modified files are dropped, the others stay in memory
+            for path, file_state in current.items():
+                if path != config_file and last and last.get(path) != file_state:
+                    store.drop(path)
+            last = current
+
+            try:
+                gnn_plots(config_file, store=store, **options)
+            except (Exception, SystemExit) as err:
+                print(f"Plotting failed: {err}")
+            # --force only applies to the first run, later runs follow the changes
+            options["force"] = False
+            print(f"Watching {len(paths)} files for changes, press Ctrl+C to stop")
+
+        time.sleep(interval)
+
+
+def index(argv):
+    """
+    Entry point of ``gnn-plots index``, printing the statistics manifest of sample files and
+    storing it in the cache used by the plots.
+    """
+    parser = argparse.ArgumentParser(
+        prog="gnn-plots index", description="Compute the statistics manifest of sample files"
+    )
+    parser.add_argument("files", nargs="+", help="Paths to the HDF5 sample files")
+    parser.add_argument(
+        "--output-dir",
+        default="output",
+        help="Plot output directory whose cache stores the manifests (default: output)",
+    )
+    parser.add_argument("--json", action="store_true", help="Print the manifests as JSON")
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Do not read or write the cached manifests"
+    )
+    args = parser.parse_args(argv)
+
+    cache = DerivedCache(os.path.join(args.output_dir, ".gnn-plots-cache"))
+    for path in args.files:
+        manifest = build_manifest(path) if args.no_cache else cache.manifest(path, build_manifest)
+        print(json.dumps(manifest, indent=1) if args.json else format_manifest(manifest))
+
+
+def synth(argv):
+    """
+    Entry point of ``gnn-plots synth``, writing a synthetic salt output file.
+    """
+    from plotter.synthetic import make_sample
+
+    parser = argparse.ArgumentParser(
+        prog="gnn-plots synth", description="Write a synthetic salt output file"
+    )
+    parser.add_argument("file", help="Path of the HDF5 file to write")
+    parser.add_argument("--jets", type=int, default=100_000, help="Number of jets")
+    parser.add_argument(
+        "--max-tracks", type=int, default=40, help="Number of track slots per jet (default: 40)"
+    )
+    parser.add_argument(
+        "--max-vertices",
+        type=int,
+        default=5,
+        help="Maximum number of displaced vertices per emerging jet (default: 5)",
+    )
+    parser.add_argument(
+        "--signal-fraction", type=float, default=0.5, help="Fraction of emerging jets"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random generator")
+    args = parser.parse_args(argv)
+
+    make_sample(
+        args.file,
+        args.jets,
+        max_tracks=args.max_tracks,
+        max_vertices=args.max_vertices,
+        signal_fraction=args.signal_fraction,
+        seed=args.seed,
+    )
+
+
+def serve(argv):
+    """
+    Entry point of ``gnn-plots serve``, running the render server used by ``--remote``.
+    """
+    # the server imports this module, so it is only imported when used
+    from plotter import server
+
+    parser = argparse.ArgumentParser(
+        prog="gnn-plots serve", description="Render configs sent by gnn-plots --remote clients"
+    )
+    parser.add_argument(
+        "--socket",
+        default=server.DEFAULT_SOCKET,
+        help=f"Unix socket path (default: {server.DEFAULT_SOCKET})",
+    )
+    parser.add_argument(
+        "--column-cache",
+        type=parse_memory,
+        default=server.DEFAULT_COLUMN_CACHE,
+        help="Memory kept for sample columns between requests "
+        f"(default: {server.DEFAULT_COLUMN_CACHE})",
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        server.serve(args.socket, args.column_cache)
+    except KeyboardInterrupt:
+        pass
 
 
 def main():
+    # subcommands, the plots are made without one
+    commands = {"index": index, "serve": serve, "synth": synth}
+    if len(sys.argv) > 1 and sys.argv[1] in commands:
+        commands[sys.argv[1]](sys.argv[2:])
+        return
+
     parser = argparse.ArgumentParser(description="GNN Plots")
-    parser.add_argument("--config", help="Path to the YAML config file", required=True)
+    parser.add_argument("--config", help="Path to the YAML config file")
+    parser.add_argument(
+        "--list-plots", action="store_true", help="List the plot classes usable in configs"
+    )
+    parser.add_argument(
+        "--check", action="store_true", help="Validate the config without rendering any plot"
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=1, help="Number of plots rendered in parallel processes"
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=parse_memory,
+        default=None,
+        help="Memory available to parallel plots, e.g. 16G (default: physical memory)",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Do not read or write the derived-column cache"
+    )
+    parser.add_argument(
+        "--draft",
+        action="store_true",
+        help="Render fast low-resolution drafts, written with a '_draft' suffix",
+    )
+    parser.add_argument(
+        "--draft-dpi",
+        type=int,
+        default=DRAFT_DPI,
+        help=f"Resolution of the drafts (default: {DRAFT_DPI})",
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="Render all plots, even those that are up to date"
+    )
+    parser.add_argument(
+        "--only",
+        action="append",
+        metavar="PLOT",
+        help="Only render the plot with this name in the config, can be repeated",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and render the affected plots again when the config or data change",
+    )
+    parser.add_argument(
+        "--watch-interval",
+        type=float,
+        default=WATCH_INTERVAL,
+        help=f"Seconds between two checks of the watched files (default: {WATCH_INTERVAL})",
+    )
+    parser.add_argument(
+        "--remote",
+        action="store_true",
+        help="Render the config with a running 'gnn-plots serve' server",
+    )
+    parser.add_argument(
+        "--socket", default=None, help="Unix socket of the server used by --remote"
+    )
+    parser.add_argument(
+        "--trace",
+        choices=("summary", "chrome"),
+        default=None,
+        help="Trace the stages of every plot and print a summary table, or write a Chrome "
+        "trace to gnn-plots-trace.json in the output directory",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Write the cProfile stats of every plot to <output_dir>/profiles/<plot>.prof",
+    )
+    parser.add_argument(
+        "--progress",
+        action=argparse.BooleanOptionalAction,
+        default=None,
+        help="Report the progress and throughput of the sample reads, with a summary per file "
+        "at the end (default: when running in a terminal)",
+    )
     args = parser.parse_args()
 
-    gnn_plots(args.config)
+    if args.list_plots:
+        print(format_plot_classes())
+        return
+    if args.config is None:
+        parser.error("the following arguments are required: --config")
+    if args.check:
+        errors = validate_config(load_config(args.config))
+        for error in errors:
+            print(error)
+        if errors:
+            sys.exit(1)
+        print(f"{args.config} is valid")
+        return
+
+    options = dict(
+        jobs=args.jobs,
+        memory_budget=args.memory_budget,
+        use_cache=not args.no_cache,
+        draft_dpi=args.draft_dpi if args.draft else None,
+        force=args.force,
+        only=args.only,
+        trace=args.trace,
+        profile=args.profile,
+        progress=sys.stderr.isatty() if args.progress is None else args.progress,
+    )
+    if args.remote:
+        from plotter.server import DEFAULT_SOCKET, render_remote
+
+        failures = render_remote(args.config, args.socket or DEFAULT_SOCKET, **options)
+        if failures is None or failures:
+            sys.exit(1)
+        return
+
+    if args.watch:
+        try:
+            watch(args.config, args.watch_interval, **options)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    failures = gnn_plots(args.config, **options)
+    if failures:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,167 @@
+"""
+Per-file statistics manifest of the sample files.
+
+A manifest records, for every compound dataset of a file, its schema, its number of rows and,
+for every field, the number of NaN entries, the minimum and maximum and approximate quantiles.
+It also counts the jets of each class and the tracks of each truth origin. All of it is
+computed in one streaming pass over the file, and cached next to the derived columns, so plots
+can choose their binning or skip reading data from the statistics alone. Plots only scan the
+datasets and fields they need, ``gnn-plots index`` scans the whole file.
+"""
+
+import h5py
+import numpy as np
+
+from plotter.histograms import update_range
+from plotter.loader import DEFAULT_CHUNK_ROWS, ColumnStore, normalize_path
+
+
+# quantiles recorded for every numeric field
+MANIFEST_QUANTILES = (0.001, 0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99, 0.999)
+
+# approximate number of rows sampled to estimate the quantiles of a dataset
+QUANTILE_SAMPLE_ROWS = 100_000
+
+# fields whose values are counted, per dataset
+CLASS_FIELDS = {"jets": ("isDisplaced",), "tracks": ("truthOriginLabel",)}
+
+
+def dataset_names(path):
+    """
+    Return the names of the compound datasets at the top level of a file.
+    """
+    with h5py.File(normalize_path(path), "r") as hdf_file:
+        return [
+            name
+            for name, item in hdf_file.items()
+            if isinstance(item, h5py.Dataset) and item.dtype.names is not None
+        ]
+
+
+def _dataset_manifest(store, path, dataset, chunk_rows, fields=None):
+    """
+    Compute the statistics of the fields of one compound dataset, all by default, in a
+    streaming pass.
+    """
+    dtype, shape = store.describe(path, dataset)
+    fields = [field for field in dtype.names if fields is None or field in fields]
+    stride = max(1, shape[0] // QUANTILE_SAMPLE_ROWS)
+
+    ranges = {field: None for field in fields}
+    nans = {field: 0 for field in fields}
+    trues = {field: 0 for field in fields}
+    samples = {field: [] for field in fields}
+    classes = {field: {} for field in CLASS_FIELDS.get(dataset, ()) if field in fields}
+    n_valid = 0
+
+    start = 0
+    for chunk in store.iter_chunks(path, dataset, fields, chunk_rows):
+        n_rows = len(chunk[fields[0]])
+        # padded datasets only count the valid entries of their classes
+        valid = chunk["valid"].astype(bool) if "valid" in chunk else None
+        if valid is not None:
+            n_valid += int(valid.sum())
+
+        for field in fields:
+            values = chunk[field]
+            if values.dtype == bool:
+                trues[field] += int(values.sum())
+                continue
+            if np.issubdtype(values.dtype, np.floating):
+                nans[field] += int(np.isnan(values).sum())
+            ranges[field] = update_range(ranges[field], values)
+            # rows at a fixed stride, for the quantiles
+            samples[field].append(values[(-start) % stride :: stride].ravel())
+
+        for field, counts in classes.items():
+            labels = chunk[field] if valid is None else chunk[field][valid]
+            for label, count in zip(*np.unique(labels, return_counts=True)):
+                counts[str(label)] = counts.get(str(label), 0) + int(count)
+
+        start += n_rows
+
+    field_stats = {}
+    for field in fields:
+        stats = {"dtype": dtype[field].str, "shape": list(dtype[field].shape)}
+        if dtype[field] == bool:
+            stats["true"] = trues[field]
+        elif np.issubdtype(dtype[field], np.number):
+            stats["nan"] = nans[field]
+            if ranges[field] is not None:
+                stats["min"] = ranges[field][0].item()
+                stats["max"] = ranges[field][1].item()
+                sample = np.concatenate(samples[field]).astype(np.float64)
+                quantiles = np.nanquantile(sample, MANIFEST_QUANTILES)
+                stats["quantiles"] = {
+                    str(level): value for level, value in zip(MANIFEST_QUANTILES, quantiles.tolist())
+                }
+        field_stats[field] = stats
+
+    manifest = {"rows": int(shape[0]), "shape": list(shape), "fields": field_stats}
+    if "valid" in fields:
+        manifest["valid"] = n_valid
+    if classes:
+        manifest["classes"] = classes
+    return manifest
+
+
+def build_manifest(path, chunk_rows=DEFAULT_CHUNK_ROWS, fields=None):
+    """
+    Compute the statistics manifest of a sample file, reading every scanned dataset once in
+    chunks.
+
+    Parameters:
+    ----------
+        path: path to the HDF5 file
+        chunk_rows: number of rows read at a time
+        fields: dict of the fields scanned in every dataset, by default every field of every
+            compound dataset
+    Returns:
+    -------
+        JSON serialisable dict with the path of the file and the statistics of every scanned
+        dataset ("datasets")
+    """
+    if fields is None:
+        fields = dict.fromkeys(dataset_names(path))
+    store = ColumnStore()
+    datasets = {
+        dataset: _dataset_manifest(store, path, dataset, chunk_rows, dataset_fields)
+        for dataset, dataset_fields in fields.items()
+    }
+    return {"path": normalize_path(path), "datasets": datasets}
+
+
+def format_manifest(manifest):
+    """
+    Format a manifest as a human readable summary.
+
+    Parameters:
+    ----------
+        manifest: dict returned by ``build_manifest``
+    Returns:
+    -------
+        multi-line string
+    """
+    lines = [manifest["path"]]
+    for dataset, info in manifest["datasets"].items():
+        header = f"\n{dataset}: {info['rows']} rows, shape {tuple(info['shape'])}"
+        if "valid" in info:
+            header += f", {info['valid']} valid entries"
+        lines.append(header)
+        for field, counts in info.get("classes", {}).items():
+            counts = ", ".join(f"{label}: {count}" for label, count in sorted(counts.items()))
+            lines.append(f"  classes of {field}: {counts}")
+
+        lines.append(f"  {'field':<28}{'dtype':<8}{'nan':>10}{'min':>14}{'median':>14}{'max':>14}")
+        for field, stats in info["fields"].items():
+            if "true" in stats:
+                lines.append(f"  {field:<28}{stats['dtype']:<8}{'':>10}  {stats['true']} true")
+                continue
+            if "min" not in stats:
+                lines.append(f"  {field:<28}{stats['dtype']:<8}{stats.get('nan', 0):>10}")
+                continue
+            lines.append(
+                f"  {field:<28}{stats['dtype']:<8}{stats['nan']:>10}{stats['min']:>14.6g}"
+                f"{stats['quantiles']['0.5']:>14.6g}{stats['max']:>14.6g}"
+            )
+    return "\n".join(lines)
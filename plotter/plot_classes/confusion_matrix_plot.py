@@ -1,17 +1,94 @@
-from puma.utils import confusion_matrix
-from puma.matshow import MatshowPlot
 from plotter.config_dict import ConfigDict
-import h5py
+from plotter.draft import output_name
 import numpy as np
-import matplotlib.pyplot as plt
+from plotter.loader import DEFAULT_CHUNK_ROWS, ColumnRequest
 from plotter.plot_classes.plotbase import PlotBase
+from plotter.tracing import span
+
+# predicted track origin scores, in the order of the origin labels
+ORIGIN_SCORE_FIELDS = ("pileup", "fake", "prompt", "displaced")
+
+# track fields needed to build the track origin confusion matrix
+TRACK_ORIGIN_FIELDS = ("valid", "truthOriginLabel") + ORIGIN_SCORE_FIELDS
+
+# output file of the track origin confusion matrix
+CONFMAT_FILE_NAME = "TrackOriginConfMat.png"
 
 class ConfMatPlotBase(PlotBase):
 	"""
 	Subclass of PlotBase to plot either jet classification or track origin confusion matrices.
 	"""
 
+	def outputs(self):
+		return [output_name(CONFMAT_FILE_NAME)]
+
+	def requirements(self):
+		sample = ConfigDict(self.config.samples)
+		if self.is_cached(sample.path, "track_origin_counts", {"df_name": sample.df_name}):
+			return []
+		return [ColumnRequest(sample.path, sample.df_name, TRACK_ORIGIN_FIELDS)]
+
+	def count_track_origins(self, sample_config):
+		"""
+		Count the valid tracks of a sample for every pair of true and predicted origin. The tracks
+		are streamed in blocks of ``chunk_size`` jets, the predicted origin being the class with
+		the highest score.
+
+		Parameters:
+		----------
+			sample_config: ConfigDict of the sample
+		Returns:
+		-------
+			dict with the square matrix of track counts ("counts"), indexed by true then
+			predicted origin, weighted by jet when the sample is subsampled
+		"""
+		n_classes = len(ORIGIN_SCORE_FIELDS)
+		counts = np.zeros((n_classes, n_classes), dtype=np.int64)
+
+		# subsampled tracks are weighted by their jet, so the classes keep their proportions
+		jet_weights = self.jet_weights(sample_config.path)
+		if jet_weights is not None:
+			counts = counts.astype(np.float64)
+		start = 0
+
+		chunks = self.iter_chunks(
+			sample_config.path,
+			sample_config.df_name,
+			TRACK_ORIGIN_FIELDS,
+			self.config.get("chunk_size", DEFAULT_CHUNK_ROWS),
+		)
+		for chunk in chunks:
+			valid = np.asarray(chunk["valid"], dtype=bool)
+			true_origin = chunk["truthOriginLabel"][valid].astype(np.int64)
+
+			# most likely origin, ties going to the first class as in max()
+			scores = np.stack([chunk[field][valid] for field in ORIGIN_SCORE_FIELDS], axis=-1)
+			pred_origin = np.argmax(scores, axis=-1)
+
+			# grow the matrix if the truth labels go beyond the predicted classes
+			size = max(len(counts), int(true_origin.max(initial=-1)) + 1)
+			if size > len(counts):
+				counts = np.pad(counts, (0, size - len(counts)))
+
+			weights = None
+			if jet_weights is not None:
+				weights = np.broadcast_to(
+					jet_weights[start:start + len(valid)].reshape(-1, *([1] * (valid.ndim - 1))),
+					valid.shape,
+				)[valid]
+			start += len(valid)
+
+			counts += np.bincount(
+				true_origin * size + pred_origin, weights=weights, minlength=size * size
+			).reshape(size, size)
+
+		return {"counts": counts}
+
 	def plot(self):
+		import matplotlib.pyplot as plt
+		from puma.matshow import MatshowPlot
+		from puma.utils import confusion_matrix
+
 		# required parameters for vertex index plot base. Set in 'style' key in config
 		required_params = {
 			'xlabel',
@@ -35,43 +112,25 @@ class ConfMatPlotBase(PlotBase):
 
 		# EXTRACTING THE DATA
 		# -------------------
-		with h5py.File(sample.path, "r") as hdf_file:
-			task_type = self.config.task_type
-
-			ds_tfj = hdf_file[sample.df_name]
-
-			valid = np.array(ds_tfj['valid'])
-
-			# extract valid origin labels
-			true_origin = np.array(ds_tfj['truthOriginLabel'])[valid]
-			pred_pileup = np.array(ds_tfj['pileup'])[valid]
-			pred_fake = np.array(ds_tfj['fake'])[valid]
-			pred_prompt = np.array(ds_tfj['prompt'])[valid]
-			pred_disp = np.array(ds_tfj['displaced'])[valid]
-
-			# initialize predicted origin labels
-			pred_origin = np.empty(len(true_origin))
+		task_type = self.config.task_type
 
-			# update the pred_origin with most likely predicted track origins
-			for i, (pu, fk, pr, dp) in enumerate(zip(pred_pileup, pred_fake, pred_prompt, pred_disp)):
-				origin = max(pu, fk, pr, dp)
-				if origin == pu:
-					pred_origin[i] = 0
-				elif origin == fk:
-					pred_origin[i] = 1
-				elif origin == pr:
-					pred_origin[i] = 2
-				elif origin == dp:
-					pred_origin[i] = 3
+		params = {"df_name": sample.df_name}
+		counts = self.derived(
+			sample.path, "track_origin_counts", params, lambda: self.count_track_origins(sample)
+		)["counts"]
 
-			# compute the confusion matrix
-			confmat = confusion_matrix.confusion_matrix(targets=true_origin, predictions=pred_origin)
+		# compute the confusion matrix from the counts of every (true, predicted) origin pair
+		true_origin, pred_origin = np.indices(counts.shape).reshape(2, -1)
+		confmat = confusion_matrix.confusion_matrix(
+			targets=true_origin, predictions=pred_origin, sample_weights=counts.ravel()
+		)
 
 
 		# CONSTRUCTING THE FIGURE AND PLOTTING THE CONFUSION MATRIX
 		# ---------------------------------------------------------
 		confmatplot = MatshowPlot(**filtered_params, x_ticks_rotation=0, colormap=plt.cm.GnBu)
 
-		confmatplot.draw(confmat)
+		with span("draw"):
+			confmatplot.draw(confmat)
 
-		confmatplot.savefig("TrackOriginConfMat.png", dpi=filtered_params["dpi"])
\ No newline at end of file
+		confmatplot.savefig(CONFMAT_FILE_NAME, dpi=filtered_params["dpi"])
\ No newline at end of file
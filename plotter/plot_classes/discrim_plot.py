@@ -1,14 +1,12 @@
 """Produce histogram of discriminant from ej tagger output and labels"""
 
 import numpy as np
-import pandas as pd
-import h5py
 
-from ftag import Flavours
-from puma import Histogram, HistogramPlot
-from puma.utils import get_dummy_2_taggers, get_good_linestyles
 from plotter.config_dict import ConfigDict
+from plotter.jet_table import JetTable
+from plotter.loader import ColumnRequest
 from plotter.plot_classes.plotbase import PlotBase
+from plotter.tracing import span
 
 class DiscrimPlotBase(PlotBase):
 	"""
@@ -16,7 +14,21 @@ class DiscrimPlotBase(PlotBase):
 	and displaced jets' GN2ej scores over all test samples.
 	"""
 
+	def disc_key(self, sample):
+		"""
+		Return the name of the field holding the GN2ej displaced jet score
+		"""
+		return self.store.schema(sample.path, "jets")[-2]
+
+	def requirements(self):
+		sample = ConfigDict(self.config.samples)
+		return [ColumnRequest(sample.path, "jets", ("isDisplaced", self.disc_key(sample)))]
+
 	def plot(self):
+		from ftag import Flavours
+		from puma import Histogram, HistogramPlot
+		from puma.utils import get_good_linestyles
+
 		# required parameters for discriminant plot. Set in 'style' key in config
 		required_params = {
 			'logy',
@@ -36,53 +48,46 @@ class DiscrimPlotBase(PlotBase):
 		sample = ConfigDict(self.config.samples)
 
 		# extracting data and processing it
-		with h5py.File(sample.path, "r") as hdf_file:
-			ds = hdf_file['jets']
-
-			keys_list = list(ds.dtype.fields.keys())
-			GN2ej_pdispjet = keys_list[-2]
+		GN2ej_pdispjet = self.disc_key(sample)
+		ds = self.read_columns(sample.path, "jets", ("isDisplaced", GN2ej_pdispjet))
 
-			df = pd.DataFrame({'isDisplaced': np.array(ds['isDisplaced']).transpose(),
-							  'GN2ej_pdispjet': np.array(ds[GN2ej_pdispjet]).transpose()})
-			df = df.dropna()
-		    
-		    # defining boolean arrays to select the different flavour classes
-			is_pu = df["isDisplaced"] == 0
-			is_hs = df["isDisplaced"] == 1
-		    
-			linestyles = get_good_linestyles()[:2]
+		# jets with a missing label or score are skipped
+		table = JetTable(ds)
+		
+		linestyles = get_good_linestyles()[:2]
 
-			# initialize histogram plot
-			plot_histo = HistogramPlot(
-				bins=np.arange(0,1.001,0.01),
-				n_ratio_panels=0,
-				xlabel="GN3ej score",
-				ylabel="Normalized number of jets",
-				leg_ncol=1,
-				xmin=self.config.low,
-				xmax=self.config.high,
-				**filtered_params
-			)
+		# initialize histogram plot
+		plot_histo = HistogramPlot(
+			bins=np.arange(0,1.001,0.01),
+			n_ratio_panels=0,
+			xlabel="GN3ej score",
+			ylabel="Normalized number of jets",
+			leg_ncol=1,
+			xmin=self.config.low,
+			xmax=self.config.high,
+			**filtered_params
+		)
 
-			# add the histograms
-			plot_histo.add(
-				Histogram(
-					df[is_pu]["GN2ej_pdispjet"],
-					label='Prompt jets',
-					colour=Flavours["bjets"].colour,
-					linestyle=linestyles[0]
-				),
-				reference=False
-			)
-			plot_histo.add(
-				Histogram(
-					df[is_hs]["GN2ej_pdispjet"],
-					label="Emerging jets",
-					colour=Flavours["cjets"].colour,
-					linestyle=linestyles[1],
-				),
-				reference=False
-			)
+		# add the histograms
+		plot_histo.add(
+			Histogram(
+				table.select(GN2ej_pdispjet, 0),
+				label='Prompt jets',
+				colour=Flavours["bjets"].colour,
+				linestyle=linestyles[0]
+			),
+			reference=False
+		)
+		plot_histo.add(
+			Histogram(
+				table.select(GN2ej_pdispjet, 1),
+				label="Emerging jets",
+				colour=Flavours["cjets"].colour,
+				linestyle=linestyles[1],
+			),
+			reference=False
+		)
 
+		with span("draw"):
 			plot_histo.draw()
-			plot_histo.savefig(self.config.file_name, tansparent=False)
\ No newline at end of file
+		plot_histo.savefig(self.config.file_name, transparent=False)
\ No newline at end of file
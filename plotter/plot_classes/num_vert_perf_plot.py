@@ -1,130 +1,22 @@
-# from puma import VarVsEff, VarVsEffPlot
 from plotter.config_dict import ConfigDict
-import h5py
 import numpy as np
-from atlasify import atlasify
+from plotter.jet_variables import VERTEX_COUNT_FIELDS, count_jet_vertices
+from plotter.loader import DEFAULT_CHUNK_ROWS, ColumnRequest
 from plotter.plot_classes.plotbase import PlotBase
-from matplotlib import pyplot as plt
-from matplotlib import gridspec as gridspec
-from mpl_toolkits.axes_grid1.inset_locator import inset_axes
+from plotter.plot_classes.var_eff_plot import VarEffPlotBase
+from plotter.tracing import span
 
 
-class NumVertPerfPlotBase(PlotBase):
+class NumVertPerfPlotBase(VarEffPlotBase):
 	"""
-	Subclass of PlotBase to plot signal and background efficiency vs the number of displaced
-	or prompt vertices in the event.
+	Subclass of VarEffPlotBase to plot signal and background efficiency vs the number of true
+	vertices in the jet, or of predicted vertices with ``variable: pred_vertices``.
 	"""
 
-	def plot(self):
-		# INITIALIZING FIGURE PLOT BASE
-		# -----------------------------
-
-		# required parameters for plot figure
-		required_params = {
-			"grid",
-			"figsize",
-			"leg_loc",
-			"atlas_second_tag",
-			"y_scale",
-			"atlas_tag_outside"
-		}
-		# filtering out necessary parameters from config file
-		filtered_params = {
-			key: value for key, value in self.config.style.items() if key in required_params
-		}
-
-		# define the plots
-		plot_sig_eff = VarVsEffPlot(
-			mode = "sig_eff",
-			ylabel = "Emerging jet efficiency",
-			xlabel = r"Number of vertices in jet",
-			logy = False,
-			**filtered_params
-		)
-
-		plot_bkg_rej = VarVsEffPlot(
-			mode = "bkg_rej",
-			ylabel = "QCD jet rejection",
-			xlabel = r"Number of vertices in jet",
-			logy = False,
-			**filtered_params
-		)
-
-
-		# OPEN OUTPUT DATA FILES AND PROCESS THEM
-		# ---------------------------------------
-		for _, sample in self.config.samples.items():
-			sample_config = ConfigDict(sample)
-			with h5py.File(sample_config.path, "r") as hdf_file:
-				# jet information dataframe
-				ds_jet = pd.DataFrame(hdf_file["jets"][:])
-				jet_keys = list(hdf_file["jets"].dtype.fields.keys())
-
-				# track information data (cannot store in dataframe)
-				ds_tfj = hdf_file[sample_config.df_name]
-
-				# get the working point
-				wp = self.config.working_point
-
-				# string names for probability of displaced and prompt
-				pDisp = jet_keys[-2]
-				pPrompt = jet_keys[-1]
-
-				# obtain GNN discriminant values
-				discs_gnn = ds_jet[pDisp]
-
-				# define boolean arrays to select the different flavour classes
-				is_disp = ds_jet["isDisplaced"] == 1
-				is_prompt = ds_jet["isDisplaced"] == 0
-
-
-				# DETERMINE THE NUMBER OF TRUE VERTICES IN EACH SAMPLE
-				# ----------------------------------------------------
-				num_vertices = []
-
-				# truthVertexIndex ndarray
-				truthVI = np.asarray(ds_tfj["truthVertexIndex"])
-				
-				for i in range(len(truthVI)):
-					current = truthVI[i]
-					num_vertices.append(len(np.unique(current[current >= 0])))
-
-				num_vertices = np.asarray(num_vertices)
-
-
-				# DEFINE THE CURVES
-				# -----------------
-				gnn_ej = VarVsEff(
-					x_var_sig = num_vertices[is_disp],
-					disc_sig = discs_gnn[is_disp].values,
-					x_var_bkg = num_vertices[is_prompt],
-					disc_bkg = discs_gnn[is_prompt].values,
-					bins = self.config.binedges,
-					working_point = None,
-					disc_cut = wp,
-					label = sample_config.label,
-					linewidth = 1.2
-				)
-
-
-				# ADD THE CURVES TO THE PLOTS
-				# ---------------------------
-				plot_sig_eff.add(gnn_ej)
-				plot_sig_eff.leg_loc = self.config.sig_eff_leg_loc
-				plot_sig_eff.atlas_second_tag += f", Score > {wp}"
-
-				plot_bkg_rej.add(gnn_ej)
-				plot_bkg_rej.leg_loc = self.config.bkg_rej_leg_loc
-				plot_bkg_rej.atlas_second_tag += f", Score > {wp}"
-
-
-		# DRAW AND SAVE THE PLOTS
-		plot_sig_eff.draw()
-		plot_sig_eff.savefig(self.config.sig_eff_filename, transparent=False)
-
-		plot_bkg_rej.draw()
-		plot_bkg_rej.savefig(self.config.bkg_rej_filename, transparent=False)
+	variable = "true_vertices"
+	xlabel = r"Number of vertices in jet"
 
+	bkg_rej_logy = False
 
 
 class NumVertComparePlotBase(PlotBase):
@@ -132,7 +24,74 @@ class NumVertComparePlotBase(PlotBase):
 	Subclass to plot truth number of vertices against model predicted number of vertices
 	"""
 
+	def requirements(self):
+		sample_config = ConfigDict(self.config.samples)
+		# cached vertex counts do not need the tracks to be read again
+		params = self.count_params(sample_config)
+		if self.is_cached(sample_config.path, "num_vertices_compare", params):
+			return []
+		return [
+			ColumnRequest(sample_config.path, "jets", ("isDisplaced",)),
+			ColumnRequest(sample_config.path, sample_config.df_name, VERTEX_COUNT_FIELDS),
+		]
+
+	def count_params(self, sample_config):
+		"""
+		Return the parameters of the vertex counting of a sample, used as cache key
+		"""
+		return {"df_name": sample_config.df_name, "disp_only": bool(self.config.disp_only)}
+
+	def count_vertices(self, sample_config):
+		"""
+		Count the number of true and predicted vertices in each jet of a sample.
+
+		Parameters:
+		----------
+			sample_config: ConfigDict of the sample
+		Returns:
+		-------
+			dict with the true ("true") and predicted ("pred") number of vertices per jet, and
+			the jet weights ("weights") when the sample is subsampled
+		"""
+		ds_jet = self.read_columns(sample_config.path, "jets", ("isDisplaced",))
+
+		chunks = self.iter_chunks(
+			sample_config.path,
+			sample_config.df_name,
+			VERTEX_COUNT_FIELDS,
+			self.config.get("chunk_size", DEFAULT_CHUNK_ROWS),
+		)
+
+		# DETERMINE THE NUMBER OF TRUE AND PREDICTED VERTICES IN EACH JET
+		# ---------------------------------------------------------------
+		true_num_vert = []
+		pred_num_vert = []
+		start = 0
+		for chunk in chunks:
+			true_chunk, pred_chunk = count_jet_vertices(chunk, self.config.disp_only)
+			stop = start + len(true_chunk)
+			if self.config.disp_only:
+				# only keep the signal jets
+				is_disp = ds_jet["isDisplaced"][start:stop] == 1
+				true_chunk, pred_chunk = true_chunk[is_disp], pred_chunk[is_disp]
+			true_num_vert.append(true_chunk)
+			pred_num_vert.append(pred_chunk)
+			start = stop
+
+		num_vert = {"true": np.concatenate(true_num_vert), "pred": np.concatenate(pred_num_vert)}
+
+		# subsampled jets count for the jets of their class they stand for
+		jet_weights = self.jet_weights(sample_config.path)
+		if jet_weights is not None:
+			if self.config.disp_only:
+				jet_weights = jet_weights[ds_jet["isDisplaced"] == 1]
+			num_vert["weights"] = jet_weights
+		return num_vert
+
 	def plot(self):
+		from atlasify import atlasify
+		from matplotlib import pyplot as plt
+
 		# INITIALIZING FIGURE PLOT BASE
 		# -----------------------------
 
@@ -155,80 +114,20 @@ class NumVertComparePlotBase(PlotBase):
 		# EXTRACT THE DATA
 		# ----------------
 		sample_config = ConfigDict(self.config.samples)
-		with h5py.File(sample_config.path, "r") as hdf_file:
-			# track information data (cannot store in dataframe)
-			ds_jet = hdf_file["jets"]
-			ds_tfj = hdf_file[sample_config.df_name]
-
-			# DETERMINE THE NUMBER OF TRUE VERTICES IN EACH SAMPLE
-			# ----------------------------------------------------
-			# truthVertexIndex ndarray
-			if self.config.disp_only:
-				# obtain signal only jets
-				is_disp = np.array(ds_jet["isDisplaced"] == 1)
-				truthVI = np.asarray(ds_tfj["truthVertexIndex"])[is_disp]
-				truthOrigin = np.asarray(ds_tfj["truthOriginLabel"])[is_disp]
-				predVI = np.asarray(ds_tfj["VertexIndex"])[is_disp]
-				valid = np.asarray(ds_tfj["valid"])[is_disp]
-				pred_pileup = ds_tfj["pileup"][is_disp]
-				pred_fake = ds_tfj["fake"][is_disp]
-				pred_prompt = ds_tfj["prompt"][is_disp]
-				pred_disp = ds_tfj["displaced"][is_disp]
-			else:
-				# use all jets, both bkg and signal
-				truthVI = np.asarray(ds_tfj["truthVertexIndex"])
-				truthOrigin = np.asarray(ds_tfj["truthOriginLabel"])
-				predVI = np.asarray(ds_tfj["VertexIndex"])
-				valid = np.asarray(ds_tfj["valid"])
-				pred_pileup = ds_tfj["pileup"]
-				pred_fake = ds_tfj["fake"]
-				pred_prompt = ds_tfj["prompt"]
-				pred_disp = ds_tfj["displaced"]
-
-			# initialize lists to store number of unique vertices
-			true_num_vert = []
-			pred_num_vert = []
-
-			# loop through samples to determine number of unique vertices
-			for i in range(len(truthVI)):
-				# calculate number of true unique vertexes in each sample
-				true_current = truthVI[i]
-
-				# determine number of unique true dipslaced vertices
-				if self.config.disp_only:
-					origin_current = truthOrigin[i]
-					true_num_vert.append(len(np.unique(true_current[origin_current == 3])))
-				# determine number of unique true displaced and prompt vertices
-				else:
-					true_num_vert.append(len(np.unique(true_current[true_current >= 0])))
-
-				# calculate number of predicted unique vertexes in each sample
-				pred_current = predVI[i][valid[i]]
-				pu = pred_pileup[i][valid[i]]
-				fk = pred_fake[i][valid[i]]
-				pr = pred_prompt[i][valid[i]]
-				dp = pred_disp[i][valid[i]]
-
-				valid_pred = []	# list of tracks that are predicted to originate from prompt or displaced
-				for j in range(len(pred_current)):
-					origin = max(pu[j], fk[j], pr[j], dp[j])
-					# determine number of unique predicted displaced vertices
-					if self.config.disp_only:
-						if origin == dp[j]:
-							valid_pred.append(pred_current[j])
-					# determine number of unique displaced and prompt vertices
-					else:
-						if origin == pr[j] or origin == dp[j]:
-							valid_pred.append(pred_current[j])
-
-				pred_num_vert.append(len(np.unique(valid_pred)))
-
-			true_num_vert = np.asarray(true_num_vert)
-			pred_num_vert = np.asarray(pred_num_vert)
-
-
-			# PLOT THE MAIN DATA IN A SUBFIGURE
-			# ----------------------------
+		num_vert = self.derived(
+			sample_config.path,
+			"num_vertices_compare",
+			self.count_params(sample_config),
+			lambda: self.count_vertices(sample_config),
+		)
+		true_num_vert = num_vert["true"]
+		pred_num_vert = num_vert["pred"]
+		weights = num_vert.get("weights")
+
+
+		# PLOT THE MAIN DATA IN A SUBFIGURE
+		# ----------------------------
+		with span("draw"):
 			plt.figure(figsize=filtered_params["figsize"], dpi=filtered_params["dpi"])
 
 			atlasify("Simulation Internal", "$\sqrt{s}=13.6$ TeV, 51.8 fb$^{-1}$", 
@@ -240,6 +139,7 @@ class NumVertComparePlotBase(PlotBase):
 				true_num_vert, 
 				pred_num_vert, 
 				bins=[np.arange(-0.5,max(true_num_vert)+1.5,1), np.arange(-0.5,max(pred_num_vert)+1.5,1)],
+				weights=weights,
 				cmap="Blues",
 				density=False
 			)
@@ -272,8 +172,8 @@ class NumVertComparePlotBase(PlotBase):
 
 			cbar.ax.tick_params(labelsize=filtered_params["fontsize"])  # Set colorbar tick label size
 
-			plt.savefig(self.config.filename, 
-				dpi=filtered_params["dpi"],
-				bbox_inches="tight",
-			)
+		plt.savefig(self.config.filename, 
+			dpi=filtered_params["dpi"],
+			bbox_inches="tight",
+		)
 
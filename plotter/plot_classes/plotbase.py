@@ -1,10 +1,252 @@
+import os
+
+import numpy as np
+
 from plotter.config_dict import ConfigDict
+from plotter.draft import output_name
+from plotter.loader import DEFAULT_CHUNK_ROWS, ColumnStore
+from plotter.manifest import build_manifest
+from plotter.scheduler import map_ordered
+from plotter.subsample import stratified_rows, subsample_fraction
+from plotter.tracing import span
 
 
 class PlotBase:
+    # plots of selected jets set this to False, as the subsampling options would change them
+    subsampling = True
+
+    # config keys holding the names of the files written by a plot
+    output_keys = ("file_name", "filename", "sig_eff_filename", "bkg_rej_filename", "export_file")
+
     def __init__(self, **kwargs):
         # use ConfigDict to store kwargs
         self.config = ConfigDict(**kwargs)
 
+        # column store used to read sample data, replaced by a shared one in gnn_plots
+        self.store = ColumnStore()
+
+        # cache of derived per-jet quantities, set by gnn_plots
+        self.cache = None
+
+        # path -> (selected rows, weights) of the subsampled samples
+        self._subsamples = {}
+
+    def requirements(self):
+        """
+        Declare the HDF5 columns read by ``plot`` so they can be loaded together with those of
+        the other plots in the run.
+
+        Returns:
+        -------
+            list of ColumnRequest
+        """
+        return []
+
+    def outputs(self):
+        """
+        Return the files written by ``plot``, used to check whether a plot is up to date. Plots
+        whose outputs depend on the data return None, so they are always rendered.
+
+        Returns:
+        -------
+            list of file names, or None
+        """
+        return [
+            output_name(self.config[key]) if key != "export_file" else self.config[key]
+            for key in self.output_keys
+            if self.config.get(key) is not None
+        ]
+
+    def column_requests(self):
+        """
+        Return the column requests planned with the other plots of the run. Subsampled plots
+        only read their selected rows, so they do not plan any full read.
+        """
+        return [] if self.subsample_params() is not None else self.requirements()
+
+    def subsample_params(self):
+        """
+        Return the subsampling options of the plot, set with the ``max_jets``,
+        ``sample_fraction`` and ``subsample_seed`` keys, or None if all jets are used.
+        """
+        if not self.subsampling:
+            return None
+        max_jets = self.config.get("max_jets")
+        sample_fraction = self.config.get("sample_fraction")
+        if max_jets is None and sample_fraction is None:
+            return None
+        return {
+            "max_jets": max_jets,
+            "sample_fraction": sample_fraction,
+            "seed": self.config.get("subsample_seed", 0),
+        }
+
+    def subsample(self, path):
+        """
+        Return the jets of a sample selected by the subsampling options, stratified by
+        ``isDisplaced``. The selection only depends on the jet labels and the options, so every
+        plot with the same options reads the same jets.
+
+        Parameters:
+        ----------
+            path: path to the sample file
+        Returns:
+        -------
+            tuple of the sorted indices of the selected jets and their weights, or None if all
+            jets are used
+        """
+        params = self.subsample_params()
+        if params is None:
+            return None
+        if path not in self._subsamples:
+            labels = self.store.read_rows(path, "jets", ("isDisplaced",), slice(None))
+            labels = labels["isDisplaced"]
+            fraction = subsample_fraction(
+                len(labels), params["sample_fraction"], params["max_jets"]
+            )
+            self._subsamples[path] = stratified_rows(labels, fraction, params["seed"])
+        return self._subsamples[path]
+
+    def jet_weights(self, path):
+        """
+        Return the weight of every jet read from a sample, the number of jets of its class each
+        selected jet stands for, or None if all jets are used.
+        """
+        subsample = self.subsample(path)
+        return None if subsample is None else subsample[1]
+
+    def read_columns(self, path, dataset, fields):
+        """
+        Read columns of a dataset through the column store, keeping only the selected jets if
+        the plot is subsampled.
+
+        Parameters:
+        ----------
+            path: path to the HDF5 file
+            dataset: name of the compound dataset
+            fields: iterable of field names
+        Returns:
+        -------
+            dict mapping field name to numpy array
+        """
+        if self.subsample(path) is None:
+            return self.store.read(path, dataset, fields)
+
+        chunks = list(self.iter_chunks(path, dataset, fields))
+        return {field: np.concatenate([chunk[field] for chunk in chunks]) for field in fields}
+
+    def iter_chunks(self, path, dataset, fields, chunk_rows=DEFAULT_CHUNK_ROWS):
+        """
+        Iterate over blocks of rows of the requested columns, keeping only the selected jets if
+        the plot is subsampled. The selected rows are read as coalesced blocks of each chunk.
+
+        Parameters:
+        ----------
+            path: path to the HDF5 file
+            dataset: name of the compound dataset
+            fields: iterable of field names
+            chunk_rows: number of rows per block
+        Yields:
+        -------
+            dict mapping field name to numpy array for each block of rows
+        """
+        subsample = self.subsample(path)
+        if subsample is None:
+            yield from self.store.iter_chunks(path, dataset, fields, chunk_rows)
+        else:
+            yield from self.store.iter_rows(path, dataset, fields, subsample[0], chunk_rows)
+
+    def cache_params(self, params):
+        """
+        Return the cache key parameters of a derived quantity, including the subsampling
+        options when the plot is subsampled.
+        """
+        subsample_params = self.subsample_params()
+        if subsample_params is None:
+            return params
+        return dict(params, subsample=subsample_params)
+
+    def is_cached(self, path, name, params):
+        """
+        Return True if a derived quantity of a sample file is in the derived-column cache.
+        """
+        return self.cache is not None and self.cache.contains(
+            path, name, self.cache_params(params)
+        )
+
+    def derived(self, path, name, params, compute):
+        """
+        Return a derived quantity of a sample file, taken from the derived-column cache when
+        possible. Plots should only read the raw columns inside ``compute``, so that cache hits
+        skip both the read and the computation.
+
+        Parameters:
+        ----------
+            path: path to the sample file the quantity is derived from
+            name: name of the derived quantity
+            params: JSON serialisable dict of the parameters of the derivation
+            compute: function without arguments returning a dict of numpy arrays
+        Returns:
+        -------
+            dict of numpy arrays
+        """
+
+        def traced_compute():
+            with span("compute", name):
+                return compute()
+
+        if self.cache is None:
+            return traced_compute()
+        return self.cache.get_or_compute(path, name, self.cache_params(params), traced_compute)
+
+    def manifest(self, path, fields):
+        """
+        Return the statistics manifest of fields of a sample file, built in one streaming pass
+        over them on first use and cached with the derived quantities. Without a cache, building
+        the manifest would cost more than the reads it saves, so None is returned and plots fall
+        back to the data.
+
+        Parameters:
+        ----------
+            path: path to the sample file
+            fields: dict of the fields needed in every dataset
+        Returns:
+        -------
+            manifest dict, or None
+        """
+        if self.cache is None:
+            return None
+        return self.cache.manifest(path, build_manifest, fields)
+
+    def map_samples(self, func):
+        """
+        Apply ``func`` to the config of every sample concurrently, returning the results in the
+        order of the samples. The number of workers is set with the ``sample_workers`` key.
+
+        Datasets that other plots of the run also read are loaded once in this process and kept
+        for them. If every sample is then in memory the samples are processed in threads,
+        otherwise each sample is read and reduced in its own worker process, so ``func`` should
+        return reduced results rather than full columns.
+
+        Parameters:
+        ----------
+            func: function called with the ConfigDict of one sample
+        Returns:
+        -------
+            list of the results of ``func``, one per sample
+        """
+        samples = [ConfigDict(sample) for sample in self.config.samples.values()]
+        workers = self.config.get("sample_workers", min(len(samples), os.cpu_count() or 1))
+
+        requests = self.column_requests()
+        self.store.preload(requests)
+        # subsampled plots read their selected rows from the files
+        in_memory = self.subsample_params() is None and all(
+            self.store.is_loaded(request.path, request.dataset, request.fields)
+            for request in requests
+        )
+
+        return map_ordered(func, samples, workers, processes=not in_memory)
+
     def plot(self):
         raise NotImplementedError("Subclasses should implement this method")
@@ -1,19 +1,266 @@
-from puma import Roc, RocPlot
-from puma.metrics import calc_eff, calc_rej
 from plotter.config_dict import ConfigDict
-import h5py
 import numpy as np
-import matplotlib.pyplot as plt
-import pandas as pd
+from plotter.jet_table import JetTable
+from plotter.loader import DEFAULT_CHUNK_ROWS, ColumnRequest
+from plotter.roc import (
+    REFINEMENT_ROC_BINS,
+    STREAMING_ROC_BINS,
+    HistogramRoc,
+    RefinedRoc,
+    SortedRoc,
+    fill_histogram,
+    refine_histograms,
+    roc_bin_edges,
+)
 from plotter.plot_classes.plotbase import PlotBase
+from plotter.tracing import span
 
 def sci_notation_latex(x, precision=1):
+    if not np.isfinite(x):
+        return r"\infty"
     coeff = f"{x:.{precision}e}"
     base, exp = coeff.split("e")
     return rf"{base} \times 10^{{{int(exp):d}}}"
 
 class RocPlotBase(PlotBase):
+    def disc_key(self, sample_config):
+        """
+        Return the name of the field holding the GNN signal discriminant of a sample
+        """
+        # search for which key contains the GNN signal discriminant
+        for key in self.store.schema(sample_config.path, sample_config.df_name):
+            if "pdisp" in key:
+                return key
+
+    def disc_params(self, sample_config):
+        """
+        Return the parameters of the NaN-filtered discriminants of a sample, used as cache key
+        """
+        return {
+            "df_name": sample_config.df_name,
+            "target_label": self.config.target_label,
+            "disc": self.disc_key(sample_config),
+        }
+
+    def requirements(self):
+        # streamed samples are read in chunks rather than loaded with the other plots
+        if self.config.get("roc_mode", "memory") != "memory":
+            return []
+
+        requests = []
+        for sample in self.config.samples.values():
+            sample_config = ConfigDict(sample)
+            params = self.disc_params(sample_config)
+            # cached discriminants do not need to be read again
+            if self.is_cached(sample_config.path, "roc_sorted_discriminants", params):
+                continue
+            requests.append(
+                ColumnRequest(
+                    sample_config.path,
+                    sample_config.df_name,
+                    (self.config.target_label, params["disc"]),
+                )
+            )
+        return requests
+
+    def load_discriminants(self, sample_config):
+        """
+        Read the GNN discriminant of a sample and split it into sorted signal and background
+        discriminants, dropping the jets with a missing label or discriminant.
+
+        Parameters:
+        ----------
+            sample_config: ConfigDict of the sample
+        Returns:
+        -------
+            dict with the sorted signal ("sig") and background ("bkg") discriminants
+        """
+        target_label = self.config.target_label
+        pDisp = self.disc_key(sample_config)
+
+        table = JetTable(
+            self.read_columns(sample_config.path, sample_config.df_name, (target_label, pDisp)),
+            label=target_label,
+        )
+
+        # select the different flavour classes, skipping the jets with missing values
+        return {"sig": np.sort(table.select(pDisp, 1)), "bkg": np.sort(table.select(pDisp, 0))}
+
+    def cut_values(self):
+        """
+        Return the cut values shown on the curves, empty if the cuts are not shown
+        """
+        return np.asarray(self.config.cut_values if self.config.show_cuts else [], dtype=float)
+
+    def stream_discriminants(self, sample_config):
+        """
+        Read the GNN discriminant of a sample in chunks, split into signal and background jets
+        and dropping the jets with a missing label or discriminant.
+
+        Parameters:
+        ----------
+            sample_config: ConfigDict of the sample
+        Yields:
+        -------
+            tuple of (signal discriminants, background discriminants) for each chunk of jets
+        """
+        target_label = self.config.target_label
+        pDisp = self.disc_key(sample_config)
+
+        chunks = self.iter_chunks(
+            sample_config.path,
+            sample_config.df_name,
+            (target_label, pDisp),
+            self.config.get("chunk_size", DEFAULT_CHUNK_ROWS),
+        )
+        for chunk in chunks:
+            labels = np.asarray(chunk[target_label], dtype=float)
+            disc = chunk[pDisp]
+            keep = ~np.isnan(labels) & ~np.isnan(disc)
+            yield disc[keep & (labels == 1)], disc[keep & (labels == 0)]
+
+    def stream_histograms(self, sample_config, edges):
+        """
+        Fill histograms of the GNN discriminant of the signal and background jets of a sample,
+        reading the jets in chunks so that the memory does not depend on the sample size.
+
+        Parameters:
+        ----------
+            sample_config: ConfigDict of the sample
+            edges: bin edges of the histograms, starting at -inf and ending at inf
+        Returns:
+        -------
+            dict with the bin edges ("edges") and the signal ("sig") and background ("bkg")
+            counts
+        """
+        sig_counts = np.zeros(len(edges) - 1, dtype=np.int64)
+        bkg_counts = np.zeros(len(edges) - 1, dtype=np.int64)
+        for sig_disc, bkg_disc in self.stream_discriminants(sample_config):
+            fill_histogram(sig_counts, edges, sig_disc)
+            fill_histogram(bkg_counts, edges, bkg_disc)
+
+        return {"edges": edges, "sig": sig_counts, "bkg": bkg_counts}
+
+    def sample_roc(self, sample_config):
+        """
+        Build the ROC engine of a sample for the configured ``roc_mode``: "memory" sorts the
+        full discriminants, "streaming" fills fine-grained histograms chunk by chunk and
+        "exact_streaming" reads the jets twice to resolve the exact cuts from coarse histograms.
+
+        Parameters:
+        ----------
+            sample_config: ConfigDict of the sample
+        Returns:
+        -------
+            SortedRoc, HistogramRoc or RefinedRoc
+        """
+        roc_mode = self.config.get("roc_mode", "memory")
+        params = self.disc_params(sample_config)
+
+        if roc_mode == "memory":
+            discs = self.derived(
+                sample_config.path,
+                "roc_sorted_discriminants",
+                params,
+                lambda: self.load_discriminants(sample_config),
+            )
+            return SortedRoc(discs["sig"], discs["bkg"], presorted=True)
+
+        if roc_mode == "streaming":
+            # the cut values are bin edges, so that their efficiencies are exact
+            disc_dtype = self.store.describe(sample_config.path, sample_config.df_name)[0]
+            disc_dtype = disc_dtype[params["disc"]]
+            n_bins = self.config.get("roc_bins", STREAMING_ROC_BINS)
+            cuts = self.cut_values().astype(disc_dtype)
+            params.update({"roc_bins": n_bins, "cut_edges": cuts.tolist()})
+            hists = self.derived(
+                sample_config.path,
+                "roc_histograms",
+                params,
+                lambda: self.stream_histograms(sample_config, roc_bin_edges(n_bins, cuts)),
+            )
+            return HistogramRoc(hists["edges"], hists["sig"], hists["bkg"], disc_dtype)
+
+        if roc_mode == "exact_streaming":
+            # the curve is only exact at the queried efficiencies, which are part of the key
+            disc_dtype = self.store.describe(sample_config.path, sample_config.df_name)[0]
+            disc_dtype = disc_dtype[params["disc"]]
+            n_bins = self.config.get("roc_bins", REFINEMENT_ROC_BINS)
+            sig_eff = np.linspace(*self.config.range)
+            cuts = self.cut_values().astype(disc_dtype)
+            params.update(
+                {"roc_bins": n_bins, "sig_eff": sig_eff.tolist(), "cut_edges": cuts.tolist()}
+            )
+            hists = self.derived(
+                sample_config.path,
+                "roc_refined_histograms",
+                params,
+                lambda: refine_histograms(
+                    lambda: self.stream_discriminants(sample_config),
+                    sig_eff,
+                    cuts,
+                    disc_dtype,
+                    n_bins,
+                ),
+            )
+            return RefinedRoc(hists, disc_dtype)
+
+        raise ValueError(f"RocPlotBase: unknown roc_mode '{roc_mode}'")
+
+    def reduce_sample(self, sample_config):
+        """
+        Read one sample and reduce it to the points of its ROC curve and of its cut markers.
+
+        Parameters:
+        ----------
+            sample_config: ConfigDict of the sample
+        Returns:
+        -------
+            dict with the target efficiencies, the rejections and discriminant cuts at these
+            efficiencies, the number of background jets and the efficiencies and rejections of
+            the cut values
+        """
+        print(sample_config.path)
+        # all queries are answered from the sorted discriminants or their histograms
+        roc = self.sample_roc(sample_config)
+
+        # defining target efficiency
+        sig_eff = np.linspace(*self.config.range)
+
+        n_pu = roc.n_bkg
+
+        rej = roc.rej(sig_eff)
+
+        # calculate the efficiencies and rejections for the specific cut values
+        cut_values = self.cut_values()
+        cut_effs = roc.sig_eff(cut_values)
+        cut_rejs = roc.cut_rej(cut_values)
+
+        result = {
+            "sig_eff": sig_eff,
+            "rej": rej,
+            "cuts": roc.cuts(sig_eff),
+            "n_pu": n_pu,
+            "cut_values": cut_values,
+            "cut_effs": cut_effs,
+            "cut_rejs": cut_rejs,
+        }
+
+        # report the binning error of the approximate curves
+        if isinstance(roc, HistogramRoc):
+            result["rej_bounds"] = roc.rej_bounds(sig_eff)
+            finite = np.isfinite(result["rej_bounds"]).all(axis=0) & np.isfinite(rej)
+            error = np.abs(result["rej_bounds"][:, finite] - rej[finite]) / rej[finite]
+            print(
+                f"{sample_config.path}: binning error on the rejection below "
+                f"{error.max(initial=0):.2%}"
+            )
+
+        return result
+
     def plot(self):
+        from puma import Roc, RocPlot
+
         required_params = {
             "n_ratio_panels",
             "ymin",
@@ -33,106 +280,71 @@ class RocPlotBase(PlotBase):
         }
         roc_plot = RocPlot(**filtered_params)
 
-        for _, sample in self.config.samples.items():
+        # read and reduce the samples concurrently, then add the curves in config order
+        results = self.map_samples(self.reduce_sample)
+
+        # export the curves and cut points of every sample, keyed by sample name
+        if self.config.get("export_file"):
+            np.savez(
+                self.config.export_file,
+                **{
+                    f"{name}/{key}": np.asarray(value)
+                    for name, result in zip(self.config.samples, results)
+                    for key, value in result.items()
+                },
+            )
+
+        for sample, result in zip(self.config.samples.values(), results):
             sample_config = ConfigDict(sample)
-            print(sample_config.path)
-            with h5py.File(sample_config.path, "r") as hdf_file:
-                ds = hdf_file[sample_config.df_name]
-
-                target_label = self.config.target_label
-
-                # get attribute name for GNN ej score
-                keys_list = list(ds.dtype.fields.keys())
-
-                # search for which key contains the GNN signal discriminant
-                for i, key in enumerate(keys_list):
-                    if "pdisp" in key:
-                        pDisp = keys_list[i]
-                        break
-
-                df = pd.DataFrame(
-                    {
-                        target_label: np.array(ds[target_label]).transpose(),
-                        pDisp: np.array(ds[pDisp]).transpose(),
-                    }
-                )
-                df = df.dropna()
 
-                # defining boolean arrays to select the different flavour classes
-                is_pu = df[target_label] == 0
-                is_hs = df[target_label] == 1
+            # here the plotting of the roc starts
+            roc_plot.add_roc(
+                Roc(
+                    result["sig_eff"],
+                    result["rej"],
+                    n_test=result["n_pu"],
+                    rej_class="qcd",
+                    label=sample_config.label,
+                ),
+                reference=sample_config.reference,
+            )
+            # roc_plot.set_ratio_class(1, "qcd")
 
-                # defining target efficiency
-                sig_eff = np.linspace(*self.config.range)
+            # add cut values and background rejections if desired
+            if self.config.show_cuts:
+                cut_values = self.config.cut_values
+                cut_effs = result["cut_effs"]
+                cut_rejs = result["cut_rejs"]
 
-                n_pu = sum(is_pu)
+                # plot the cuts and the corresponding bkg rejs
+                markers = ['*', 'v', 's', 'P', 'X', 'd']
 
-                rej = calc_rej(
-                    df[is_hs][pDisp].values, df[is_pu][pDisp].values, sig_eff
-                )
+                assert len(cut_values) <= len(markers), \
+                f"RocPlotBase: too many cut values to plot, only {len(markers)} or less per ROC curve"
+
+                for i in range(len(cut_values)):
+                    cut = cut_values[i]
+                    eff = cut_effs[i]
+                    rej = cut_rejs[i]
+                    rej_str = sci_notation_latex(rej)
+
+                    roc_plot.axis_top.scatter(
+                        cut_effs[i], 
+                        cut_rejs[i], 
+                        s = 120,
+                        marker = markers[i],
+                        facecolors = list(roc_plot.label_colours.values())[-1],
+                        edgecolors = 'black',
+                        alpha=0.7,
+                        label = f"$p_{{\mathrm{{EJ}}}} > {cut:.2f}$:\n$\mathrm{{efficiency}}={eff:.3f}$\n$\mathrm{{rejection}}={rej_str}$",
+                        # label = r"$P_{{\\mathrm_{EJ}}}>$ {0:.2f}, rej. = {1:.2e}".format(cut_values[i], cut_rejs[i]),
+                        zorder = 99
+                    )
 
-                # here the plotting of the roc starts
-                roc_plot.add_roc(
-                    Roc(
-                        sig_eff,
-                        rej,
-                        n_test=n_pu,
-                        rej_class="qcd",
-                        label=sample_config.label,
-                    ),
-                    reference=sample_config.reference,
-                )
-                # roc_plot.set_ratio_class(1, "qcd")
-
-                # add cut values and background rejections if desired
-                if self.config.show_cuts:
-                    # calculate the efficiencies for the specific cut values
-                    if self.config.cut_values is not None:
-                        cut_values = self.config.cut_values
-
-                    sig_disc = df[is_hs][pDisp]     # convenient to store signal discriminants
-                    N_signal = len(sig_disc)
-
-                    cut_effs = []   # initialize array to store efficiencies from cut values
-                    cut_rejs = []   # initialize array to store corresponding bkg effs from cuts
-
-                    for cut in cut_values:
-                        true_pos = sig_disc[sig_disc >= cut]    # determine the signal that passes the cut
-                        eff_ = len(true_pos)/N_signal
-                        rej_ = calc_rej(
-                            df[is_hs][pDisp].values, df[is_pu][pDisp].values, eff_
-                        )
-                        cut_effs.append(eff_)
-                        cut_rejs.append(rej_)
-
-                    # plot the cuts and the corresponding bkg rejs
-                    markers = ['*', 'v', 's', 'P', 'X', 'd']
-
-                    assert len(cut_values) <= len(markers), \
-                    f"RocPlotBase: too many cut values to plot, only {len(markers)} or less per ROC curve"
-
-                    for i in range(len(cut_values)):
-                        cut = cut_values[i]
-                        eff = cut_effs[i]
-                        rej = cut_rejs[i]
-                        rej_str = sci_notation_latex(rej)
-
-                        roc_plot.axis_top.scatter(
-                            cut_effs[i], 
-                            cut_rejs[i], 
-                            s = 120,
-                            marker = markers[i],
-                            facecolors = list(roc_plot.label_colours.values())[-1],
-                            edgecolors = 'black',
-                            alpha=0.7,
-                            label = f"$p_{{\mathrm{{EJ}}}} > {cut:.2f}$:\n$\mathrm{{efficiency}}={eff:.3f}$\n$\mathrm{{rejection}}=2600$",
-                            # label = r"$P_{{\\mathrm_{EJ}}}>$ {0:.2f}, rej. = {1:.2e}".format(cut_values[i], cut_rejs[i]),
-                            zorder = 99
-                        )
-        
         roc_plot.reference_label = self.config.reference_label
 
-        roc_plot.draw()
+        with span("draw"):
+            roc_plot.draw()
 
         handles, labels = roc_plot.axis_top.get_legend_handles_labels()
 
@@ -1,10 +1,9 @@
-from puma import Histogram, HistogramPlot
-from puma.utils import get_good_linestyles
 from plotter.config_dict import ConfigDict
-import h5py
 import numpy as np
-import pandas as pd
+from plotter.histograms import fill_folded, update_range
+from plotter.loader import DEFAULT_CHUNK_ROWS, ColumnRequest
 from plotter.plot_classes.plotbase import PlotBase
+from plotter.tracing import span
 
 class SampleInfoPlotBase(PlotBase):
 	"""
@@ -12,7 +11,207 @@ class SampleInfoPlotBase(PlotBase):
 	plot in the config file.
 	"""
 
+	def requirements(self):
+		# only the jet labels are loaded with the other plots, the values are streamed
+		requests = []
+		for sample in self.config.samples.values():
+			requests.append(ColumnRequest(sample["path"], "jets", ("isDisplaced",)))
+		return requests
+
+	def info_chunks(self, sample_config):
+		"""
+		Read the requested information of one sample chunk by chunk, split into emerging and QCD
+		jets.
+
+		Parameters:
+		----------
+			sample_config: ConfigDict of the sample
+		Yields:
+		-------
+			tuple of (emerging jet values, QCD jet values, emerging jet weights, QCD jet weights)
+			for each chunk of jets, the weights of the values of the subsampled jets or None
+		"""
+		chunk_size = self.config.get("chunk_size", DEFAULT_CHUNK_ROWS)
+
+		# subsampled values are weighted by their jet, so the classes keep their proportions
+		jet_weights = self.jet_weights(sample_config.path)
+		start = 0
+
+		if self.config.info_df_name == "jets":
+			chunks = self.iter_chunks(
+				sample_config.path, "jets", ("isDisplaced", self.config.info_type), chunk_size
+			)
+			for chunk in chunks:
+				is_disp = chunk["isDisplaced"] == 1
+				is_prompt = chunk["isDisplaced"] == 0
+
+				if self.config.style['in_TeV']:
+					info = chunk[self.config.info_type]/1e6
+				else:
+					info = chunk[self.config.info_type]
+
+				weights = None
+				if jet_weights is not None:
+					weights = jet_weights[start:start + len(info)]
+				start += len(info)
+
+				if weights is None:
+					yield info[is_disp], info[is_prompt], None, None
+				else:
+					yield info[is_disp], info[is_prompt], weights[is_disp], weights[is_prompt]
+
+		elif self.config.info_df_name == "tracks":
+			# determine which jets are EJs or QCD
+			ds_jet = self.read_columns(sample_config.path, "jets", ("isDisplaced",))
+
+			chunks = self.iter_chunks(
+				sample_config.path, self.config.info_df_name, (self.config.info_type,), chunk_size
+			)
+			for chunk in chunks:
+				# extract track info, the jet masks select the tracks of the chunk
+				info = chunk[self.config.info_type]
+				is_disp = ds_jet["isDisplaced"][start:start + len(info)] == 1
+				is_prompt = ds_jet["isDisplaced"][start:start + len(info)] == 0
+
+				# every track carries the weight of its jet
+				weights = None
+				if jet_weights is not None:
+					weights = np.broadcast_to(
+						jet_weights[start:start + len(info)].reshape(-1, *([1] * (info.ndim - 1))),
+						info.shape,
+					)
+				start += len(info)
+
+				if weights is None:
+					yield info[is_disp], info[is_prompt], None, None
+				else:
+					yield info[is_disp], info[is_prompt], weights[is_disp], weights[is_prompt]
+
+	def info_range(self, sample_config):
+		"""
+		Determine the range of the requested information of one sample in a pass over its
+		chunks, keeping only the per-chunk minima and maxima.
+
+		Parameters:
+		----------
+			sample_config: ConfigDict of the sample
+		Returns:
+		-------
+			dict with the minimum ("min") and maximum ("max") value
+		"""
+		value_range = None
+		for info_disp, info_prompt, _, _ in self.info_chunks(sample_config):
+			value_range = update_range(value_range, info_disp)
+			value_range = update_range(value_range, info_prompt)
+		min_val, max_val = value_range
+		return {"min": np.asarray(min_val), "max": np.asarray(max_val)}
+
+	def manifest_range(self, sample_config):
+		"""
+		Determine the range of the requested information of one sample from its statistics
+		manifest, without reading the values. The manifest covers all jets, so it is only used
+		if every jet is either an emerging or a QCD jet.
+
+		Parameters:
+		----------
+			sample_config: ConfigDict of the sample
+		Returns:
+		-------
+			tuple of (min, max) in the dtype of the information, or None if the manifest cannot
+			be used
+		"""
+		# only the labels of the jets and the requested information are scanned
+		fields = {"jets": ["isDisplaced"]}
+		fields.setdefault(self.config.info_df_name, []).append(self.config.info_type)
+		manifest = self.manifest(sample_config.path, fields)
+		if manifest is None:
+			return None
+
+		datasets = manifest["datasets"]
+		labels = datasets["jets"].get("classes", {}).get("isDisplaced", {})
+		if not labels or any(float(label) not in (0, 1) for label in labels):
+			return None
+		stats = datasets[self.config.info_df_name]["fields"][self.config.info_type]
+		if "min" not in stats:
+			return None
+
+		value_type = np.dtype(stats["dtype"]).type
+		min_val, max_val = value_type(stats["min"]), value_type(stats["max"])
+		if self.config.info_df_name == "jets" and self.config.style['in_TeV']:
+			min_val, max_val = min_val/1e6, max_val/1e6
+		return min_val, max_val
+
+	def bin_edges(self):
+		"""
+		Return the bin edges of the histograms. They span ``bins_range`` with ``num_bins`` bins
+		if the range is set in the config, otherwise the range of the first sample is used.
+		"""
+		if self.config.get("bins_range") is not None:
+			return np.linspace(*self.config.bins_range, self.config.get("num_bins", 100) + 1)
+
+		# the range comes from the manifest if possible, otherwise from a pass over the values
+		sample_config = ConfigDict(next(iter(self.config.samples.values())))
+		value_range = self.manifest_range(sample_config)
+		if value_range is None:
+			value_range = self.derived(
+				sample_config.path,
+				"info_range",
+				self.info_params(),
+				lambda: self.info_range(sample_config),
+			)
+			value_range = value_range["min"][()], value_range["max"][()]
+		min_val, max_val = value_range
+
+		if self.config.info_df_name == "tracks" and np.abs(min_val) < 0.15*max_val:
+			min_val = 0
+
+		if self.config.info_df_name == "jets":
+			return np.linspace(min_val,max_val,101)
+		return np.linspace(min_val, 10, 11)# ,max_val,self.config.num_bins)
+
+	def info_params(self):
+		"""
+		Return the parameters of the information read from a sample, used as cache key
+		"""
+		in_TeV = self.config.info_df_name == "jets" and self.config.style['in_TeV']
+		return {
+			"info_df_name": self.config.info_df_name,
+			"info_type": self.config.info_type,
+			"in_TeV": bool(in_TeV),
+		}
+
+	def sample_counts(self, sample_config, edges):
+		"""
+		Histogram the requested information of one sample, split into emerging and QCD jets,
+		without holding all values in memory.
+
+		Parameters:
+		----------
+			sample_config: ConfigDict of the sample
+			edges: bin edges of the histograms
+		Returns:
+		-------
+			dict with the counts of the emerging ("disp") and QCD ("prompt") jet values, weighted
+			by jet when the sample is subsampled, in which case the sums of the squared weights
+			("disp_sq", "prompt_sq") are added
+		"""
+		print(sample_config.path)
+		weighted = self.jet_weights(sample_config.path) is not None
+		names = ("disp", "prompt", "disp_sq", "prompt_sq") if weighted else ("disp", "prompt")
+		dtype = np.float64 if weighted else np.int64
+		counts = {name: np.zeros(len(edges) - 1, dtype=dtype) for name in names}
+		for info_disp, info_prompt, w_disp, w_prompt in self.info_chunks(sample_config):
+			fill_folded(counts["disp"], edges, info_disp, w_disp)
+			fill_folded(counts["prompt"], edges, info_prompt, w_prompt)
+			if weighted:
+				fill_folded(counts["disp_sq"], edges, info_disp, w_disp**2)
+				fill_folded(counts["prompt_sq"], edges, info_prompt, w_prompt**2)
+		return counts
+
 	def plot(self):
+		from puma import Histogram, HistogramPlot
+		from puma.utils import get_good_linestyles
+
 		# SET UP HISTOGRAM PLOTBASE
 		# -------------------------
 		required_params = {
@@ -31,103 +230,49 @@ class SampleInfoPlotBase(PlotBase):
 		linestyles = get_good_linestyles()[:6]
 		
 		i = 0
-		
-		for _, sample in self.config.samples.items():
+
+		# stream the samples concurrently into histograms with common bins, then add them in
+		# config order
+		edges = self.bin_edges()
+		params = dict(self.info_params(), edges=np.asarray(edges).tolist())
+		results = self.map_samples(
+			lambda sample_config: self.derived(
+				sample_config.path,
+				"info_counts",
+				params,
+				lambda: self.sample_counts(sample_config, edges),
+			)
+		)
+
+		# set the plot style
+		info_plot = HistogramPlot(
+			bins=edges, 
+			**filtered_params
+		)
+
+		for sample, counts in zip(self.config.samples.values(), results):
 			sample_config = ConfigDict(sample)
-			print(sample_config.path)
-			with h5py.File(sample_config.path, "r") as hdf_file:
-				if self.config.info_df_name == "jets":
-					ds_jet = hdf_file[self.config.info_df_name]
-					
-					is_disp = ds_jet["isDisplaced"] == 1
-					is_prompt = ds_jet["isDisplaced"] == 0
-					
-					if self.config.style['in_TeV']:
-						info = ds_jet[self.config.info_type]/1e6
-					else:
-						info = ds_jet[self.config.info_type]
-						
-					info_disp = info[is_disp]
-					info_prompt = info[is_prompt]
-					
-					min_val = min(info)
-					max_val = max(info)
-
-					if i == 0:
-						info_plot = HistogramPlot(
-							bins=np.linspace(min_val,max_val,101), 
-							**filtered_params
-						)
-					
-					info_plot.add(
-						Histogram(
-							info_disp,
-							label=f"{sample_config.label}: Emerging Jet",
-							linestyle=linestyles[i]
-						)
-					)
-					info_plot.add(
-						Histogram(
-							info_prompt,
-							label=f"{sample_config.label}: QCD Jet",
-							linestyle=linestyles[i+1]
-						)
-					)
-					i += 2
-				
-				elif self.config.info_df_name == "tracks":
-					ds_jet = hdf_file["jets"]
-					ds_tracks = hdf_file[self.config.info_df_name]
-
-					# determine which jets are EJs or QCD
-					is_disp = ds_jet["isDisplaced"] == 1
-					# is_disp = is_disp.astype(bool)
-					is_prompt = ds_jet["isDisplaced"] == 0
-					# is_prompt = np.invert(is_disp)
-
-					# extract track info
-					info = ds_tracks[self.config.info_type]
-
-					# parse the data to obtain the EJ track info
-					ej = info[is_disp]
-					ej_1d = ej.ravel()
-					cleaned_ej = ej_1d[~np.isnan(ej_1d)] # get rid of the nan entries
-					
-					# parse the data to obtain the QCD track info
-					qcd = info[is_prompt]
-					qcd_1d = qcd.ravel()
-					cleaned_qcd = qcd_1d[~np.isnan(qcd_1d)] # get rid of the nan entries
-
-					min_val = min([min(cleaned_ej), min(cleaned_qcd)])
-					max_val = max([max(cleaned_ej), max(cleaned_qcd)])
-					if np.abs(min_val) < 0.15*max_val:
-						min_val = 0
-					
-					
-					# set the plot style
-					if i == 0:
-						info_plot = HistogramPlot(
-							bins=np.linspace(min_val, 10, 11),# ,max_val,self.config.num_bins), 
-							**filtered_params
-						)
-					
-					info_plot.add(
-						Histogram(
-							cleaned_ej,
-							label=f"{sample_config.label}: Emerging Jet",
-							linestyle=linestyles[i]
-						)
-					)
-					info_plot.add(
-						Histogram(
-							cleaned_qcd,
-							label=f"{sample_config.label}: QCD Jet",
-							linestyle=linestyles[i+1]
-						)
-					)
-					i += 2
 
-			info_plot.draw()
-			info_plot.savefig(self.config.file_name, transparent=False)
+			info_plot.add(
+				Histogram(
+					counts["disp"],
+					bin_edges=edges,
+					sum_squared_weights=counts.get("disp_sq"),
+					label=f"{sample_config.label}: Emerging Jet",
+					linestyle=linestyles[i]
+				)
+			)
+			info_plot.add(
+				Histogram(
+					counts["prompt"],
+					bin_edges=edges,
+					sum_squared_weights=counts.get("prompt_sq"),
+					label=f"{sample_config.label}: QCD Jet",
+					linestyle=linestyles[i+1]
+				)
+			)
+			i += 2
 
-				
\ No newline at end of file
+		with span("draw"):
+			info_plot.draw()
+		info_plot.savefig(self.config.file_name, transparent=False)
@@ -0,0 +1,301 @@
+from plotter.config_dict import ConfigDict
+import numpy as np
+from plotter.efficiency import FLAT_SCORE_BINS, CutEfficiencies, fill_cut_histogram, score_cuts
+from plotter.jet_variables import TRACK_VARIABLES
+from plotter.loader import DEFAULT_CHUNK_ROWS, ColumnRequest
+from plotter.plot_classes.plotbase import PlotBase
+from plotter.tracing import span
+
+# line styles of the curves of successive working points
+LINESTYLES = ("-", "--", ":", "-.")
+
+class VarEffPlotBase(PlotBase):
+	"""
+	Subclass of PlotBase to plot signal efficiency and background rejection vs a jet variable,
+	either a field of the jets or a quantity derived from their tracks (see TRACK_VARIABLES),
+	at fixed discriminant cuts or at a flat signal efficiency.
+	"""
+
+	# variable of the x axis, its values being divided by variable_unit
+	variable = None
+	variable_unit = 1.0
+	xlabel = None
+
+	# y axis of the rejection plot
+	bkg_rej_logy = True
+	bkg_rej_ymin = None
+
+	def score_keys(self, sample_config):
+		"""
+		Return the names of the displaced and prompt probability fields of a sample
+		"""
+		keys_list = self.store.schema(sample_config.path, "jets")
+		return keys_list[-2], keys_list[-1]
+
+	def working_points(self):
+		"""
+		Return the list of discriminant cuts, ``working_point`` being a single cut or a list
+		"""
+		wp = self.config.get("working_point", [])
+		return list(wp) if isinstance(wp, (list, tuple)) else [wp]
+
+	def flat_efficiencies(self):
+		"""
+		Return the list of flat signal efficiencies, ``flat_efficiency`` being a single
+		efficiency or a list
+		"""
+		eff = self.config.get("flat_efficiency", [])
+		return list(eff) if isinstance(eff, (list, tuple)) else [eff]
+
+	def curve_descriptions(self):
+		"""
+		Return the description of every curve of a sample, the working points then the flat
+		efficiencies
+		"""
+		return [f"Score > {wp}" for wp in self.working_points()] + [
+			f"{eff:.0%} flat efficiency" for eff in self.flat_efficiencies()
+		]
+
+	def curve_params(self, sample_config):
+		"""
+		Return the parameters of the efficiency histograms of a sample, keying the derived cache
+		"""
+		pDisp, pPrompt = self.score_keys(sample_config)
+		variable = self.config.get("variable", self.variable)
+		params = {
+			"disc": pDisp,
+			"variable": variable,
+			"variable_unit": float(self.config.get("variable_unit", self.variable_unit)),
+			"binedges": [float(edge) for edge in self.config.binedges],
+			"working_points": sorted(float(wp) for wp in self.working_points()),
+		}
+		if variable in TRACK_VARIABLES:
+			params["df_name"] = sample_config.get("df_name", "tracks")
+			params["disp_only"] = bool(self.config.get("disp_only", False))
+		# the flat-efficiency cuts are searched on a grid of cuts
+		if self.flat_efficiencies():
+			params["score_bins"] = int(self.config.get("score_bins", FLAT_SCORE_BINS))
+		return params
+
+	def requirements(self):
+		requests = []
+		for sample in self.config.samples.values():
+			sample_config = ConfigDict(sample)
+			params = self.curve_params(sample_config)
+			if self.is_cached(sample_config.path, "efficiency_histograms", params):
+				continue
+			if params["variable"] in TRACK_VARIABLES:
+				track_fields = TRACK_VARIABLES[params["variable"]][0]
+				requests.append(ColumnRequest(sample_config.path, params["df_name"], track_fields))
+				jet_fields = ("isDisplaced", params["disc"])
+			else:
+				jet_fields = ("isDisplaced", params["disc"], params["variable"])
+			requests.append(ColumnRequest(sample_config.path, "jets", jet_fields))
+		return requests
+
+	def fill_histograms(self, sample_config, params):
+		"""
+		Count the emerging and QCD jets of a sample in (variable bin, cut interval) histograms,
+		reading the jets, and the tracks of the derived variables, in blocks of ``chunk_size``
+		rows so that every cut is evaluated from a single pass.
+
+		Parameters:
+		----------
+			sample_config: ConfigDict of the sample
+			params: parameters of the histograms, from curve_params
+		Returns:
+		-------
+			dict with the cuts delimiting the intervals ("cuts") and the signal ("sig") and
+			background ("bkg") histograms
+		"""
+		pDisp = params["disc"]
+		disc_dtype = self.store.describe(sample_config.path, "jets")[0][pDisp]
+		# the cuts are compared in the precision of the discriminant, as in puma
+		cuts = score_cuts(params["working_points"], disc_dtype, params.get("score_bins", 0))
+		bin_edges = np.asarray(params["binedges"])
+
+		# subsampled jets are counted without their weights, which cancel in the efficiencies
+		# and rejections of a class, so the uncertainties are those of the jets read
+		shape = (len(bin_edges) - 1, len(cuts) + 1)
+		counts = {"sig": np.zeros(shape, dtype=np.int64), "bkg": np.zeros(shape, dtype=np.int64)}
+
+		chunk_size = self.config.get("chunk_size", DEFAULT_CHUNK_ROWS)
+		for jets, x in self.iter_variable(sample_config, params, chunk_size):
+			if params["variable_unit"] != 1.0:
+				x = x/params["variable_unit"]
+
+			for name, label in (("sig", 1), ("bkg", 0)):
+				selected = jets["isDisplaced"] == label
+				fill_cut_histogram(
+					counts[name],
+					bin_edges,
+					cuts,
+					x[selected],
+					jets[pDisp][selected],
+				)
+		return dict(counts, cuts=cuts)
+
+	def iter_variable(self, sample_config, params, chunk_size):
+		"""
+		Iterate over blocks of jets of a sample with the values of the variable.
+
+		Parameters:
+		----------
+			sample_config: ConfigDict of the sample
+			params: parameters of the histograms, from curve_params
+			chunk_size: number of rows per block
+		Yields:
+		-------
+			tuple of the dict of the label and discriminant of the jets of a block, and the
+			array of their values of the variable
+		"""
+		pDisp = params["disc"]
+		variable = params["variable"]
+		if variable not in TRACK_VARIABLES:
+			for jets in self.iter_chunks(
+				sample_config.path, "jets", ("isDisplaced", pDisp, variable), chunk_size
+			):
+				yield jets, jets[variable]
+			return
+
+		# the blocks of tracks are rounded to the HDF5 chunks of the track dataset, so the jets
+		# are sliced with the rows of every block of tracks rather than read in blocks of their own
+		track_fields, track_variable = TRACK_VARIABLES[variable]
+		ds_jet = self.read_columns(sample_config.path, "jets", ("isDisplaced", pDisp))
+		start = 0
+		for tracks in self.iter_chunks(
+			sample_config.path, params["df_name"], track_fields, chunk_size
+		):
+			x = track_variable(tracks, params["disp_only"])
+			stop = start + len(x)
+			yield {field: values[start:stop] for field, values in ds_jet.items()}, x
+			start = stop
+
+	def sample_curves(self, sample_config):
+		"""
+		Build the efficiencies and rejections vs the variable of every working point and flat
+		efficiency of a sample.
+
+		Parameters:
+		----------
+			sample_config: ConfigDict of the sample
+		Returns:
+		-------
+			tuple of the bin centres, the bin widths and the list of the curves, in the order of
+			curve_descriptions, as pairs of (efficiencies, uncertainties) and (rejections,
+			uncertainties)
+		"""
+		params = self.curve_params(sample_config)
+		hists = self.derived(
+			sample_config.path,
+			"efficiency_histograms",
+			params,
+			lambda: self.fill_histograms(sample_config, params),
+		)
+		efficiencies = CutEfficiencies(
+			params["binedges"],
+			hists["cuts"],
+			hists["sig"],
+			hists["bkg"],
+			self.config.get("uncertainty", "binomial"),
+		)
+
+		curves = []
+		for wp in self.working_points():
+			curves.append((efficiencies.sig_eff(wp), efficiencies.bkg_rej(wp)))
+		for eff in self.flat_efficiencies():
+			# per-bin quantiles of the signal discriminant
+			cuts = efficiencies.flat_cuts(eff)
+			print(f"{sample_config.path}: cuts of the {eff:.0%} flat efficiency {cuts}")
+			curves.append((efficiencies.sig_eff(cuts), efficiencies.bkg_rej(cuts)))
+		return efficiencies.bin_centres, efficiencies.bin_widths, curves
+
+	def plot(self):
+		from puma import VarVsVar, VarVsVarPlot
+		from puma.utils import get_good_colours
+
+		# INITIALIZING figure plot base
+		# -----------------------------
+		# required parameters for plot figure
+		required_params = {
+			"grid",
+			"figsize",
+			"atlas_second_tag",
+			"y_scale",
+			"atlas_tag_outside",
+		}
+		# filtering out necessary parameters from config file
+		filtered_params = {
+			key: value for key, value in self.config.style.items() if key in required_params
+		}
+		variable = self.config.get("variable", self.variable)
+		xlabel = self.config.get("xlabel", self.xlabel or variable)
+
+		# define the plots
+		plot_sig_eff = VarVsVarPlot(
+			ylabel="Emerging jet efficiency",
+			xlabel=xlabel,
+			logy=False,
+			**filtered_params
+		)
+
+		if self.bkg_rej_ymin is not None:
+			filtered_params["ymin"] = self.bkg_rej_ymin
+		plot_bkg_rej = VarVsVarPlot(
+			ylabel="QCD jet rejection",
+			xlabel=xlabel,
+			logy=self.bkg_rej_logy,
+			**filtered_params
+		)
+
+
+		# OPEN OUTPUT DATA FILE AND PROCESS IT
+		# ------------------------------------
+		# read the samples and count their jets concurrently, then add them in config order
+		results = self.map_samples(self.sample_curves)
+
+		# a single working point is written in the tag, several ones in the legend
+		descriptions = self.curve_descriptions()
+		if len(descriptions) == 1:
+			plot_sig_eff.atlas_second_tag += f", {descriptions[0]}"
+			plot_bkg_rej.atlas_second_tag += f", {descriptions[0]}"
+
+		samples = [ConfigDict(sample) for sample in self.config.samples.values()]
+		for i, (sample_config, (centres, widths, curves)) in enumerate(zip(samples, results)):
+			for j, (description, (sig_eff, bkg_rej)) in enumerate(zip(descriptions, curves)):
+				# one colour per sample and one line style per working point
+				label = sample_config.label
+				if len(descriptions) > 1:
+					label += f", {description}"
+				line_params = {
+					"x_var": centres,
+					"x_var_widths": widths,
+					"fill": True,
+					"plot_y_std": False,
+					"label": label,
+					"colour": sample_config.get("colour", get_good_colours()[i]),
+					"linestyle": LINESTYLES[j % len(LINESTYLES)],
+					"linewidth": 1.2,
+				}
+
+				# ADD THE CURVES TO THE PLOTS
+				# ---------------------------
+				gnn_ej = VarVsVar(y_var_mean=sig_eff[0], y_var_std=sig_eff[1], **line_params)
+				plot_sig_eff.add(gnn_ej, reference=(i == 0 and j == 0))
+
+				gnn_ej = VarVsVar(y_var_mean=bkg_rej[0], y_var_std=bkg_rej[1], **line_params)
+				plot_bkg_rej.add(gnn_ej, reference=(i == 0 and j == 0))
+
+		plot_sig_eff.leg_loc = self.config.sig_eff_leg_loc
+		plot_bkg_rej.leg_loc = self.config.bkg_rej_leg_loc
+
+
+		# DRAW AND SAVE THE PLOTS
+		# -----------------------
+		with span("draw"):
+			plot_sig_eff.draw()
+		plot_sig_eff.savefig(self.config.sig_eff_filename, transparent=False)
+
+		with span("draw"):
+			plot_bkg_rej.draw()
+		plot_bkg_rej.savefig(self.config.bkg_rej_filename, transparent=False)
@@ -1,13 +1,31 @@
 from plotter.config_dict import ConfigDict
-import h5py
+from plotter.draft import output_name
 import numpy as np
-from atlasify import atlasify
-from matplotlib import pyplot as plt
-from matplotlib import gridspec as gridspec
-from matplotlib.patches import Rectangle
-from matplotlib.patches import Circle
+from plotter.loader import ColumnRequest
 from plotter.plot_classes.plotbase import PlotBase
-import time
+from plotter.tracing import span
+import os
+
+# track fields needed to draw the vertex index matrices of a jet
+VERTEX_TRACK_FIELDS = (
+    'valid',
+    'truthVertexIndex',
+    'VertexIndex',
+    'truthOriginLabel',
+    'pileup',
+    'fake',
+    'prompt',
+    'displaced',
+)
+
+
+# codes of the vertex index matrix entries
+VI_PAIRED = 0  # the two tracks share a vertex
+VI_UNPAIRED = 1  # the two tracks do not share a vertex
+VI_PILEUP_PAIRED = 2  # diagonal of a track predicted as pileup or fake that shares a vertex
+
+# gray level drawn for each code, pileup tracks sharing a vertex are slightly lighter than black
+VI_SHADES = np.array([0.0, 1.0, 0.01])
 
 
 def make_VImats(true_vi, pred_vi, pred_pileup, pred_fake, pred_prompt, pred_disp):
@@ -15,6 +33,8 @@ def make_VImats(true_vi, pred_vi, pred_pileup, pred_fake, pred_prompt, pred_disp
     Produce both truth and prediction vertex matrices for a specific sample jet. Note that all 
     input arrays assume that non valid tracks have been removed, and arrays have been sorted and
     reorderd based on truth vertex indices.
+
+    The matrices are uint8 arrays of the VI_* codes, use ``VI_SHADES[matrix]`` to draw them.
     
     Parameters:
     ----------
@@ -29,73 +49,116 @@ def make_VImats(true_vi, pred_vi, pred_pileup, pred_fake, pred_prompt, pred_disp
     -------
         vi_matrices: list, contains both truth and predicted vertex index plots
     """
+    true_vi = np.asarray(true_vi)
+    pred_vi = np.asarray(pred_vi)
+    diagonal = np.eye(len(true_vi), dtype=bool)
 
-    # initialize list to store vertex index matrices
-    vi_matrices = []
-
-    n = len(true_vi)
+    # truth vertex: pileup tracks (index -2) are only paired with themselves
+    true_pairs = (true_vi[:, None] == true_vi[None, :]) & (true_vi != -2)[:, None]
+    mat_true = np.where(true_pairs | diagonal, VI_PAIRED, VI_UNPAIRED).astype(np.uint8)
 
-    # initialize vertex index (vi) matrices as completely unpaired
-    # note in these matrices: 0 -> track pairs, 1 -> tracks not paired
-    mat_true = np.ones((n,n))
-    mat_pred = np.ones((n,n))
+    # predicted origin of each track, ties going to the first class as in max()
+    origin = np.maximum.reduce([pred_pileup, pred_fake, pred_prompt, pred_disp])
+    is_pileup = (pred_pileup == origin) | (pred_fake == origin)
+    is_vertex = ~is_pileup & ((pred_prompt == origin) | (pred_disp == origin))
 
-    # create truth vi matrices
-    for i in range(n):
-        # truth vertex: checking if the i^th track is pileup (i.e. not a valid vertex)
-        if true_vi[i] == -2:
-            mat_true[i][i] = 0
+    # predicted vertex: tracks of any identified origin are paired by vertex index
+    pred_pairs = (pred_vi[:, None] == pred_vi[None, :]) & (is_pileup | is_vertex)[:, None]
+    mat_pred = np.where(pred_pairs, VI_PAIRED, VI_UNPAIRED).astype(np.uint8)
 
-        # constructing vertex index relationships for valid tracks
-        else:
-            # check for vi pairs between the i^th and j^th tracks
-            for j in range(n):
-                # checking for matching vertex pairs
-                if true_vi[j] == true_vi[i]:
-                    mat_true[i][j] = 0
+    # give pileup and fake tracks that pair with other tracks a distinct diagonal code
+    # NOTE: THIS IS HERE IF I WANT TO ADD ANOTHER ITEM IN THE LEGEND FOR SHOWING THIS CASE
+    pileup_paired = is_pileup & pred_pairs.any(axis=1)
+    pileup_diagonal = np.where(pileup_paired, VI_PILEUP_PAIRED, VI_PAIRED)
+    np.fill_diagonal(mat_pred, np.where(is_pileup, pileup_diagonal, np.diagonal(mat_pred)))
 
-    vi_matrices.append(mat_true)
-    
-    # create predicted vi matrix
-    for i, (pu, fk, pr, dp) in enumerate(zip(pred_pileup, pred_fake, pred_prompt, pred_disp)):
-        # determining predicted origin type of track i
-        origin = max(pu, fk, pr, dp)
-
-        # checking if predicted origin is pilup or fake
-        if (origin == pu) or (origin == fk):
-            # still have to check if these tracks are predicted to pair with other tracks
-            pair = False
-            for j in range(n):
-                if pred_vi[j] == pred_vi[i]:
-                    mat_pred[i][j] = 0
-                    pair = True
-            if pair == True:
-                # give it a different value from 0 to distinguish
-                # NOTE: THIS IS HERE IF I WANT TO ADD ANOTHER ITEM IN THE LEGEND FOR SHOWING THIS CASE
-                mat_pred[i][i] = 0.01
-            else:
-                mat_pred[i][i] = 0
+    return [mat_true, mat_pred]
 
-        # checking if predicted origin is prompt
-        elif (origin == pr) or (origin == dp):
-            # check for vi pairs between the i^th and j^th tracks
-            for j in range(n):
-                if pred_vi[j] == pred_vi[i]:
-                    mat_pred[i][j] = 0
 
-    vi_matrices.append(mat_pred)
+class VertexPlotBase(PlotBase):
+    """
+    VertexPlotBase subclass of PlotBase to plot the vertex index matrices for both true and
+    predicted. ``jet_num`` is either a single jet index, a list of jet indices, a range
+    ({range: [start, stop, step]}) or a selection of jets ({select: {field: value or
+    [min, max]}, limit: n}, where the field "score" stands for the emerging jet probability).
+    Several jets are drawn on the pages of a multipage PDF or to numbered image files.
+    """
 
-    # return vi_matrices
-    return vi_matrices
+    # the jets are chosen explicitly, by index, so they are never subsampled
+    subsampling = False
 
+    def requirements(self):
+        jet_num = self.config.jet_num
+        if not isinstance(jet_num, dict) or "select" not in jet_num:
+            return []
+        sample = ConfigDict(self.config.samples)
+        fields = {self.selection_field(sample, name) for name in jet_num["select"]}
+        return [ColumnRequest(sample.path, 'jets', tuple(sorted(fields)))]
 
-class VertexPlotBase(PlotBase):
-    def plot(self):
+    def selection_field(self, sample, name):
         """
-        VertexPlotBase subclass of PlotBase to plot the vertex index matrices for both true
-        and predicted.
+        Return the jets field of a selection key, "score" being the emerging jet probability
         """
-        print("in plot function")
+        if name == 'score':
+            return self.store.schema(sample.path, 'jets')[-2]
+        return name
+
+    def outputs(self):
+        # jets chosen by a selection are written to files named after data-dependent indices
+        root, ext = os.path.splitext(self.config.file_name)
+        jet_num = self.config.jet_num
+        if isinstance(jet_num, (int, np.integer)) or ext.lower() == '.pdf':
+            return [output_name(self.config.file_name)]
+        if isinstance(jet_num, dict) and 'select' in jet_num:
+            return None
+        return [output_name(f"{root}_{jet}{ext}") for jet in self.jet_indices(None)]
+
+    def jet_indices(self, sample):
+        """
+        Resolve the ``jet_num`` config into the list of jets to draw.
+
+        Parameters:
+        ----------
+            sample: ConfigDict of the sample
+        Returns:
+        -------
+            list of jet indices
+        """
+        jet_num = self.config.jet_num
+        if isinstance(jet_num, (int, np.integer)):
+            return [int(jet_num)]
+        if isinstance(jet_num, (list, tuple)):
+            return [int(jet) for jet in jet_num]
+        if isinstance(jet_num, dict) and 'range' in jet_num:
+            return list(range(*jet_num['range']))
+        if isinstance(jet_num, dict) and 'select' in jet_num:
+            cuts = jet_num['select']
+            fields = {name: self.selection_field(sample, name) for name in cuts}
+            ds_jet = self.read_columns(sample.path, 'jets', tuple(set(fields.values())))
+
+            passed = np.ones(self.store.describe(sample.path, 'jets')[1][0], dtype=bool)
+            for name, cut in cuts.items():
+                values = ds_jet[fields[name]]
+                # [min, max] cuts select min <= value < max, either end can be null
+                if isinstance(cut, (list, tuple)):
+                    low, high = cut
+                    if low is not None:
+                        passed &= values >= low
+                    if high is not None:
+                        passed &= values < high
+                else:
+                    passed &= values == cut
+
+            selected = np.nonzero(passed)[0]
+            if jet_num.get('limit') is not None:
+                selected = selected[:jet_num['limit']]
+            return selected.tolist()
+        raise ValueError(f"Cannot interpret jet_num '{jet_num}'")
+
+    def plot(self):
+        from matplotlib import pyplot as plt
+        from matplotlib.backends.backend_pdf import PdfPages
+
         # required parameters for vertex index plot base. Set in 'style' key in config
         required_params = {
             'figsize',
@@ -115,113 +178,125 @@ class VertexPlotBase(PlotBase):
         # extracting sample details and storing as a dictionary
         sample = ConfigDict(self.config.samples)
 
-        start = time.time()
-
-        print("about to open the h5 file")
-
-        # EXTRACTING THE DATA AND PROCESS IT
-        # ----------------------------------
-        with h5py.File(sample.path, "r") as hdf_file:
-            jet_num = self.config.jet_num
-
-            # extract jet information
-            ds_jet = hdf_file['jets']
-            truth_isDisp = ds_jet['isDisplaced'][jet_num]
-            keys_list = list(ds_jet.dtype.fields.keys())
-            prob_isDisp = ds_jet[keys_list[-2]][jet_num]
-            jet_pt = ds_jet['pt'][jet_num]/1000     # jet transverse momentum in GeV
-            jet_eta = ds_jet['eta'][jet_num]
-
-            ds_jet_time = time.time()
-            print("finished storing ds_jet data. took time {0:.3f} s".format(ds_jet_time-start))
-
-            print("about to extract ds_tfj info")
-
-            # extract track information
-            ds_tfj = hdf_file[sample.df_name]
-
-            ds_tfj_jet = ds_tfj[jet_num]  # Load the entire jet_num row once into memory
-
-            ds_tfj_time = time.time()
-            print("finished storing ds_tfj data. took time {0:.3f} s".format(ds_tfj_time-ds_jet_time))
-
-            valid = ds_tfj_jet['valid']  # Boolean mask
-
-            # Use NumPy boolean indexing on a single in-memory array
-            true_vi_data = ds_tfj_jet['truthVertexIndex'][valid]
-            pred_vi_data = ds_tfj_jet['VertexIndex'][valid]
-
-            true_origin_data = ds_tfj_jet['truthOriginLabel'][valid]
-            pred_pileup_data = ds_tfj_jet['pileup'][valid]
-            pred_fake_data = ds_tfj_jet['fake'][valid]
-            pred_prompt_data = ds_tfj_jet['prompt'][valid]
-            pred_disp_data = ds_tfj_jet['displaced'][valid]
-
-
-            ds_trackdata_time = time.time()
-            print("finished storing track data. took time {0:.3f} s".format(ds_trackdata_time-ds_tfj_time))
-
-            '''
-            ds_tfj_time = time.time()
-            print("finished storing ds_tfj data. took time {0:.3f} s".format(ds_tfj_time-ds_jet_time))
-
-            # boolean array of valid tracks
-            valid = ds_tfj['valid'][jet_num]
-
-            # extract vertex index data
-            true_vi_data = ds_tfj['truthVertexIndex'][jet_num][valid]
-            pred_vi_data = ds_tfj['VertexIndex'][jet_num][valid]
-
-            # extract valid origin labels
-            true_origin_data = ds_tfj['truthOriginLabel'][jet_num][valid]
-            pred_pileup_data = ds_tfj['pileup'][jet_num][valid]
-            pred_fake_data = ds_tfj['fake'][jet_num][valid]
-            pred_prompt_data = ds_tfj['prompt'][jet_num][valid]
-            pred_disp_data = ds_tfj['displaced'][jet_num][valid]
-
-            ds_trackdata_time = time.time()
-            print("finished storing track data. took time {0:.3f} s".format(ds_trackdata_time-ds_tfj_time))
-            '''
-
-            # sort
-            sorted_indices = np.argsort(true_vi_data)
-
-            # sort both true and predicted arrays based on sorted truth vertex index array
-            true_vi = true_vi_data[sorted_indices]
-            pred_vi = pred_vi_data[sorted_indices]
-
-            # sort track origin data
-            true_origin = true_origin_data[sorted_indices]
-            pred_pileup = pred_pileup_data[sorted_indices]
-            pred_fake = pred_fake_data[sorted_indices]
-            pred_prompt = pred_prompt_data[sorted_indices]
-            pred_disp = pred_disp_data[sorted_indices]
-
-            # set the view: two options are global and closeup
-            if self.config.zoom:
-                # adjust matrices based on when no pileup tracks are in truth sample
-                for i in range(len(true_vi)):
-                    if true_vi[i] != -2:
-                        true_vi = true_vi[i:]
-                        pred_vi = pred_vi[i:]
-                        true_origin = true_origin[i:]
-                        pred_pileup = pred_pileup[i:]
-                        pred_fake = pred_fake[i:]
-                        pred_prompt = pred_prompt[i:]
-                        pred_disp = pred_disp[i:]
-                        break
-
-            n = len(true_vi)
-
-            # create vertex index matrices
-            mat_true, mat_pred = make_VImats(
-                true_vi, 
-                pred_vi, 
-                pred_pileup, 
-                pred_fake, 
-                pred_prompt,
-                pred_disp
-            )
+        # EXTRACTING THE DATA
+        # -------------------
+        jet_nums = self.jet_indices(sample)
+
+        # extract jet information, all requested rows are read at once
+        keys_list = self.store.schema(sample.path, 'jets')
+        ds_jet = self.store.read_rows(
+            sample.path, 'jets', ('isDisplaced', keys_list[-2], 'pt', 'eta'), jet_nums
+        )
+
+        # extract track information of all requested jets in one sorted, coalesced read
+        ds_tfj = self.store.read_rows(sample.path, sample.df_name, VERTEX_TRACK_FIELDS, jet_nums)
+
+
+        # DRAWING AND SAVING THE JETS
+        # ---------------------------
+        dpi = filtered_params['dpi']
+        root, ext = os.path.splitext(self.config.file_name)
+        single = isinstance(self.config.jet_num, (int, np.integer))
+        pdf = None
+        if not single and ext.lower() == '.pdf':
+            pdf = PdfPages(output_name(self.config.file_name))
+
+        try:
+            for i, jet_num in enumerate(jet_nums):
+                jet = {
+                    'isDisplaced': ds_jet['isDisplaced'][i],
+                    'score': ds_jet[keys_list[-2]][i],
+                    'pt': ds_jet['pt'][i],
+                    'eta': ds_jet['eta'][i],
+                }
+                tracks = {field: ds_tfj[field][i] for field in VERTEX_TRACK_FIELDS}
+                with span("draw", f"jet {jet_num}"):
+                    fig = self.draw_jet(filtered_params, jet, tracks)
+
+                if single:
+                    fig.savefig(self.config.file_name, dpi=dpi, bbox_inches='tight')
+                elif pdf is not None:
+                    pdf.savefig(fig, dpi=dpi, bbox_inches='tight')
+                else:
+                    fig.savefig(f"{root}_{jet_num}{ext}", dpi=dpi, bbox_inches='tight')
+                plt.close(fig)
+        finally:
+            if pdf is not None:
+                pdf.close()
+
+    def draw_jet(self, filtered_params, jet, tracks):
+        """
+        Draw the truth and predicted vertex index matrices of one jet.
+
+        Parameters:
+        ----------
+            filtered_params: style parameters of the plot
+            jet: dict with the isDisplaced, score, pt and eta values of the jet
+            tracks: dict mapping the VERTEX_TRACK_FIELDS to the track arrays of the jet
+        Returns:
+        -------
+            matplotlib figure
+        """
+        from atlasify import atlasify
+        from matplotlib import gridspec
+        from matplotlib import pyplot as plt
+
+        truth_isDisp = jet['isDisplaced']
+        prob_isDisp = jet['score']
+        jet_pt = jet['pt']/1000     # jet transverse momentum in GeV
+        jet_eta = jet['eta']
+
+        valid = tracks['valid']  # Boolean mask
+
+        # Use NumPy boolean indexing on a single in-memory array
+        true_vi_data = tracks['truthVertexIndex'][valid]
+        pred_vi_data = tracks['VertexIndex'][valid]
+
+        true_origin_data = tracks['truthOriginLabel'][valid]
+        pred_pileup_data = tracks['pileup'][valid]
+        pred_fake_data = tracks['fake'][valid]
+        pred_prompt_data = tracks['prompt'][valid]
+        pred_disp_data = tracks['displaced'][valid]
+
+        # sort
+        sorted_indices = np.argsort(true_vi_data)
+
+        # sort both true and predicted arrays based on sorted truth vertex index array
+        true_vi = true_vi_data[sorted_indices]
+        pred_vi = pred_vi_data[sorted_indices]
+
+        # sort track origin data
+        true_origin = true_origin_data[sorted_indices]
+        pred_pileup = pred_pileup_data[sorted_indices]
+        pred_fake = pred_fake_data[sorted_indices]
+        pred_prompt = pred_prompt_data[sorted_indices]
+        pred_disp = pred_disp_data[sorted_indices]
+
+        # set the view: two options are global and closeup
+        if self.config.zoom:
+            # adjust matrices based on when no pileup tracks are in truth sample
+            for i in range(len(true_vi)):
+                if true_vi[i] != -2:
+                    true_vi = true_vi[i:]
+                    pred_vi = pred_vi[i:]
+                    true_origin = true_origin[i:]
+                    pred_pileup = pred_pileup[i:]
+                    pred_fake = pred_fake[i:]
+                    pred_prompt = pred_prompt[i:]
+                    pred_disp = pred_disp[i:]
+                    break
+
+        n = len(true_vi)
+
+        # create vertex index matrices
+        mat_true, mat_pred = make_VImats(
+            true_vi, 
+            pred_vi, 
+            pred_pileup, 
+            pred_fake, 
+            pred_prompt,
+            pred_disp
+        )
 
 
         # CONSTRUCTING THE FIGURE AND PLOTTING THE MATRICES
@@ -240,8 +315,8 @@ class VertexPlotBase(PlotBase):
 
 
         # plotting the truth and predicted vertex index matrices
-        ax_true.imshow(mat_true, cmap='gray')
-        ax_pred.imshow(mat_pred, cmap='gray')
+        ax_true.imshow(VI_SHADES[mat_true], cmap='gray')
+        ax_pred.imshow(VI_SHADES[mat_pred], cmap='gray')
 
 
         # ADJUSTING PLOT SETTINGS
@@ -380,5 +455,4 @@ class VertexPlotBase(PlotBase):
         ax_pred.text(0.05, 0.84, "Model\nprediction", transform=ax_pred.transAxes, fontsize=14)
 
 
-        plt.savefig(self.config.file_name, dpi=filtered_params['dpi'], bbox_inches='tight')
-
+        return fig
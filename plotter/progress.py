@@ -0,0 +1,258 @@
+"""
+Live progress and throughput of the reads of the sample files.
+
+When enabled, every chunked read of a dataset from a sample file (``ColumnStore.iter_chunks``
+and ``iter_rows``, as well as ``read`` and ``read_rows``) reports the rows read so far, the rate
+at which data is read, the compression ratio of the dataset and the estimated time left. Reads shorter than the update interval print nothing. At the end of the run
+a summary gives the totals of every file, with the share of the wall time spent reading: a run
+spending most of it reading is I/O-bound (file system or chunk layout), otherwise it is bound by
+the computations of the plots.
+
+The rate counts the bytes of the whole records read, decompressed, since HDF5 decompresses every
+field of a chunk of a compound dataset, over the time spent in the reads, which includes the
+decompression. The compression ratio, that of the whole dataset, gives the bytes stored in the
+file: a low rate with a high ratio points at the decompression, a low rate with a ratio close
+to 1 at the file system.
+"""
+
+import os
+import sys
+import time
+
+import h5py
+
+
+# seconds between two updates of the progress line on a terminal
+PROGRESS_INTERVAL = 0.5
+
+# seconds between two progress lines when the output is not a terminal, e.g. a log file
+LOG_INTERVAL = 10.0
+
+# reporter of the run, None when progress reporting is disabled
+_REPORTER = None
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+class ReadProgress:
+    """
+    Progress of the reads of one dataset.
+    """
+
+    def __init__(self, reporter, path, dataset, total_rows, hdf_dataset=None):
+        self.reporter = reporter
+        self.path = path
+        self.dataset = dataset
+        self.total_rows = total_rows
+
+        if hdf_dataset is None:
+            with h5py.File(path, "r") as hdf_file:
+                self.row_bytes, self.disk_ratio = self._sizes(hdf_file[dataset])
+        else:
+            self.row_bytes, self.disk_ratio = self._sizes(hdf_dataset)
+
+        self.rows = 0
+        self.read_seconds = 0.0
+        self.start = time.perf_counter()
+        self.last_shown = self.start
+        self.shown = False
+
+    @staticmethod
+    def _sizes(hdf_dataset):
+        """
+        Return the decompressed bytes of a row of a dataset and its compression ratio.
+        """
+        n_rows = hdf_dataset.shape[0] if hdf_dataset.shape else 1
+        logical = hdf_dataset.dtype.itemsize * hdf_dataset.size
+        row_bytes = logical / n_rows if n_rows else 0
+        storage = hdf_dataset.id.get_storage_size()
+        return row_bytes, (storage / logical if logical and storage else 1.0)
+
+    def update(self, rows, seconds):
+        """
+        Count rows read from the file in the given time, updating the progress line if due.
+        """
+        self.rows += rows
+        self.read_seconds += seconds
+        now = time.perf_counter()
+        # the last line is shown by close
+        if self.rows < self.total_rows and now - self.last_shown >= self.reporter.interval:
+            self.last_shown = now
+            self.shown = True
+            self.reporter.show(self.line(now))
+
+    def close(self):
+        """
+        Add the reads of the dataset to the statistics of its file.
+        """
+        now = time.perf_counter()
+        self.reporter.record(
+            self.path,
+            rows=self.rows,
+            disk_bytes=self.rows * self.row_bytes * self.disk_ratio,
+            data_bytes=self.rows * self.row_bytes,
+            read_seconds=self.read_seconds,
+            wall_seconds=now - self.start,
+        )
+        self.reporter.done(self, self.line(now) if self.shown else None)
+
+    def line(self, now):
+        """
+        Return the progress line of the dataset.
+        """
+        data_mb = self.rows * self.row_bytes / 1024**2
+        rate = data_mb / self.read_seconds if self.read_seconds else 0.0
+        fraction = self.rows / self.total_rows if self.total_rows else 1.0
+        elapsed = now - self.start
+        if self.rows < self.total_rows:
+            eta = f"ETA {format_duration(elapsed / max(fraction, 1e-9) - elapsed)}"
+        else:
+            eta = f"done in {format_duration(elapsed)}"
+        return (
+            f"{os.path.basename(self.path)}:{self.dataset}  "
+            f"{self.rows:,}/{self.total_rows:,} rows ({fraction:.0%})  "
+            f"{rate:.1f} MB/s  compression {1 / self.disk_ratio:.1f}x  {eta}"
+        )
+
+
+class _NoProgress:
+    """
+    Progress of reads that are not reported.
+    """
+
+    def update(self, rows, seconds):
+        pass
+
+    def close(self):
+        pass
+
+
+_NO_PROGRESS = _NoProgress()
+
+
+class ProgressReporter:
+    """
+    Writer of the progress lines and collector of the read statistics of every file.
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stderr
+        # progress lines are rewritten in place on terminals, and appended to other outputs
+        self.live = getattr(self.stream, "isatty", lambda: False)()
+        self.interval = PROGRESS_INTERVAL if self.live else LOG_INTERVAL
+        self.stats = {}  # path -> dict of totals
+        self._active = set()  # (path, dataset) of the reads in progress
+        self._width = 0  # length of the progress line on the terminal
+
+    def start(self, path, dataset, total_rows, hdf_dataset=None):
+        if (path, dataset) in self._active:
+            # the reads of an outer progress, e.g. the windows of an iter_rows
+            return _NO_PROGRESS
+        self._active.add((path, dataset))
+        return ReadProgress(self, path, dataset, total_rows, hdf_dataset)
+
+    def show(self, line):
+        if self.live:
+            self.stream.write("\r" + line.ljust(self._width))
+            self._width = len(line)
+        else:
+            self.stream.write(line + "\n")
+        self.stream.flush()
+
+    def done(self, progress, line):
+        self._active.discard((progress.path, progress.dataset))
+        if line is not None:
+            self.show(line)
+            if self.live:
+                self.stream.write("\n")
+                self._width = 0
+
+    def record(self, path, **totals):
+        stats = self.stats.setdefault(path, dict.fromkeys(totals, 0))
+        for key, value in totals.items():
+            stats[key] += value
+
+
+def enable_progress(stream=None):
+    """
+    Start reporting the progress of the reads, to stderr by default.
+    """
+    global _REPORTER
+    _REPORTER = ProgressReporter(stream)
+
+
+def disable_progress():
+    """
+    Stop reporting the progress of the reads.
+    """
+    global _REPORTER
+    _REPORTER = None
+
+
+def read_progress(path, dataset, total_rows, hdf_dataset=None):
+    """
+    Return the progress of a read of a dataset, whose ``update`` is called after every chunk
+    read from the file and ``close`` at the end. Nothing is reported when progress reporting is
+    disabled.
+
+    Parameters:
+    ----------
+        path: path to the HDF5 file
+        dataset: name of the dataset
+        total_rows: number of rows the read will return
+        hdf_dataset: open h5py dataset, to avoid opening the file again
+    Returns:
+    -------
+        progress object
+    """
+    if _REPORTER is None:
+        return _NO_PROGRESS
+    return _REPORTER.start(path, dataset, total_rows, hdf_dataset)
+
+
+def take_read_stats():
+    """
+    Remove and return the read statistics collected so far, e.g. to send them from a worker
+    process to the parent one.
+    """
+    if _REPORTER is None:
+        return {}
+    stats, _REPORTER.stats = _REPORTER.stats, {}
+    return stats
+
+
+def add_read_stats(stats):
+    """
+    Add read statistics collected in a worker process.
+    """
+    if _REPORTER is not None:
+        for path, totals in stats.items():
+            _REPORTER.record(path, **totals)
+
+
+def format_read_summary():
+    """
+    Return the table of the reads of every sample file, or None if nothing was read.
+    """
+    if _REPORTER is None or not _REPORTER.stats:
+        return None
+    lines = [
+        f"{'file':<32}{'rows':>12}{'disk MB':>10}{'data MB':>10}{'read s':>9}"
+        f"{'MB/s':>9}{'compression':>13}{'I/O share':>11}"
+    ]
+    for path, stats in sorted(_REPORTER.stats.items()):
+        seconds = stats["read_seconds"]
+        disk_mb = stats["disk_bytes"] / 1024**2
+        data_mb = stats["data_bytes"] / 1024**2
+        share = seconds / stats["wall_seconds"] if stats["wall_seconds"] else 1.0
+        ratio = data_mb / disk_mb if disk_mb else 1.0
+        lines.append(
+            f"{os.path.basename(path):<32}{stats['rows']:>12,}{disk_mb:10.1f}{data_mb:10.1f}"
+            f"{seconds:9.2f}{data_mb / seconds if seconds else 0:9.1f}{ratio:12.1f}x"
+            f"{min(share, 1.0):11.0%}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,146 @@
+"""
+Static registry of the plot classes.
+
+Configs name the class of every plot either by its short name (``class: roc``), by its class
+name (``class: RocPlotBase``) or by its full dotted path, as in the original configs. The modules
+of the plot classes are only imported when a config uses them, and the plot modules import their
+plotting libraries (puma, matplotlib, atlasify) inside the methods that draw, so that listing
+the plots, validating configs or skipping up-to-date plots never loads the plotting stack.
+"""
+
+import importlib
+import importlib.util
+from collections import namedtuple
+
+
+# a registered plot class: module, class name and a one-line description
+PlotClass = namedtuple("PlotClass", ["module", "name", "description"])
+
+PLOT_CLASSES = {
+    "roc": PlotClass(
+        "plotter.plot_classes.roc_plot",
+        "RocPlotBase",
+        "QCD jet rejection vs emerging jet efficiency",
+    ),
+    "discrim": PlotClass(
+        "plotter.plot_classes.discrim_plot",
+        "DiscrimPlotBase",
+        "Histograms of the emerging jet discriminant",
+    ),
+    "jetpt": PlotClass(
+        "plotter.plot_classes.jetpt_perf_plot",
+        "JetPtPerfPlotBase",
+        "Efficiency and rejection vs jet pT",
+    ),
+    "var_eff": PlotClass(
+        "plotter.plot_classes.var_eff_plot",
+        "VarEffPlotBase",
+        "Efficiency and rejection vs any jet variable",
+    ),
+    "num_vert": PlotClass(
+        "plotter.plot_classes.num_vert_perf_plot",
+        "NumVertPerfPlotBase",
+        "Efficiency and rejection vs number of true vertices",
+    ),
+    "num_vert_compare": PlotClass(
+        "plotter.plot_classes.num_vert_perf_plot",
+        "NumVertComparePlotBase",
+        "True vs predicted number of vertices per jet",
+    ),
+    "confusion_matrix": PlotClass(
+        "plotter.plot_classes.confusion_matrix_plot",
+        "ConfMatPlotBase",
+        "Confusion matrix of the track origins",
+    ),
+    "sample_info": PlotClass(
+        "plotter.plot_classes.sample_info_plot",
+        "SampleInfoPlotBase",
+        "Histograms of a jet or track variable",
+    ),
+    "vertex": PlotClass(
+        "plotter.plot_classes.vertex_plot",
+        "VertexPlotBase",
+        "True and predicted vertex index matrices of single jets",
+    ),
+}
+
+# class name -> short name
+_CLASS_NAMES = {plot_class.name: short_name for short_name, plot_class in PLOT_CLASSES.items()}
+
+
+def resolve_class(class_name):
+    """
+    Return the module and class name of a plot class named in a config, without importing it.
+
+    Parameters:
+    ----------
+        class_name: short name, class name or dotted path of the plot class
+    Returns:
+    -------
+        tuple of (module name, class name)
+    """
+    if class_name in PLOT_CLASSES:
+        plot_class = PLOT_CLASSES[class_name]
+        return plot_class.module, plot_class.name
+    if class_name in _CLASS_NAMES:
+        plot_class = PLOT_CLASSES[_CLASS_NAMES[class_name]]
+        return plot_class.module, plot_class.name
+    if "." not in class_name:
+        raise ImportError(f"Unknown plot class '{class_name}', see gnn-plots --list-plots")
+    module_name, class_name = class_name.rsplit(".", 1)
+    return module_name, class_name
+
+
+def check_class(class_name):
+    """
+    Check that a plot class named in a config can be found, importing nothing but the packages
+    of unregistered modules.
+
+    Parameters:
+    ----------
+        class_name: short name, class name or dotted path of the plot class
+    Returns:
+    -------
+        error message, or None if the class was found
+    """
+    try:
+        module_name, name = resolve_class(class_name)
+    except ImportError as err:
+        return str(err)
+    if any(plot_class[:2] == (module_name, name) for plot_class in PLOT_CLASSES.values()):
+        return None
+    try:
+        if importlib.util.find_spec(module_name) is None:
+            return f"Cannot find module {module_name}"
+    except ImportError as err:
+        return str(err)
+    return None
+
+
+def load_class(class_name):
+    """
+    Import and return a plot class named in a config.
+
+    Parameters:
+    ----------
+        class_name: short name, class name or dotted path of the plot class
+    Returns:
+    -------
+        plot class
+    """
+    module_name, name = resolve_class(class_name)
+    try:
+        module = importlib.import_module(module_name)
+        return getattr(module, name)
+    except (ImportError, AttributeError) as e:
+        raise ImportError(f"Cannot find class {name} in module {module_name}") from e
+
+
+def format_plot_classes():
+    """
+    Return the table of the registered plot classes printed by ``--list-plots``.
+    """
+    lines = []
+    for short_name, plot_class in PLOT_CLASSES.items():
+        lines.append(f"{short_name:<18}{plot_class.name:<24}{plot_class.description}")
+    return "\n".join(lines)
@@ -0,0 +1,492 @@
+"""
+ROC curve engine answering every efficiency and rejection query of a sample from one sort of its
+signal and background discriminants.
+
+The queries reproduce ``puma.metrics.calc_eff`` and ``calc_rej``: the cut of a signal efficiency
+is the weighted percentile of the signal discriminant, and the efficiency of a cut is the
+fraction of jets with a discriminant greater or equal to it.
+"""
+
+import numpy as np
+
+
+class SortedRoc:
+    """
+    Signal and background discriminants of a sample, sorted once and queried with searchsorted.
+    """
+
+    def __init__(self, sig_disc, bkg_disc, presorted=False):
+        """
+        Parameters:
+        ----------
+            sig_disc: array of signal discriminants
+            bkg_disc: array of background discriminants
+            presorted: whether both arrays are already sorted in increasing order
+        """
+        sig_disc = np.asarray(sig_disc)
+        bkg_disc = np.asarray(bkg_disc)
+        self.sig = sig_disc if presorted else np.sort(sig_disc)
+        self.bkg = bkg_disc if presorted else np.sort(bkg_disc)
+
+        # cumulative distribution of the signal, computed as in puma's weighted_percentile
+        weights = np.ones_like(self.sig)
+        dtype = np.float64 if len(self.sig) > 1000000 else np.float32
+        cdf = np.cumsum(weights, dtype=dtype) - 0.5 * weights
+        cdf -= cdf[0]
+        cdf /= cdf[-1]
+        self._sig_cdf = cdf
+
+    @property
+    def n_sig(self):
+        return len(self.sig)
+
+    @property
+    def n_bkg(self):
+        return len(self.bkg)
+
+    def cuts(self, sig_eff):
+        """
+        Return the discriminant cuts giving the requested signal efficiencies.
+        """
+        return np.interp(1.0 - np.asarray(sig_eff), self._sig_cdf, self.sig)
+
+    def sig_eff(self, cuts):
+        """
+        Return the fraction of signal jets with a discriminant greater or equal to the cuts,
+        compared in the precision of the discriminant.
+        """
+        return passing_fraction(self.sig, np.asarray(cuts, dtype=self.sig.dtype))
+
+    def bkg_eff(self, cuts):
+        """
+        Return the fraction of background jets with a discriminant greater or equal to the
+        cuts, compared in the precision of the discriminant.
+        """
+        return passing_fraction(self.bkg, np.asarray(cuts, dtype=self.bkg.dtype))
+
+    def rej(self, sig_eff):
+        """
+        Return the background rejections at the requested signal efficiencies, inf where no
+        background jet passes.
+        """
+        return inverse(passing_fraction(self.bkg, self.cuts(sig_eff)))
+
+    def cut_rej(self, cuts):
+        """
+        Return the background rejections on the ROC curve at the signal efficiencies of the cuts.
+        """
+        return self.rej(self.sig_eff(cuts))
+
+
+def passing_fraction(sorted_disc, cuts):
+    """
+    Return the fraction of a sorted discriminant array greater or equal to each of the cuts.
+
+    Parameters:
+    ----------
+        sorted_disc: discriminants sorted in increasing order
+        cuts: scalar or array of cut values
+    Returns:
+    -------
+        array of fractions, with the shape of ``cuts``
+    """
+    n_pass = len(sorted_disc) - np.searchsorted(sorted_disc, cuts, side="left")
+    return n_pass / len(sorted_disc)
+
+
+def inverse(eff):
+    """
+    Return 1 / eff, with inf where the efficiency is zero.
+    """
+    eff = np.asarray(eff, dtype=np.float64)
+    with np.errstate(divide="ignore"):
+        return np.where(eff == 0, np.inf, 1.0 / np.where(eff == 0, 1.0, eff))
+
+
+# default number of bins of the streaming ROC histograms
+STREAMING_ROC_BINS = 1_000_000
+
+
+def roc_bin_edges(n_bins=STREAMING_ROC_BINS, extra_edges=()):
+    """
+    Return the bin edges of the streaming ROC histograms of a discriminant in [0, 1]. Half of
+    the bins are uniform below 0.99, the other half are logarithmic in 1 - discriminant down to
+    1e-7, where the working points of the taggers lie. Under- and overflow bins catch the
+    discriminants outside [0, 1].
+
+    Parameters:
+    ----------
+        n_bins: approximate number of bins between 0 and 1
+        extra_edges: values added to the edges, e.g. cut values that should be exact
+    Returns:
+    -------
+        increasing array of bin edges, starting at -inf and ending at inf
+    """
+    n_uniform = n_bins // 2
+    uniform = np.linspace(0.0, 0.99, n_uniform, endpoint=False)
+    tail = 1.0 - np.logspace(-2, -7, n_bins - n_uniform)
+    edges = np.concatenate([[-np.inf], uniform, tail, [1.0, np.inf], np.asarray(extra_edges)])
+    return np.unique(edges.astype(np.float64))
+
+
+def fill_histogram(counts, edges, disc):
+    """
+    Add discriminant values to histogram counts, bins being closed on the left.
+
+    Parameters:
+    ----------
+        counts: int64 array of the counts of the len(edges) - 1 bins, updated in place
+        edges: increasing bin edges, starting at -inf and ending at inf
+        disc: array of discriminants
+    """
+    bins = np.searchsorted(edges, disc, side="right") - 1
+    counts += np.bincount(np.minimum(bins, len(counts) - 1), minlength=len(counts))
+
+
+class HistogramRoc:
+    """
+    Approximate ROC curve from histograms of the signal and background discriminants.
+
+    Efficiencies are exact at the bin edges. The cut of a signal efficiency is puma's weighted
+    percentile of the signal discriminant, which interpolates between the two signal jets of
+    the ranks around the quantile. The cut is estimated by interpolating these ranks inside
+    their bins, and the rejection at the cut is bounded by the rejections at the lower edge of
+    the bin of the first rank and at the upper edge of the bin of the second one, which bounds
+    the binning error.
+    """
+
+    def __init__(self, edges, sig_counts, bkg_counts, disc_dtype=np.float64):
+        """
+        Parameters:
+        ----------
+            edges: increasing bin edges, starting at -inf and ending at inf
+            sig_counts: counts of the signal discriminant in the bins
+            bkg_counts: counts of the background discriminant in the bins
+            disc_dtype: dtype of the discriminant, in which the cuts are compared
+        """
+        self._all_edges = np.asarray(edges)
+        self.edges = self._all_edges[1:-1]
+        self.disc_dtype = disc_dtype
+        self._sig_counts = np.asarray(sig_counts)
+        self.n_sig = int(np.sum(sig_counts))
+        self.n_bkg = int(np.sum(bkg_counts))
+
+        # number of jets greater or equal to each edge, from the cumulative sums of the counts
+        self._sig_passing = np.append(np.cumsum(self._sig_counts[::-1])[::-1], 0)
+        self._bkg_passing = np.append(np.cumsum(np.asarray(bkg_counts)[::-1])[::-1], 0)
+
+        # efficiencies of cuts at each finite edge
+        self._sig_effs = self._sig_passing[1:-1] / self.n_sig
+        self._bkg_effs = self._bkg_passing[1:-1] / self.n_bkg
+
+    def _rank_bins(self, sig_eff):
+        """
+        Return the fractional rank in the sorted signal discriminants of the percentile cut of
+        each signal efficiency, with the bins holding the ranks just below and above it. The
+        ranks are widened by one for the rounding of the single precision percentiles.
+        """
+        rank = (1.0 - np.atleast_1d(np.asarray(sig_eff, dtype=np.float64))) * (self.n_sig - 1)
+        rank = np.clip(rank, 0, self.n_sig - 1)
+        below_rank = np.maximum(np.floor(rank) - 1, 0)
+        above_rank = np.minimum(np.ceil(rank) + 1, self.n_sig - 1)
+
+        # the rank r is in the bin holding the (r + 1)-th smallest discriminant
+        n_up_to = np.cumsum(self._sig_counts)
+        rank_bin = np.searchsorted(n_up_to, rank, side="right")
+        below_bin = np.searchsorted(n_up_to, below_rank, side="right")
+        above_bin = np.searchsorted(n_up_to, above_rank, side="right")
+        return rank, rank_bin, below_bin, above_bin
+
+    def cuts(self, sig_eff):
+        """
+        Return the discriminant cuts giving the requested signal efficiencies, the ranks of the
+        percentiles being linearly interpolated inside their bins. Ranks in the under- or
+        overflow bins are placed on their finite edge.
+        """
+        rank, rank_bin, _, _ = self._rank_bins(sig_eff)
+        counts = self._sig_counts[rank_bin]
+        n_below = self.n_sig - self._sig_passing[rank_bin]
+        fraction = np.clip((rank - n_below + 0.5) / np.maximum(counts, 1), 0.0, 1.0)
+
+        low = self._all_edges[rank_bin]
+        high = self._all_edges[rank_bin + 1]
+        with np.errstate(invalid="ignore"):
+            cuts = np.where(
+                np.isinf(low), high, np.where(np.isinf(high), low, low + fraction * (high - low))
+            )
+        return cuts.reshape(np.shape(sig_eff))
+
+    def sig_eff(self, cuts):
+        """
+        Return the signal efficiencies of the cuts, exact if the cuts are bin edges.
+        """
+        cuts = np.asarray(cuts, dtype=self.disc_dtype)
+        return np.interp(cuts, self.edges, self._sig_effs)
+
+    def bkg_eff(self, cuts):
+        """
+        Return the background efficiencies of the cuts, exact if the cuts are bin edges.
+        """
+        cuts = np.asarray(cuts, dtype=self.disc_dtype)
+        return np.interp(cuts, self.edges, self._bkg_effs)
+
+    def rej(self, sig_eff):
+        """
+        Return the background rejections at the requested signal efficiencies, inf where no
+        background jet passes. The estimates are kept within ``rej_bounds``.
+        """
+        lower, upper = self.rej_bounds(sig_eff)
+        rej = inverse(self.bkg_eff(self.cuts(sig_eff)))
+        return np.clip(rej, lower, upper).reshape(np.shape(sig_eff))
+
+    def rej_bounds(self, sig_eff):
+        """
+        Return the lower and upper bounds of the rejections at the requested signal
+        efficiencies. The percentile cut lies between the lower edge of the bin holding the
+        signal rank below it and the upper edge of the bin holding the rank above it, so the
+        number of background jets passing it lies between the numbers passing these edges.
+
+        Returns:
+        -------
+            (2, n) array of the lower and upper rejection bounds
+        """
+        _, _, below_bin, above_bin = self._rank_bins(sig_eff)
+        return np.stack(
+            [
+                inverse(self._bkg_passing[below_bin] / self.n_bkg),
+                inverse(self._bkg_passing[above_bin + 1] / self.n_bkg),
+            ]
+        )
+
+    def cut_rej(self, cuts):
+        """
+        Return the background rejections on the ROC curve at the signal efficiencies of the cuts.
+        """
+        return self.rej(self.sig_eff(cuts))
+
+
+# default number of coarse bins of the first pass of the exact streaming ROC
+REFINEMENT_ROC_BINS = 100_000
+
+
+def percentile_cdf(ranks, n, disc_dtype):
+    """
+    Return the values at the given ranks of the cumulative distribution that puma's
+    weighted_percentile builds for n unit weights, in the same precision.
+
+    Parameters:
+    ----------
+        ranks: array of ranks in the sorted data
+        n: number of data points
+        disc_dtype: dtype of the data
+    Returns:
+    -------
+        array of cumulative distribution values
+    """
+    dtype = np.result_type(np.float64 if n > 1000000 else np.float32, disc_dtype)
+    return np.asarray(ranks, dtype=dtype) / dtype.type(n - 1)
+
+
+def percentile_window(quantile, n):
+    """
+    Return the ranks of the sorted data that np.interp uses to evaluate the weighted percentile
+    at a quantile, with a margin of two ranks on either side for rounding.
+
+    Parameters:
+    ----------
+        quantile: quantile in [0, 1], i.e. 1 - signal efficiency
+        n: number of data points
+    Returns:
+    -------
+        array of ranks
+    """
+    center = int(np.floor(np.clip(quantile, 0.0, 1.0) * (n - 1)))
+    return np.arange(max(center - 2, 0), min(center + 4, n))
+
+
+class RefinedRoc:
+    """
+    Exact ROC curve from coarse histograms of the discriminants, refined with the sorted
+    discriminants of the few bins holding the requested cuts.
+
+    The answers match ``SortedRoc`` and puma's ``calc_rej`` exactly, as long as the bins holding
+    the queried cuts were refined. Built from two passes over the data by
+    ``refine_histograms``.
+    """
+
+    def __init__(self, hists, disc_dtype):
+        """
+        Parameters:
+        ----------
+            hists: dict of arrays returned by ``refine_histograms``
+            disc_dtype: dtype of the discriminant
+        """
+        self.edges = np.asarray(hists["edges"])
+        self.disc_dtype = disc_dtype
+        self._sig = _RefinedHistogram(
+            hists["sig_counts"], hists["sig_refined"], hists["sig_values"]
+        )
+        self._bkg = _RefinedHistogram(
+            hists["bkg_counts"], hists["bkg_refined"], hists["bkg_values"]
+        )
+        self.n_sig = int(self._sig.counts.sum())
+        self.n_bkg = int(self._bkg.counts.sum())
+
+    def cuts(self, sig_eff):
+        """
+        Return the discriminant cuts giving the requested signal efficiencies.
+        """
+        quantiles = 1.0 - np.atleast_1d(np.asarray(sig_eff, dtype=np.float64))
+        cuts = np.empty(len(quantiles))
+        for i, quantile in enumerate(quantiles):
+            ranks = percentile_window(quantile, self.n_sig)
+            xp = percentile_cdf(ranks, self.n_sig, self.disc_dtype)
+            cuts[i] = np.interp(quantile, xp, self._sig.rank_values(ranks))
+        return cuts.reshape(np.shape(sig_eff))
+
+    def sig_eff(self, cuts):
+        """
+        Return the fraction of signal jets with a discriminant greater or equal to the cuts,
+        compared in the precision of the discriminant.
+        """
+        cuts = np.asarray(cuts, dtype=self.disc_dtype)
+        return self._sig.n_passing(self.edges, cuts) / self.n_sig
+
+    def bkg_eff(self, cuts):
+        """
+        Return the fraction of background jets with a discriminant greater or equal to the
+        cuts, compared in the precision of the discriminant.
+        """
+        cuts = np.asarray(cuts, dtype=self.disc_dtype)
+        return self._bkg.n_passing(self.edges, cuts) / self.n_bkg
+
+    def rej(self, sig_eff):
+        """
+        Return the background rejections at the requested signal efficiencies, inf where no
+        background jet passes.
+        """
+        return inverse(self._bkg.n_passing(self.edges, self.cuts(sig_eff)) / self.n_bkg)
+
+    def cut_rej(self, cuts):
+        """
+        Return the background rejections on the ROC curve at the signal efficiencies of the cuts.
+        """
+        return self.rej(self.sig_eff(cuts))
+
+
+class _RefinedHistogram:
+    """
+    Histogram counts of one class with the sorted values of its refined bins.
+    """
+
+    def __init__(self, counts, refined, values):
+        self.counts = np.asarray(counts)
+        self.refined = np.asarray(refined, dtype=bool)
+        self.values = np.asarray(values)
+
+        # number of values in the bins below, and number of values greater or equal to each edge
+        self.below = np.cumsum(self.counts) - self.counts
+        self.passing = np.append(np.cumsum(self.counts[::-1])[::-1], 0)
+        # position of the first value of each bin in the sorted values of the refined bins
+        self.offsets = np.cumsum(self.counts * self.refined) - self.counts * self.refined
+
+    def _check_refined(self, bins):
+        if not np.all(self.refined[bins]):
+            raise ValueError("RefinedRoc: query outside of the refined bins")
+
+    def rank_values(self, ranks):
+        """
+        Return the values of the given ranks in the sorted data.
+        """
+        bins = np.searchsorted(self.below + self.counts, ranks, side="right")
+        self._check_refined(bins)
+        return self.values[self.offsets[bins] + ranks - self.below[bins]]
+
+    def n_passing(self, edges, cuts):
+        """
+        Return the number of values greater or equal to each cut.
+        """
+        cuts = np.atleast_1d(cuts)
+        bins = np.searchsorted(edges, cuts, side="right") - 1
+        n_pass = self.passing[bins + 1].copy()
+
+        # cuts inside a bin count the values of the bin above the cut
+        on_edge = cuts == edges[bins]
+        n_pass[on_edge] = self.passing[bins[on_edge]]
+        inside = bins[~on_edge]
+        self._check_refined(inside)
+        bin_end = self.offsets[inside] + self.counts[inside]
+        n_pass[~on_edge] += bin_end - np.searchsorted(self.values, cuts[~on_edge], side="left")
+        return n_pass
+
+
+def refine_histograms(read_chunks, sig_eff, cut_values, disc_dtype, n_bins=REFINEMENT_ROC_BINS):
+    """
+    Collect the data of an exact ROC curve in two passes over the data. The first pass fills coarse
+    histograms of the discriminants, which locate the bins holding the cuts of the requested
+    signal efficiencies and of the cut values. The second pass only keeps the discriminants of
+    these bins, so the memory scales with the number of jets close to the cuts.
+
+    Parameters:
+    ----------
+        read_chunks: function without arguments returning an iterator over chunks of
+            (signal discriminants, background discriminants)
+        sig_eff: signal efficiencies at which the rejection is queried
+        cut_values: discriminant cuts at which the efficiency and rejection are queried
+        disc_dtype: dtype of the discriminant
+        n_bins: approximate number of coarse bins between 0 and 1
+    Returns:
+    -------
+        dict with the bin edges ("edges") and, for the signal and the background, the counts in
+        the bins ("sig_counts"), the refined bins ("sig_refined") and their sorted
+        discriminants ("sig_values"), to be passed to RefinedRoc
+    """
+    cut_values = np.asarray(cut_values, dtype=disc_dtype)
+    edges = roc_bin_edges(n_bins, cut_values)
+
+    # FIRST PASS: COARSE HISTOGRAMS
+    # -----------------------------
+    sig_counts = np.zeros(len(edges) - 1, dtype=np.int64)
+    bkg_counts = np.zeros(len(edges) - 1, dtype=np.int64)
+    for sig_disc, bkg_disc in read_chunks():
+        fill_histogram(sig_counts, edges, sig_disc)
+        fill_histogram(bkg_counts, edges, bkg_disc)
+
+    n_sig = int(sig_counts.sum())
+    sig_below = np.cumsum(sig_counts) - sig_counts
+
+    # the cut values are bin edges, so their signal efficiencies are already exact
+    cut_bins = np.searchsorted(edges, cut_values, side="right") - 1
+    cut_effs = (n_sig - sig_below[cut_bins]) / n_sig
+    sig_effs = np.concatenate([np.asarray(sig_eff, dtype=np.float64).ravel(), cut_effs])
+
+    # bins holding the signal ranks used by the percentiles, and the background bins the cuts
+    # between these ranks can fall in
+    sig_refined = np.zeros(len(sig_counts), dtype=bool)
+    bkg_refined = np.zeros(len(bkg_counts), dtype=bool)
+    for eff in sig_effs:
+        ranks = percentile_window(1.0 - eff, n_sig)
+        bins = np.searchsorted(sig_below + sig_counts, ranks, side="right")
+        sig_refined[bins] = True
+        bkg_refined[bins.min() : bins.max() + 1] = True
+
+    # SECOND PASS: KEEP THE DISCRIMINANTS OF THE REFINED BINS
+    # -------------------------------------------------------
+    sig_kept = []
+    bkg_kept = []
+    for sig_disc, bkg_disc in read_chunks():
+        sig_bins = np.searchsorted(edges, sig_disc, side="right") - 1
+        bkg_bins = np.searchsorted(edges, bkg_disc, side="right") - 1
+        sig_kept.append(sig_disc[sig_refined[np.minimum(sig_bins, len(sig_counts) - 1)]])
+        bkg_kept.append(bkg_disc[bkg_refined[np.minimum(bkg_bins, len(bkg_counts) - 1)]])
+
+    empty = np.empty(0, dtype=disc_dtype)
+    return {
+        "edges": edges,
+        "sig_counts": sig_counts,
+        "sig_refined": sig_refined,
+        "sig_values": np.sort(np.concatenate(sig_kept)) if sig_kept else empty,
+        "bkg_counts": bkg_counts,
+        "bkg_refined": bkg_refined,
+        "bkg_values": np.sort(np.concatenate(bkg_kept)) if bkg_kept else empty,
+    }
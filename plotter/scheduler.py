@@ -0,0 +1,268 @@
+"""
+Execution of the plots of a run, either one after another or in a pool of worker processes.
+
+In parallel mode the datasets read by several plots are loaded once in the parent process and
+inherited by the forked workers, and every plot gets an estimated peak-memory cost from the
+sizes of the remaining columns it reads. Plots are only started while the sum of the costs of
+the running plots fits in the memory budget.
+"""
+
+import multiprocessing
+import os
+import re
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from plotter.progress import add_read_stats, take_read_stats
+from plotter.tracing import add_events, take_events, trace_plot
+
+
+# ratio between the peak memory of a plot and the size of the columns it reads, accounting for
+# the masked copies and dataframes built from them
+MEMORY_OVERHEAD = 3
+
+# (name, plot object, column requests) of the plots of the run, inherited by the forked worker
+# processes
+_PLOTS = []
+
+# function and items of the current map_ordered call, inherited by the forked worker processes
+_TASK = None
+
+
+def parse_memory(value):
+    """
+    Convert a memory size such as "512M", "16G" or "2000000" to a number of bytes.
+
+    Parameters:
+    ----------
+        value: string or integer memory size
+    Returns:
+    -------
+        size in bytes
+    """
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = re.fullmatch(r"\s*([0-9.]+)\s*([kKmMgGtT]?)i?[bB]?\s*", value)
+    if match is None:
+        raise ValueError(f"Cannot parse memory size '{value}'")
+    number, unit = match.groups()
+    return int(float(number) * 1024 ** " KMGT".index(unit.upper() or " "))
+
+
+def available_memory():
+    """
+    Return the physical memory of the machine in bytes, or None if it cannot be determined.
+    """
+    try:
+        return os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def estimate_memory(store, requests):
+    """
+    Estimate the peak memory of a plot from the columns it reads that are not already held in
+    memory by the store.
+
+    Parameters:
+    ----------
+        store: ColumnStore shared by the plots of the run
+        requests: list of ColumnRequest declared by the plot
+    Returns:
+    -------
+        estimated peak memory in bytes
+    """
+    cost = 0
+    for request in requests:
+        if not store.is_loaded(request.path, request.dataset, request.fields):
+            cost += store.nbytes(request.path, request.dataset, request.fields)
+    return MEMORY_OVERHEAD * cost
+
+
+def _take_reports():
+    """
+    Remove and return the spans and read statistics recorded in a worker process.
+    """
+    return take_events(), take_read_stats()
+
+
+def _add_reports(reports):
+    """
+    Add the spans and read statistics recorded in a worker process.
+    """
+    events, read_stats = reports
+    add_events(events)
+    add_read_stats(read_stats)
+
+
+def _run_plot(index):
+    """
+    Render one plot in a worker process, returning the formatted traceback if it failed, or
+    None, and the spans and read statistics it recorded.
+    """
+    # reports inherited from the parent process are already recorded there
+    _take_reports()
+    name, plot_obj, requests = _PLOTS[index]
+    error = None
+    try:
+        with trace_plot(name):
+            plot_obj.plot()
+    except Exception:
+        error = traceback.format_exc()
+    finally:
+        # workers are reused, and the columns read for this plot would otherwise stay resident
+        # for their later plots while the parent counts their memory as freed, so the copy of
+        # the store in the worker never keeps them
+        plot_obj.store.keep_loaded = False
+        plot_obj.store.release(requests)
+    return error, _take_reports()
+
+
+def _run_task(index):
+    """
+    Apply the function of the current map_ordered call to one of its items in a worker process,
+    returning the result and the spans and read statistics recorded.
+    """
+    _take_reports()
+    func, items = _TASK
+    return func(items[index]), _take_reports()
+
+
+def map_ordered(func, items, workers, processes=True):
+    """
+    Apply ``func`` to every item concurrently and return the results in the order of the items.
+
+    Worker processes are forked from the current one, so ``func`` and the items do not need to
+    be picklable, only the results do. Threads are used instead when ``processes`` is False or
+    forking is not available.
+
+    Parameters:
+    ----------
+        func: function called with a single item
+        items: iterable of items
+        workers: maximum number of items processed at the same time
+        processes: whether to use worker processes rather than threads
+    Returns:
+    -------
+        list of the results of ``func``
+    """
+    global _TASK
+
+    items = list(items)
+    if workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+
+    if processes and "fork" in multiprocessing.get_all_start_methods():
+        _TASK = (func, items)
+        try:
+            context = multiprocessing.get_context("fork")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                results = []
+                for result, reports in pool.map(_run_task, range(len(items))):
+                    _add_reports(reports)
+                    results.append(result)
+                return results
+        finally:
+            _TASK = None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(func, items))
+
+
+def run_serial(names, plot_objs, requirements, store):
+    """
+    Render the plots one after another in the current process.
+
+    Parameters:
+    ----------
+        names: names of the plots in the config
+        plot_objs: plot objects, sharing ``store``
+        requirements: list of ColumnRequest lists, one per plot
+        store: ColumnStore holding the read plan of the run
+    Returns:
+    -------
+        list of (plot name, traceback) for the plots that failed
+    """
+    failures = []
+    for name, plot_obj, requests in zip(names, plot_objs, requirements):
+        try:
+            with trace_plot(name):
+                plot_obj.plot()
+        except Exception:
+            failures.append((name, traceback.format_exc()))
+        store.release(requests)
+    return failures
+
+
+def run_parallel(names, plot_objs, requirements, store, jobs, memory_budget=None):
+    """
+    Render the plots in a pool of ``jobs`` forked worker processes without exceeding the
+    memory budget.
+
+    Parameters:
+    ----------
+        names: names of the plots in the config
+        plot_objs: plot objects, sharing ``store``
+        requirements: list of ColumnRequest lists, one per plot
+        store: ColumnStore holding the read plan of the run
+        jobs: maximum number of plots rendered at the same time
+        memory_budget: memory in bytes available to the run, defaults to the physical memory
+    Returns:
+    -------
+        list of (plot name, traceback) for the plots that failed
+    """
+    if "fork" not in multiprocessing.get_all_start_methods():
+        print("Parallel plotting needs the 'fork' start method, running the plots serially")
+        return run_serial(names, plot_objs, requirements, store)
+
+    if memory_budget is None:
+        memory_budget = available_memory() or float("inf")
+
+    # datasets shared by several plots are read once here and inherited by the workers
+    resident = store.preload()
+    costs = [estimate_memory(store, requests) for requests in requirements]
+
+    _PLOTS[:] = zip(names, plot_objs, requirements)
+    failures = []
+    running = {}  # future -> plot index
+    in_use = resident
+    # start the most expensive plots first, so the cheap ones fill the remaining budget
+    pending = sorted(range(len(plot_objs)), key=lambda index: -costs[index])
+
+    context = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as pool:
+        while pending or running:
+            for index in list(pending):
+                if len(running) >= jobs:
+                    break
+                # a plot larger than the budget is only started when nothing else runs
+                if running and in_use + costs[index] > memory_budget:
+                    continue
+                if in_use + costs[index] > memory_budget:
+                    print(
+                        f"Plot '{names[index]}' needs an estimated {costs[index] / 1e9:.2f} GB, "
+                        "more than the memory budget allows"
+                    )
+                pending.remove(index)
+                running[pool.submit(_run_plot, index)] = index
+                in_use += costs[index]
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = running.pop(future)
+                in_use -= costs[index]
+                # the store of the worker was released in the worker, the plan of the run and
+                # the datasets kept for later runs are in the store of this process
+                store.release(requirements[index])
+                try:
+                    error, reports = future.result()
+                    _add_reports(reports)
+                except Exception:
+                    error = traceback.format_exc()
+                if error is not None:
+                    failures.append((names[index], error))
+
+    _PLOTS.clear()
+    # keep the failures in config order
+    order = {name: position for position, name in enumerate(names)}
+    return sorted(failures, key=lambda failure: order[failure[0]])
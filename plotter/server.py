@@ -0,0 +1,172 @@
+"""
+Persistent render server and its command line client.
+
+``gnn-plots serve`` imports the plot classes and their plotting libraries once and keeps the columns read from the sample
+files in a least-recently-used in-memory cache, then renders the configs sent by
+``gnn-plots --remote`` clients over a local Unix socket. Requests are rendered one at a time in
+the working directory of the client, so the outputs are the same as those of a local run.
+
+Each message is a JSON document on its own line. The client sends the config and the options of
+``gnn_plots``, the server answers with the printed output ({"output": text}) as it is produced,
+followed by the names of the failed plots ({"failures": [...]}).
+"""
+
+import contextlib
+import importlib
+import json
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+import traceback
+
+import matplotlib
+
+from plotter.build_state import input_paths
+from plotter.loader import ColumnStore
+from plotter.main import file_states, gnn_plots, load_config
+from plotter.registry import PLOT_CLASSES
+from plotter.scheduler import parse_memory
+
+
+# default socket of the server, one per user
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), f"gnn-plots-{os.getuid()}.sock")
+
+# default size cap of the columns kept in memory by the server
+DEFAULT_COLUMN_CACHE = "8G"
+
+# plotting libraries the plot classes import on first use, imported when the server starts
+PLOTTING_MODULES = ("matplotlib.pyplot", "puma", "puma.utils", "puma.matshow", "atlasify", "ftag")
+
+
+
+class _MessageWriter:
+    """
+    File-like object sending everything written to it as output messages.
+    """
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+
+    def write(self, text):
+        if text:
+            send_message(self.wfile, {"output": text})
+        return len(text)
+
+    def flush(self):
+        self.wfile.flush()
+
+
+def send_message(wfile, message):
+    """
+    Write one JSON message on its own line.
+    """
+    wfile.write(json.dumps(message).encode() + b"\n")
+    wfile.flush()
+
+
+class RenderServer(socketserver.UnixStreamServer):
+    """
+    Unix socket server rendering configs with warm imports and a shared column store.
+    """
+
+    def __init__(self, socket_path, max_kept_bytes):
+        self.store = ColumnStore(keep_loaded=True, max_kept_bytes=max_kept_bytes)
+        self.file_states = {}  # sample path -> (size, mtime) when its columns were read
+        super().__init__(socket_path, RenderHandler)
+
+    def refresh(self, config_file):
+        """
+        Drop the kept columns of the sample files of a config that changed since they were read.
+        """
+        paths = input_paths(load_config(config_file).get("plots", {}))
+        for path, state in file_states(paths).items():
+            if path in self.file_states and self.file_states[path] != state:
+                self.store.drop(path)
+            self.file_states[path] = state
+
+
+class RenderHandler(socketserver.StreamRequestHandler):
+    """
+    Render the config of one client request.
+    """
+
+    def handle(self):
+        request = json.loads(self.rfile.readline())
+        writer = _MessageWriter(self.wfile)
+
+        failures = None
+        cwd = os.getcwd()
+        try:
+            os.chdir(request["cwd"])
+            with contextlib.redirect_stdout(writer), contextlib.redirect_stderr(writer):
+                self.server.refresh(request["config"])
+                failures = gnn_plots(
+                    request["config"], store=self.server.store, **request["options"]
+                )
+        except (Exception, SystemExit):
+            writer.write(traceback.format_exc())
+        finally:
+            os.chdir(cwd)
+
+        names = None if failures is None else [name for name, _ in failures]
+        send_message(self.wfile, {"failures": names})
+
+
+def serve(socket_path=DEFAULT_SOCKET, max_kept_bytes=parse_memory(DEFAULT_COLUMN_CACHE)):
+    """
+    Run the render server until it is interrupted.
+
+    Parameters:
+    ----------
+        socket_path: path of the Unix socket to listen on
+        max_kept_bytes: size cap of the columns kept in memory between requests
+    """
+    # warm up the imports, the plots are only rendered to files
+    matplotlib.use("Agg")
+    plot_modules = sorted({plot_class.module for plot_class in PLOT_CLASSES.values()})
+    for module_name in plot_modules + list(PLOTTING_MODULES):
+        importlib.import_module(module_name)
+
+    # a socket left by a server that did not shut down cleanly is replaced
+    if os.path.exists(socket_path):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            if probe.connect_ex(socket_path) == 0:
+                raise RuntimeError(f"A gnn-plots server is already listening on {socket_path}")
+        os.remove(socket_path)
+
+    with RenderServer(socket_path, max_kept_bytes) as server:
+        print(f"gnn-plots server listening on {socket_path}")
+        try:
+            server.serve_forever()
+        finally:
+            os.remove(socket_path)
+
+
+def render_remote(config_file, socket_path=DEFAULT_SOCKET, **options):
+    """
+    Send a config to the render server and print its output.
+
+    Parameters:
+    ----------
+        config_file: path to the YAML config file
+        socket_path: path of the Unix socket of the server
+        options: keyword arguments of ``gnn_plots``
+    Returns:
+    -------
+        list of the names of the failed plots, or None if the run itself failed
+    """
+    request = {"config": os.path.abspath(config_file), "cwd": os.getcwd(), "options": options}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        with client.makefile("rwb") as stream:
+            send_message(stream, request)
+            for line in stream:
+                message = json.loads(line)
+                if "output" in message:
+                    sys.stdout.write(message["output"])
+                else:
+                    return message["failures"]
+    return None
+
@@ -0,0 +1,65 @@
+"""
+Stratified subsampling of the jets of a sample, for fast previews of the plots.
+
+The jets of every class are sampled with the same fraction, with a seeded generator so that
+every run and every plot of a run selects the same jets. Each selected jet carries the weight
+of the jets of its class it stands for, which plots showing absolute numbers of jets or
+mixing classes use to correct their normalisation.
+"""
+
+import numpy as np
+
+
+def subsample_fraction(n_jets, sample_fraction=None, max_jets=None):
+    """
+    Return the fraction of jets kept by the subsampling options.
+
+    Parameters:
+    ----------
+        n_jets: number of jets in the sample
+        sample_fraction: fraction of the jets to keep, or None
+        max_jets: maximum number of jets to keep, or None
+    Returns:
+    -------
+        fraction between 0 and 1
+    """
+    fraction = 1.0 if sample_fraction is None else float(sample_fraction)
+    if max_jets is not None and n_jets > 0:
+        fraction = min(fraction, max_jets / n_jets)
+    return min(max(fraction, 0.0), 1.0)
+
+
+def stratified_rows(labels, fraction, seed=0):
+    """
+    Draw the same fraction of the jets of every class without replacement. Jets with a NaN
+    label belong to no class and are never selected.
+
+    Parameters:
+    ----------
+        labels: array of the class label of every jet
+        fraction: fraction of the jets of each class to keep
+        seed: seed of the random generator
+    Returns:
+    -------
+        tuple of the sorted indices of the selected jets and their weights, the number of jets
+        of their class divided by the number of selected ones
+    """
+    labels = np.asarray(labels)
+    rng = np.random.default_rng(seed)
+
+    rows = []
+    weights = []
+    for label in np.unique(labels):
+        class_rows = np.flatnonzero(labels == label)
+        if len(class_rows) == 0:
+            # a NaN label is unique but equal to no jet
+            continue
+        # non-empty classes keep at least one jet, so no class disappears from the plots
+        n_selected = max(1, int(round(fraction * len(class_rows)))) if fraction > 0 else 0
+        rows.append(rng.choice(class_rows, n_selected, replace=False))
+        weights.append(np.full(n_selected, len(class_rows) / max(n_selected, 1)))
+
+    rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+    weights = np.concatenate(weights) if weights else np.zeros(0)
+    order = np.argsort(rows)
+    return rows[order].astype(np.int64), weights[order]
@@ -0,0 +1,195 @@
+"""
+Generator of synthetic salt output files, for running and benchmarking the plots without access
+to the real samples.
+
+The files have the schema the plot classes expect: a ``jets`` compound dataset with the jet
+label, kinematics and GNN scores (the emerging and prompt jet probabilities being the last two
+fields), and a padded ``tracks`` dataset with the truth and predicted vertex indices and track
+origins of every track. Emerging jets have displaced vertices and high scores, QCD jets mostly
+prompt tracks and low scores, so the curves and matrices drawn from them look plausible. The
+score distributions overlap and QCD jets also have a few displaced vertices, so the rejections
+of the usual working points (0.98, 0.99) are finite, around 300 and 900, in every bin of the
+performance plots.
+"""
+
+import h5py
+import numpy as np
+
+
+JET_DTYPE = np.dtype(
+    [
+        ("isDisplaced", "i4"),
+        ("pt", "f4"),
+        ("eta", "f4"),
+        ("GN2ej_pdispjet", "f4"),
+        ("GN2ej_pprompt", "f4"),
+    ]
+)
+
+# version of the generated distributions, changed whenever they change so that samples written
+# by an older generator, e.g. cached benchmark samples, are not reused
+GENERATOR_VERSION = 2
+
+# mean (positive for emerging jets, negative for QCD jets) and width of the score logits
+SCORE_LOGIT_MEAN = 1.5
+SCORE_LOGIT_WIDTH = 2.0
+
+# mean number of displaced vertices of the QCD jets
+QCD_MEAN_VERTICES = 1.5
+
+TRACK_DTYPE = np.dtype(
+    [
+        ("valid", "?"),
+        ("truthVertexIndex", "i4"),
+        ("VertexIndex", "i4"),
+        ("truthOriginLabel", "i4"),
+        ("pileup", "f4"),
+        ("fake", "f4"),
+        ("prompt", "f4"),
+        ("displaced", "f4"),
+        ("z0SinTheta", "f4"),
+        ("VSIVertexIndex", "i4"),
+    ]
+)
+
+# track origin labels, in the order of the origin scores
+PILEUP, FAKE, PROMPT, DISPLACED = range(4)
+
+# number of jets generated at a time
+GENERATE_CHUNK_JETS = 100_000
+
+
+def generate_jets(rng, n_jets, signal_fraction):
+    """
+    Generate the jets dataset of a chunk.
+
+    Parameters:
+    ----------
+        rng: numpy random generator
+        n_jets: number of jets
+        signal_fraction: fraction of emerging jets
+    Returns:
+    -------
+        structured array of JET_DTYPE
+    """
+    jets = np.zeros(n_jets, dtype=JET_DTYPE)
+    is_disp = rng.random(n_jets) < signal_fraction
+    jets["isDisplaced"] = is_disp
+
+    # falling pT spectrum above 20 GeV, in MeV
+    jets["pt"] = 2e4 + rng.exponential(3e5, n_jets)
+    jets["eta"] = rng.uniform(-2.5, 2.5, n_jets)
+
+    # Gaussian logits with a finite separation, so that the tails overlap and QCD jets pass
+    # the working points of the configs, as in real samples
+    logit = rng.normal(np.where(is_disp, SCORE_LOGIT_MEAN, -SCORE_LOGIT_MEAN), SCORE_LOGIT_WIDTH)
+    score = 1 / (1 + np.exp(-logit))
+    jets["GN2ej_pdispjet"] = score
+    jets["GN2ej_pprompt"] = 1 - score
+    return jets
+
+
+def generate_tracks(rng, is_disp, max_tracks, max_vertices):
+    """
+    Generate the padded tracks dataset of a chunk.
+
+    Parameters:
+    ----------
+        rng: numpy random generator
+        is_disp: boolean array, True for the emerging jets of the chunk
+        max_tracks: number of track slots per jet
+        max_vertices: maximum number of displaced vertices per emerging jet
+    Returns:
+    -------
+        structured array of TRACK_DTYPE with shape (number of jets, max_tracks)
+    """
+    n_jets = len(is_disp)
+    shape = (n_jets, max_tracks)
+    tracks = np.zeros(shape, dtype=TRACK_DTYPE)
+
+    n_tracks = np.clip(1 + rng.poisson(max_tracks / 3, n_jets), 1, max_tracks)
+    valid = np.arange(max_tracks) < n_tracks[:, None]
+    tracks["valid"] = valid
+
+    # emerging jets have 1 to max_vertices vertices holding about 60% of their tracks, QCD jets
+    # a few from heavy flavour decays and material interactions holding about 35% of them
+    n_qcd_vertices = np.minimum(rng.poisson(QCD_MEAN_VERTICES, n_jets), max_vertices)
+    n_vertices = np.where(is_disp, rng.integers(1, max_vertices + 1, n_jets), n_qcd_vertices)
+    vertex_fraction = np.where(is_disp, 0.6, 0.35)[:, None]
+    in_vertex = (rng.random(shape) < vertex_fraction) & (n_vertices > 0)[:, None] & valid
+    vertex = np.floor(rng.random(shape) * np.maximum(n_vertices, 1)[:, None]).astype(np.int32)
+    truth_vertex = np.where(in_vertex, vertex, -1)
+    tracks["truthVertexIndex"] = np.where(valid, truth_vertex, -1)
+
+    # the predicted vertices find the true ones 80% of the time
+    reconstructed = rng.random(shape) < 0.8
+    random_vertex = rng.integers(0, max_vertices + 1, shape)
+    pred_vertex = np.where(in_vertex & reconstructed, truth_vertex, random_vertex)
+    tracks["VertexIndex"] = np.where(valid, pred_vertex, -1)
+    tracks["VSIVertexIndex"] = np.where(valid & in_vertex & reconstructed, truth_vertex, -1)
+
+    # tracks outside the vertices are prompt, pileup or fake
+    other_origin = rng.choice([PROMPT, PILEUP, FAKE], size=shape, p=[0.8, 0.15, 0.05])
+    origin = np.where(in_vertex, DISPLACED, other_origin)
+    tracks["truthOriginLabel"] = np.where(valid, origin, -1)
+
+    # origin scores favouring the true origin
+    alpha = np.ones(shape + (4,))
+    np.put_along_axis(alpha, origin[..., None], 5.0, axis=-1)
+    scores = rng.standard_gamma(alpha)
+    scores /= scores.sum(axis=-1, keepdims=True)
+    for label, field in enumerate(("pileup", "fake", "prompt", "displaced")):
+        tracks[field] = np.where(valid, scores[..., label], np.nan)
+
+    z0 = np.where(origin == DISPLACED, rng.normal(0, 3, shape), rng.normal(0, 0.3, shape))
+    tracks["z0SinTheta"] = np.where(valid, z0, np.nan)
+    return tracks
+
+
+def make_sample(
+    path,
+    n_jets,
+    max_tracks=40,
+    max_vertices=5,
+    signal_fraction=0.5,
+    seed=0,
+    chunk_jets=GENERATE_CHUNK_JETS,
+):
+    """
+    Write a synthetic salt output file, generating the jets in chunks so that the memory does
+    not depend on the number of jets.
+
+    Parameters:
+    ----------
+        path: path of the HDF5 file to write
+        n_jets: number of jets
+        max_tracks: number of track slots per jet
+        max_vertices: maximum number of displaced vertices per emerging jet
+        signal_fraction: fraction of emerging jets
+        seed: seed of the random generator, the same seed gives the same file
+        chunk_jets: number of jets generated at a time
+    """
+    with h5py.File(path, "w") as hdf_file:
+        ds_jets = hdf_file.create_dataset(
+            "jets",
+            shape=(n_jets,),
+            dtype=JET_DTYPE,
+            chunks=(max(1, min(n_jets, 10_000)),),
+            compression="lzf",
+        )
+        ds_tracks = hdf_file.create_dataset(
+            "tracks",
+            shape=(n_jets, max_tracks),
+            dtype=TRACK_DTYPE,
+            chunks=(max(1, min(n_jets, 1_000)), max_tracks),
+            compression="lzf",
+        )
+        for index, start in enumerate(range(0, n_jets, chunk_jets)):
+            # one generator per chunk, so the file does not depend on the chunk memory
+            rng = np.random.default_rng([seed, index])
+            stop = min(start + chunk_jets, n_jets)
+            jets = generate_jets(rng, stop - start, signal_fraction)
+            ds_jets[start:stop] = jets
+            ds_tracks[start:stop] = generate_tracks(
+                rng, jets["isDisplaced"] == 1, max_tracks, max_vertices
+            )
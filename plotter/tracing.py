@@ -0,0 +1,300 @@
+"""
+Tracing of the stages of the plots of a run.
+
+When tracing is enabled, every plot records a span for its whole run, with its peak resident
+memory, and nested spans for the stages it goes through:
+
+    open      opening of a sample file
+    read      reads from a sample file, with the number of rows and bytes read
+    compute   computation of a derived quantity (see ``PlotBase.derived``)
+    draw      drawing of a figure
+    savefig   writing of a figure (every ``matplotlib.figure.Figure.savefig`` call)
+
+The reads and computations are traced by the column store and ``PlotBase``, so every plot
+class inherits them. The spans are reported as a summary table, or written as a Chrome trace
+that can be opened in Perfetto (https://ui.perfetto.dev) or chrome://tracing. Plots can also be
+profiled with cProfile, writing one stats file per plot.
+
+Tracing is disabled by default, and the spans then cost a single check.
+"""
+
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+
+
+# stages of a plot, in the order of the summary table
+STAGES = ("open", "read", "compute", "draw", "savefig")
+
+# name of the Chrome trace written in the output directory
+TRACE_FILE = "gnn-plots-trace.json"
+
+# tracer of the run, None when tracing is disabled
+_TRACER = None
+
+
+def peak_rss():
+    """
+    Return the peak resident memory of the process in bytes, or None if it is not available.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+def reset_peak_rss():
+    """
+    Reset the peak resident memory of the process to the current one where the system allows it,
+    so that the peak of each plot is measured separately.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+class Tracer:
+    """
+    Collector of the spans of a run.
+    """
+
+    def __init__(self, profile_dir=None):
+        self.events = []
+        self.profile_dir = profile_dir
+        self._plot = None  # name of the plot being run
+
+    @contextlib.contextmanager
+    def span(self, stage, name=None, **args):
+        """
+        Record a span of a stage. The arguments dict is yielded, so that sizes known at the end
+        of the span can be added to it.
+        """
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            self.events.append(
+                {
+                    "name": name or stage,
+                    "cat": stage,
+                    "ph": "X",
+                    "ts": start * 1e6,
+                    "dur": (time.perf_counter() - start) * 1e6,
+                    "pid": os.getpid(),
+                    "tid": threading.get_ident(),
+                    "args": args,
+                    "plot": self._plot,
+                }
+            )
+
+    @contextlib.contextmanager
+    def plot(self, name):
+        """
+        Record the span of a plot, with its peak resident memory, profiling it if requested.
+        """
+        reset_peak_rss()
+        profiler = None
+        if self.profile_dir is not None:
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+        self._plot = name
+        try:
+            with self.span("plot", name) as args:
+                try:
+                    yield
+                finally:
+                    rss = peak_rss()
+                    if rss is not None:
+                        args["peak_rss_mb"] = round(rss / 1024**2, 1)
+        finally:
+            self._plot = None
+            if profiler is not None:
+                profiler.disable()
+                os.makedirs(self.profile_dir, exist_ok=True)
+                profiler.dump_stats(os.path.join(self.profile_dir, f"{name}.prof"))
+
+
+def _wrap_savefig():
+    """
+    Wrap ``Figure.savefig`` once, so that every figure written while tracing gets a span.
+    """
+    from matplotlib.figure import Figure
+
+    if getattr(Figure.savefig, "trace_wrapper", False):
+        return
+    untraced_savefig = Figure.savefig
+
+    @functools.wraps(untraced_savefig)
+    def traced_savefig(fig, fname, *args, **kwargs):
+        if _TRACER is None:
+            return untraced_savefig(fig, fname, *args, **kwargs)
+        name = os.fspath(fname) if isinstance(fname, (str, os.PathLike)) else None
+        with _TRACER.span("savefig", name):
+            return untraced_savefig(fig, fname, *args, **kwargs)
+
+    traced_savefig.trace_wrapper = True
+    Figure.savefig = traced_savefig
+
+
+def enable_tracing(profile_dir=None):
+    """
+    Start recording the spans of the following plots.
+
+    Parameters:
+    ----------
+        profile_dir: directory of the cProfile stats written for every plot, None to not profile
+    """
+    global _TRACER
+    _wrap_savefig()
+    _TRACER = Tracer(profile_dir)
+
+
+def disable_tracing():
+    """
+    Stop recording spans.
+    """
+    global _TRACER
+    _TRACER = None
+
+
+def span(stage, name=None, **args):
+    """
+    Context manager recording a span of a stage when tracing is enabled, yielding its arguments
+    dict so that sizes known at the end of the span can be added to it.
+
+    Parameters:
+    ----------
+        stage: one of STAGES
+        name: name of the span, defaults to the stage
+        args: arguments recorded with the span
+    """
+    if _TRACER is None:
+        return contextlib.nullcontext(args)
+    return _TRACER.span(stage, name, **args)
+
+
+def trace_plot(name):
+    """
+    Context manager recording the span of a plot when tracing is enabled.
+    """
+    if _TRACER is None:
+        return contextlib.nullcontext()
+    return _TRACER.plot(name)
+
+
+def take_events():
+    """
+    Remove and return the spans recorded so far, e.g. to send them from a worker process to
+    the parent one.
+    """
+    if _TRACER is None:
+        return []
+    events, _TRACER.events = _TRACER.events, []
+    return events
+
+
+def recorded_events():
+    """
+    Return the spans recorded so far.
+    """
+    return [] if _TRACER is None else list(_TRACER.events)
+
+
+def add_events(events):
+    """
+    Add spans recorded in a worker process.
+    """
+    if _TRACER is not None:
+        _TRACER.events.extend(events)
+
+
+def write_chrome_trace(events, path):
+    """
+    Write spans in the Chrome trace event format, readable by Perfetto and chrome://tracing.
+    """
+    trace_events = []
+    for event in events:
+        event = {key: value for key, value in event.items() if key != "plot"}
+        trace_events.append(event)
+    with open(path, "w") as f:
+        json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, f)
+
+
+def format_summary(events):
+    """
+    Return a table of the time spent by every plot in each stage, with the size of its reads
+    and its peak resident memory. The time of a plot outside of the traced stages is counted
+    as compute. Reads done for several plots at once are reported on a separate line.
+
+    Parameters:
+    ----------
+        events: list of the recorded spans
+    Returns:
+    -------
+        printable table
+    """
+    rows = {}  # plot name -> stage -> seconds
+    for event in events:
+        row = rows.setdefault(event["plot"], dict.fromkeys(STAGES + ("total",), 0.0))
+        if event["cat"] == "plot":
+            row["total"] += event["dur"] / 1e6
+            row["peak_rss_mb"] = event["args"].get("peak_rss_mb")
+        elif event["cat"] in STAGES and event["cat"] != "compute":
+            row[event["cat"]] += event["dur"] / 1e6
+        if event["cat"] == "read":
+            row["bytes"] = row.get("bytes", 0) + event["args"].get("bytes", 0)
+
+    header = f"{'plot':<24}{'total':>9}" + "".join(f"{stage:>9}" for stage in STAGES)
+    lines = [header + f"{'read MB':>10}{'MB/s':>9}{'peak MB':>9}"]
+    for plot, row in sorted(rows.items(), key=lambda item: item[0] is None):
+        staged = sum(row[stage] for stage in STAGES)
+        if plot is None:
+            # reads shared between plots, done before any of them runs
+            row["total"] = staged
+        row["compute"] = max(0.0, row["total"] - staged)
+        megabytes = row.get("bytes", 0) / 1024**2
+        rate = f"{megabytes / row['read']:9.1f}" if row["read"] > 0 else f"{'-':>9}"
+        rss = row.get("peak_rss_mb")
+        lines.append(
+            f"{plot or '(shared reads)':<24}{row['total']:9.3f}"
+            + "".join(f"{row[stage]:9.3f}" for stage in STAGES)
+            + f"{megabytes:10.1f}{rate}"
+            + (f"{rss:9.0f}" if rss is not None else f"{'-':>9}")
+        )
+    return "\n".join(lines)
+
+
+def report(trace, output_dir):
+    """
+    Print or write the report of the recorded spans.
+
+    Parameters:
+    ----------
+        trace: "summary" to print a table, "chrome" to write a Chrome trace
+        output_dir: directory of the Chrome trace
+    """
+    events = recorded_events()
+    if trace == "summary":
+        print(format_summary(events))
+    elif trace == "chrome":
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, TRACE_FILE)
+        write_chrome_trace(events, path)
+        print(f"Trace written to {path}")
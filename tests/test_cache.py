@@ -0,0 +1,38 @@
+import os
+import threading
+
+import numpy as np
+
+from plotter.cache import DerivedCache
+
+
+def test_concurrent_puts_of_the_same_entry(tmp_path):
+    sample = tmp_path / "sample.h5"
+    sample.write_bytes(b"sample")
+    cache = DerivedCache(str(tmp_path / "cache"))
+    arrays = {"values": np.arange(20_000)}
+
+    errors = []
+    barrier = threading.Barrier(8)
+
+    def put():
+        barrier.wait()
+        try:
+            for _ in range(5):
+                cache.put(str(sample), "derived", {"option": 1}, arrays)
+                cache.manifest(str(sample), lambda path: {"path": path})
+        except Exception as err:
+            errors.append(err)
+
+    threads = [threading.Thread(target=put) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    np.testing.assert_array_equal(
+        cache.get(str(sample), "derived", {"option": 1})["values"], arrays["values"]
+    )
+    # no temporary file is left behind
+    assert not [name for name in os.listdir(cache.directory) if name.endswith(".tmp")]
@@ -0,0 +1,63 @@
+import h5py
+import numpy as np
+from puma.utils import confusion_matrix
+
+from plotter.config_dict import ConfigDict
+from plotter.plot_classes.confusion_matrix_plot import ConfMatPlotBase
+from plotter.synthetic import generate_tracks
+
+
+def make_tracks(n_jets, seed=0):
+    """
+    Return synthetic tracks with some origin scores tied for the highest one.
+    """
+    rng = np.random.default_rng(seed)
+    tracks = generate_tracks(rng, rng.random(n_jets) < 0.5, max_tracks=20, max_vertices=5)
+    tied = rng.random(tracks.shape) < 0.05
+    tracks["fake"][tied] = tracks["prompt"][tied] = tracks["displaced"][tied] = 1.0
+    return tracks
+
+
+def confusion_matrix_baseline(tracks, normalize):
+    """
+    Track origin confusion matrix built track by track, as by the original ConfMatPlotBase.
+    """
+    valid = tracks["valid"]
+    true_origin = tracks["truthOriginLabel"][valid]
+    pred_origin = np.empty(len(true_origin))
+    scores = zip(*(tracks[field][valid] for field in ("pileup", "fake", "prompt", "displaced")))
+    for i, (pu, fk, pr, dp) in enumerate(scores):
+        origin = max(pu, fk, pr, dp)
+        if origin == pu:
+            pred_origin[i] = 0
+        elif origin == fk:
+            pred_origin[i] = 1
+        elif origin == pr:
+            pred_origin[i] = 2
+        elif origin == dp:
+            pred_origin[i] = 3
+    return confusion_matrix.confusion_matrix(
+        targets=true_origin, predictions=pred_origin, normalize=normalize
+    )
+
+
+def test_track_origin_counts_match_baseline(tmp_path):
+    tracks = make_tracks(3_000)
+    path = str(tmp_path / "sample.h5")
+    with h5py.File(path, "w") as hdf_file:
+        hdf_file.create_dataset("tracks", data=tracks, chunks=(500, 20))
+
+    sample = {"path": path, "label": "A", "df_name": "tracks"}
+    plot = ConfMatPlotBase(samples=sample, task_type="track_origin", chunk_size=700)
+    counts = plot.count_track_origins(ConfigDict(sample))["counts"]
+
+    # the plot computes the confusion matrix from the counts of every origin pair
+    true_origin, pred_origin = np.indices(counts.shape).reshape(2, -1)
+    for normalize in (None, "rownorm"):
+        confmat = confusion_matrix.confusion_matrix(
+            targets=true_origin,
+            predictions=pred_origin,
+            sample_weights=counts.ravel(),
+            normalize=normalize,
+        )
+        np.testing.assert_allclose(confmat, confusion_matrix_baseline(tracks, normalize))
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+from puma import VarVsEff
+from scipy.stats import beta
+
+from plotter.efficiency import CutEfficiencies, clopper_pearson, fill_cut_histogram, score_cuts
+
+BIN_EDGES = [0.0, 0.2, 0.4, 0.6, 1.0, 2.0]
+WORKING_POINTS = [0.99, 0.5, 0.9, 0.95]
+
+
+def make_jets(n_jets, seed=0):
+    """
+    Return the variable, discriminant and label of jets, with some NaN discriminants and some
+    jets outside of the bins.
+    """
+    rng = np.random.default_rng(seed)
+    label = rng.random(n_jets) < 0.5
+    x = rng.uniform(-0.1, 2.2, n_jets)
+    disc = np.where(label, rng.beta(2, 1, n_jets), rng.beta(1, 2, n_jets)).astype(np.float32)
+    disc[rng.random(n_jets) < 0.01] = np.nan
+    return x, disc, label
+
+
+def cut_efficiencies(x, disc, label, cuts, chunk_rows=7_000, uncertainty="binomial"):
+    shape = (len(BIN_EDGES) - 1, len(cuts) + 1)
+    sig_counts = np.zeros(shape, dtype=np.int64)
+    bkg_counts = np.zeros(shape, dtype=np.int64)
+    for start in range(0, len(x), chunk_rows):
+        rows = slice(start, start + chunk_rows)
+        for counts, selected in ((sig_counts, label[rows]), (bkg_counts, ~label[rows])):
+            fill_cut_histogram(
+                counts, np.asarray(BIN_EDGES), cuts, x[rows][selected], disc[rows][selected]
+            )
+    return CutEfficiencies(BIN_EDGES, cuts, sig_counts, bkg_counts, uncertainty)
+
+
+def test_cut_efficiencies_match_var_vs_eff():
+    x, disc, label = make_jets(50_000)
+    efficiencies = cut_efficiencies(x, disc, label, score_cuts(WORKING_POINTS, disc.dtype))
+
+    for wp in WORKING_POINTS:
+        var_vs_eff = VarVsEff(
+            x_var_sig=x[label],
+            disc_sig=disc[label],
+            x_var_bkg=x[~label],
+            disc_bkg=disc[~label],
+            bins=BIN_EDGES,
+            working_point=None,
+            disc_cut=wp,
+        )
+        for mode, values in (
+            ("sig_eff", efficiencies.sig_eff(wp)),
+            ("bkg_rej", efficiencies.bkg_rej(wp)),
+        ):
+            for expected, value in zip(var_vs_eff.get(mode), values):
+                np.testing.assert_allclose(value, expected, equal_nan=True)
+
+
+def test_flat_cuts_keep_the_target_efficiency():
+    x, disc, label = make_jets(50_000)
+    efficiencies = cut_efficiencies(x, disc, label, score_cuts([], disc.dtype, 10_000))
+
+    cuts = efficiencies.flat_cuts(0.8)
+    sig_eff, _ = efficiencies.sig_eff(cuts)
+    x_bins = np.digitize(x, BIN_EDGES) - 1
+    for i, cut in enumerate(cuts):
+        sig_disc = disc[label & (x_bins == i)]
+        assert sig_eff[i] == pytest.approx(np.mean(sig_disc > cut))
+        assert 0.8 <= sig_eff[i] < 0.81
+
+
+def test_clopper_pearson_matches_beta_quantiles():
+    n_pass = np.array([0, 3, 10, 7, 0])
+    n_total = np.array([10, 10, 10, 20, 0])
+    lower, upper = clopper_pearson(n_pass, n_total)
+
+    alpha = (1 - 0.6827) / 2
+    inside = (n_pass > 0) & (n_pass < n_total)
+    np.testing.assert_allclose(
+        lower[inside], beta.ppf(alpha, n_pass[inside], n_total[inside] - n_pass[inside] + 1)
+    )
+    np.testing.assert_allclose(
+        upper[inside], beta.ppf(1 - alpha, n_pass[inside] + 1, n_total[inside] - n_pass[inside])
+    )
+    assert lower[0] == 0 and upper[2] == 1
+    assert (lower[4], upper[4]) == (0, 1)
@@ -0,0 +1,52 @@
+import numpy as np
+
+from plotter.histograms import fill_folded, update_range
+
+EDGES = np.linspace(-1, 1, 21)
+
+
+def folded_histogram(values, edges):
+    """
+    Histogram of all the values at once, with the under- and overflow added to the outer bins
+    as by puma's hist_w_unc with underoverflow.
+    """
+    values = values[~np.isnan(values)]
+    counts = np.histogram(values, bins=np.concatenate([[-np.inf], edges, [np.inf]]))[0]
+    counts[1] += counts[0]
+    counts[-2] += counts[-1]
+    return counts[1:-1]
+
+
+def make_values(seed=0):
+    """
+    Padded (jets, tracks) values, with values outside the bins, on the edges and NaN.
+    """
+    rng = np.random.default_rng(seed)
+    values = rng.normal(0, 0.7, (5_000, 10)).astype(np.float32)
+    values[rng.random(values.shape) < 0.1] = np.nan
+    values[:3, 0] = (-np.inf, np.inf, 1.0)
+    values[3, :3] = EDGES[[0, 5, -1]]
+    return values
+
+
+def test_fill_folded_matches_np_histogram():
+    values = make_values()
+    counts = np.zeros(len(EDGES) - 1, dtype=np.int64)
+    for start in range(0, len(values), 700):
+        fill_folded(counts, EDGES, values[start : start + 700])
+
+    expected = folded_histogram(values.ravel().astype(np.float64), EDGES)
+    np.testing.assert_array_equal(counts, expected)
+    # the outer bins hold the values outside the bins
+    assert counts[0] > np.histogram(values, bins=EDGES)[0][0]
+    assert counts.sum() == np.sum(~np.isnan(values))
+
+
+def test_update_range_skips_nan():
+    values = make_values()
+    value_range = None
+    for start in range(0, len(values), 700):
+        value_range = update_range(value_range, values[start : start + 700])
+    assert value_range == (np.nanmin(values), np.nanmax(values))
+    assert update_range(value_range, np.full(3, np.nan)) == value_range
+    assert update_range(None, np.zeros(0)) is None
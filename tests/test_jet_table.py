@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+from plotter.jet_table import JetTable
+
+
+def make_columns(n_jets=10_000, seed=0):
+    """
+    Return jet columns with NaN labels and discriminants, in the dtypes of the samples.
+    """
+    rng = np.random.default_rng(seed)
+    label = (rng.random(n_jets) < 0.5).astype(np.float32)
+    label[rng.random(n_jets) < 0.01] = np.nan
+    disc = rng.random(n_jets).astype(np.float32)
+    disc[rng.random(n_jets) < 0.02] = np.nan
+    pt = rng.exponential(3e5, n_jets).astype(np.float32)
+    pt[rng.random(n_jets) < 0.02] = np.nan
+    return {"isDisplaced": label, "disc": disc, "pt": pt}
+
+
+def test_select_matches_dropna_dataframe():
+    columns = make_columns()
+    table = JetTable({field: columns[field] for field in ("isDisplaced", "disc")})
+
+    # selection of the plots before the jet table
+    df = pd.DataFrame({field: columns[field] for field in ("isDisplaced", "disc")}).dropna()
+    for class_label in (0, 1):
+        expected = df[df["isDisplaced"] == class_label]["disc"].values
+        selected = table.select("disc", class_label)
+        assert selected.dtype == np.float32
+        np.testing.assert_array_equal(selected, expected)
+        expected_rows = df.index[df["isDisplaced"] == class_label]
+        np.testing.assert_array_equal(np.flatnonzero(table.mask(class_label)), expected_rows)
+
+
+def test_valid_fields_and_shared_selections():
+    columns = make_columns()
+    table = JetTable(columns, valid_fields=["isDisplaced", "disc"])
+
+    # NaN entries of the other fields do not invalidate a jet
+    np.testing.assert_array_equal(
+        table.valid, ~np.isnan(columns["isDisplaced"]) & ~np.isnan(columns["disc"])
+    )
+    assert np.isnan(table.select("pt", 1)).any()
+    assert table.select("disc", 1) is table.select("disc", 1)
+    assert len(table) == len(columns["disc"]) and table["pt"] is columns["pt"]
+    # every valid jet belongs to a class
+    assert np.sum(table.mask(0)) + np.sum(table.mask(1)) == np.sum(table.valid)
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from plotter.jet_variables import count_jet_vertices
+from plotter.synthetic import generate_tracks
+
+
+def make_tracks(n_jets, seed=0):
+    """
+    Return synthetic tracks, with some tied origin scores and a jet without valid tracks.
+    """
+    rng = np.random.default_rng(seed)
+    tracks = generate_tracks(rng, rng.random(n_jets) < 0.5, max_tracks=20, max_vertices=5)
+    tied = rng.random(tracks.shape) < 0.05
+    tracks["prompt"][tied] = tracks["displaced"][tied]
+    tracks["valid"][0] = False
+    return tracks
+
+
+def count_jet_vertices_baseline(tracks, disp_only):
+    """
+    Number of true and predicted vertices of every jet, counted jet by jet and track by track
+    as by the original NumVertComparePlotBase.
+    """
+    true_num_vert = []
+    pred_num_vert = []
+    for jet in tracks:
+        true_current = jet["truthVertexIndex"]
+        if disp_only:
+            true_num_vert.append(len(np.unique(true_current[jet["truthOriginLabel"] == 3])))
+        else:
+            true_num_vert.append(len(np.unique(true_current[true_current >= 0])))
+
+        valid = jet["valid"]
+        pred_current = jet["VertexIndex"][valid]
+        pu, fk, pr, dp = (jet[field][valid] for field in ("pileup", "fake", "prompt", "displaced"))
+        valid_pred = []
+        for j in range(len(pred_current)):
+            origin = max(pu[j], fk[j], pr[j], dp[j])
+            if disp_only:
+                if origin == dp[j]:
+                    valid_pred.append(pred_current[j])
+            elif origin == pr[j] or origin == dp[j]:
+                valid_pred.append(pred_current[j])
+        pred_num_vert.append(len(np.unique(valid_pred)))
+    return np.asarray(true_num_vert), np.asarray(pred_num_vert)
+
+
+@pytest.mark.parametrize("disp_only", [False, True])
+def test_count_jet_vertices_matches_baseline(disp_only):
+    tracks = make_tracks(2_000)
+    true_num_vert, pred_num_vert = count_jet_vertices(tracks, disp_only)
+
+    expected_true, expected_pred = count_jet_vertices_baseline(tracks, disp_only)
+    np.testing.assert_array_equal(true_num_vert, expected_true)
+    np.testing.assert_array_equal(pred_num_vert, expected_pred)
+    assert pred_num_vert[0] == 0
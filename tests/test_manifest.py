@@ -0,0 +1,44 @@
+import pytest
+
+from plotter.cache import DerivedCache
+from plotter.manifest import build_manifest
+from plotter.synthetic import make_sample
+
+FIELDS = {"jets": ["isDisplaced"], "tracks": ["z0SinTheta"]}
+
+
+@pytest.fixture(scope="module")
+def sample_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("samples") / "sample.h5")
+    make_sample(path, 5_000, max_tracks=10)
+    return path
+
+
+def test_manifest_of_requested_fields(sample_path):
+    manifest = build_manifest(sample_path, fields=FIELDS)
+    full = build_manifest(sample_path)
+
+    for dataset, fields in FIELDS.items():
+        info = manifest["datasets"][dataset]
+        assert list(info["fields"]) == fields
+        for field in fields:
+            assert info["fields"][field] == full["datasets"][dataset]["fields"][field]
+    assert manifest["datasets"]["jets"]["classes"] == full["datasets"]["jets"]["classes"]
+
+
+def test_cached_manifests(sample_path, tmp_path):
+    cache = DerivedCache(str(tmp_path / "cache"))
+    builds = []
+
+    def build(path, **kwargs):
+        builds.append(kwargs.get("fields"))
+        return build_manifest(path, **kwargs)
+
+    partial = cache.manifest(sample_path, build, FIELDS)
+    assert cache.manifest(sample_path, build, FIELDS) == partial
+    assert builds == [FIELDS]
+
+    # the manifest of the whole file serves every request of fields
+    full = cache.manifest(sample_path, build)
+    assert cache.manifest(sample_path, build, {"tracks": ["valid"]}) == full
+    assert builds == [FIELDS, None]
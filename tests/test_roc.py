@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+from puma.metrics import calc_rej
+
+from plotter.roc import (
+    HistogramRoc,
+    RefinedRoc,
+    SortedRoc,
+    fill_histogram,
+    refine_histograms,
+    roc_bin_edges,
+)
+
+# default efficiency range of the ROC configs
+SIG_EFF = np.linspace(0.95, 1, 100)
+
+# cut values of the ROC configs, and a cut equal to a discriminant of the data
+CUT_VALUES = [0.6, 0.8]
+
+# (number of signal jets, dtype), above 10^6 jets puma's percentiles are computed in float64
+EXACT_CASES = [(20_000, np.float32), (50_000, np.float64), (1_100_000, np.float32)]
+
+
+def make_discriminants(n_sig, n_bkg, dtype, seed=0):
+    """
+    Return signal and background discriminants with overlapping tails.
+    """
+    rng = np.random.default_rng(seed)
+    sig = rng.beta(2, 1, n_sig).astype(dtype)
+    bkg = rng.beta(1, 2, n_bkg).astype(dtype)
+    return sig, bkg
+
+
+def cut_rej_baseline(sig, bkg, cuts):
+    """
+    Rejections at the cut values as computed before the ROC engines: the signal efficiency of
+    every cut, then calc_rej at that efficiency.
+    """
+    return np.array([calc_rej(sig, bkg, np.mean(sig >= cut)) for cut in cuts])
+
+
+def histogram_roc(sig, bkg, n_bins):
+    edges = roc_bin_edges(n_bins)
+    sig_counts = np.zeros(len(edges) - 1, dtype=np.int64)
+    bkg_counts = np.zeros(len(edges) - 1, dtype=np.int64)
+    fill_histogram(sig_counts, edges, sig)
+    fill_histogram(bkg_counts, edges, bkg)
+    return HistogramRoc(edges, sig_counts, bkg_counts, sig.dtype)
+
+
+@pytest.mark.parametrize(
+    "n_sig, dtype, n_bins",
+    [(20_000, np.float32, 10_000), (300_000, np.float32, 1_000), (50_000, np.float64, 100_000)],
+)
+def test_histogram_roc_bounds_contain_calc_rej(n_sig, dtype, n_bins):
+    sig, bkg = make_discriminants(n_sig, 3 * n_sig, dtype)
+    roc = histogram_roc(sig, bkg, n_bins)
+
+    exact = calc_rej(sig, bkg, SIG_EFF)
+    lower, upper = roc.rej_bounds(SIG_EFF)
+    assert np.all(lower <= exact * (1 + 1e-12))
+    assert np.all(exact <= upper * (1 + 1e-12))
+
+    rej = roc.rej(SIG_EFF)
+    assert np.all((lower <= rej) & (rej <= upper))
+
+
+def test_histogram_roc_full_efficiency():
+    # the cut of a signal efficiency of 1 is the minimum signal discriminant
+    sig, bkg = make_discriminants(20_000, 60_000, np.float32)
+    roc = histogram_roc(sig, bkg, 10_000)
+
+    exact = calc_rej(sig, bkg, np.array([1.0]))
+    lower, upper = roc.rej_bounds(1.0)
+    assert lower[0] <= exact[0] <= upper[0]
+    assert roc.rej(1.0) == pytest.approx(exact[0], rel=1e-2)
+
+
+@pytest.mark.parametrize("n_sig, dtype", EXACT_CASES)
+def test_sorted_roc_matches_calc_rej(n_sig, dtype):
+    sig, bkg = make_discriminants(n_sig, 2 * n_sig, dtype)
+    roc = SortedRoc(sig, bkg)
+
+    np.testing.assert_array_equal(roc.rej(SIG_EFF), calc_rej(sig, bkg, SIG_EFF))
+    cuts = CUT_VALUES + [float(sig[0])]
+    np.testing.assert_array_equal(roc.cut_rej(cuts), cut_rej_baseline(sig, bkg, cuts))
+
+
+@pytest.mark.parametrize("n_sig, dtype", EXACT_CASES)
+def test_refined_roc_matches_calc_rej(n_sig, dtype):
+    sig, bkg = make_discriminants(n_sig, 2 * n_sig, dtype)
+    chunk_rows = 30_000
+
+    def read_chunks():
+        for start in range(0, n_sig, chunk_rows):
+            yield sig[start : start + chunk_rows], bkg[2 * start : 2 * (start + chunk_rows)]
+
+    hists = refine_histograms(read_chunks, SIG_EFF, CUT_VALUES, dtype, n_bins=1_000)
+    roc = RefinedRoc(hists, dtype)
+
+    np.testing.assert_array_equal(roc.rej(SIG_EFF), calc_rej(sig, bkg, SIG_EFF))
+    np.testing.assert_array_equal(
+        roc.cut_rej(CUT_VALUES), cut_rej_baseline(sig, bkg, CUT_VALUES)
+    )
@@ -0,0 +1,64 @@
+import h5py
+import numpy as np
+import pytest
+
+from plotter.config_dict import ConfigDict
+from plotter.histograms import fill_folded
+from plotter.plot_classes.sample_info_plot import SampleInfoPlotBase
+from plotter.synthetic import generate_jets, generate_tracks
+
+EDGES = np.linspace(-1, 1, 11)
+
+
+@pytest.fixture(scope="module")
+def sample_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("samples") / "sample.h5")
+    rng = np.random.default_rng(0)
+    jets = generate_jets(rng, 20_000, 0.2)
+    tracks = generate_tracks(rng, jets["isDisplaced"] == 1, max_tracks=10, max_vertices=5)
+    with h5py.File(path, "w") as hdf_file:
+        hdf_file.create_dataset("jets", data=jets)
+        hdf_file.create_dataset("tracks", data=tracks)
+    return path
+
+
+def expected_counts(path, info_df_name, info_type, rows, weights):
+    """
+    Weighted histograms of the selected jets, filled at once.
+    """
+    with h5py.File(path, "r") as hdf_file:
+        labels = hdf_file["jets"]["isDisplaced"][rows]
+        info = hdf_file[info_df_name][info_type][rows]
+    weights = np.broadcast_to(weights.reshape(-1, *([1] * (info.ndim - 1))), info.shape)
+    counts = {}
+    for name, label in (("disp", 1), ("prompt", 0)):
+        counts[name] = np.zeros(len(EDGES) - 1)
+        fill_folded(counts[name], EDGES, info[labels == label], weights[labels == label])
+    return counts
+
+
+@pytest.mark.parametrize("info_df_name, info_type", [("jets", "eta"), ("tracks", "z0SinTheta")])
+def test_subsampled_counts_are_weighted(sample_path, info_df_name, info_type):
+    sample = {"path": sample_path, "label": "A"}
+    plot = SampleInfoPlotBase(
+        samples={"A": sample},
+        info_df_name=info_df_name,
+        info_type=info_type,
+        style={"in_TeV": False},
+        sample_fraction=0.1,
+        chunk_size=700,
+    )
+
+    counts = plot.sample_counts(ConfigDict(sample), EDGES)
+
+    rows, weights = plot.subsample(sample_path)
+    expected = expected_counts(sample_path, info_df_name, info_type, rows, weights)
+    for name in ("disp", "prompt"):
+        np.testing.assert_allclose(counts[name], expected[name])
+    # the weighted counts stand for all the jets of each class
+    if info_df_name == "jets":
+        with h5py.File(sample_path, "r") as hdf_file:
+            labels = hdf_file["jets"]["isDisplaced"][()]
+        np.testing.assert_allclose(counts["disp"].sum(), np.sum(labels == 1))
+        np.testing.assert_allclose(counts["prompt"].sum(), np.sum(labels == 0))
+    assert np.all(counts["disp_sq"] <= counts["disp"] * weights.max())
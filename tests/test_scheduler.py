@@ -0,0 +1,42 @@
+import h5py
+import numpy as np
+
+from plotter.loader import ColumnRequest, ColumnStore
+from plotter.plot_classes.plotbase import PlotBase
+from plotter.scheduler import run_parallel
+
+
+class SumPlot(PlotBase):
+    """
+    Plot reading the jets of a sample and writing the sum of a field.
+    """
+
+    def requirements(self):
+        return [ColumnRequest(self.config.path, "jets", ("pt",))]
+
+    def plot(self):
+        columns = self.store.read(self.config.path, "jets", ("pt",))
+        with open(self.config.file_name, "w") as f:
+            f.write(str(columns["pt"].sum()))
+
+
+def test_parallel_run_releases_the_columns_in_the_parent(tmp_path):
+    path = str(tmp_path / "sample.h5")
+    with h5py.File(path, "w") as hdf_file:
+        hdf_file.create_dataset("jets", data=np.zeros(1_000, dtype=[("pt", "f4")]))
+
+    # a long-lived store, as in the watch mode or the render server
+    store = ColumnStore(keep_loaded=True, max_kept_bytes=1)
+    plots = [SumPlot(path=path, file_name=str(tmp_path / f"{i}.txt")) for i in range(3)]
+    requirements = [plot.requirements() for plot in plots]
+    for plot, requests in zip(plots, requirements):
+        plot.store = store
+        store.plan(requests)
+
+    failures = run_parallel(["a", "b", "c"], plots, requirements, store, jobs=2)
+
+    assert failures == []
+    assert all((tmp_path / f"{i}.txt").exists() for i in range(3))
+    # the datasets preloaded for the plots are no longer planned, so the cap evicts them
+    assert store._consumers == {} and store._plan == {}
+    assert not store.is_loaded(path, "jets", ("pt",))
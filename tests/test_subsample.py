@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from plotter.subsample import stratified_rows, subsample_fraction
+
+
+def test_stratified_rows_keep_the_fraction_of_every_class():
+    labels = np.repeat([0, 1, 2], [9_000, 1_000, 3])
+    rows, weights = stratified_rows(labels, 0.1, seed=3)
+
+    assert np.all(np.diff(rows) > 0)
+    np.testing.assert_array_equal(np.bincount(labels[rows]), [900, 100, 1])
+    # the weights of every class add up to its number of jets
+    np.testing.assert_allclose(np.bincount(labels[rows], weights), [9_000, 1_000, 3])
+
+    # the same seed selects the same jets
+    same_rows, same_weights = stratified_rows(labels, 0.1, seed=3)
+    np.testing.assert_array_equal(rows, same_rows)
+    np.testing.assert_array_equal(weights, same_weights)
+
+
+@pytest.mark.parametrize("labels", [np.array([0.0, np.nan, 1.0, 1.0, np.nan]), np.zeros(0)])
+def test_stratified_rows_skip_jets_without_class(labels):
+    rows, weights = stratified_rows(labels, 0.5)
+
+    assert not np.any(np.isnan(labels[rows]))
+    np.testing.assert_allclose(np.sum(weights), np.sum(~np.isnan(labels)))
+
+
+def test_subsample_fraction():
+    assert subsample_fraction(1_000) == 1.0
+    assert subsample_fraction(1_000, sample_fraction=0.2, max_jets=100) == 0.1
+    assert subsample_fraction(0, max_jets=100) == 1.0
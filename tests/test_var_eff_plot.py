@@ -0,0 +1,68 @@
+import h5py
+import numpy as np
+import pytest
+
+from plotter.config_dict import ConfigDict
+from plotter.efficiency import fill_cut_histogram, score_cuts
+from plotter.jet_variables import count_true_vertices
+from plotter.plot_classes.var_eff_plot import VarEffPlotBase
+from plotter.synthetic import generate_jets, generate_tracks
+
+BIN_EDGES = [0, 1, 2, 3, 4, 6]
+WORKING_POINTS = [0.5, 0.9]
+
+
+@pytest.fixture(scope="module")
+def sample_path(tmp_path_factory):
+    """
+    Sample whose jets and tracks datasets have different HDF5 chunks.
+    """
+    path = str(tmp_path_factory.mktemp("samples") / "sample.h5")
+    rng = np.random.default_rng(0)
+    jets = generate_jets(rng, 25_000, 0.5)
+    tracks = generate_tracks(rng, jets["isDisplaced"] == 1, max_tracks=10, max_vertices=5)
+    with h5py.File(path, "w") as hdf_file:
+        hdf_file.create_dataset("jets", data=jets, chunks=(10_000,))
+        hdf_file.create_dataset("tracks", data=tracks, chunks=(1_000, 10))
+    return path
+
+
+def expected_histograms(path):
+    with h5py.File(path, "r") as hdf_file:
+        jets = hdf_file["jets"][()]
+        tracks = hdf_file["tracks"][()]
+    x = count_true_vertices(tracks, False)
+    disc = jets["GN2ej_pdispjet"]
+    cuts = score_cuts(WORKING_POINTS, disc.dtype)
+    hists = {}
+    for name, label in (("sig", 1), ("bkg", 0)):
+        counts = np.zeros((len(BIN_EDGES) - 1, len(cuts) + 1), dtype=np.int64)
+        selected = jets["isDisplaced"] == label
+        fill_cut_histogram(counts, np.asarray(BIN_EDGES), cuts, x[selected], disc[selected])
+        hists[name] = counts
+    return hists
+
+
+@pytest.mark.parametrize("chunk_size, preloaded", [(5_000, False), (7_000, False), (5_000, True)])
+def test_track_variable_histograms_with_different_chunking(sample_path, chunk_size, preloaded):
+    sample = {"path": sample_path, "label": "A", "df_name": "tracks"}
+    plot = VarEffPlotBase(
+        samples={"A": sample},
+        variable="true_vertices",
+        binedges=BIN_EDGES,
+        working_point=WORKING_POINTS,
+        chunk_size=chunk_size,
+    )
+    sample_config = ConfigDict(sample)
+    params = plot.curve_params(sample_config)
+    if preloaded:
+        # columns in memory are sliced in blocks of exactly chunk_size rows
+        plot.store.plan(plot.requirements())
+        for request in plot.requirements():
+            plot.store.read(request.path, request.dataset, request.fields)
+
+    hists = plot.fill_histograms(sample_config, params)
+
+    expected = expected_histograms(sample_path)
+    np.testing.assert_array_equal(hists["sig"], expected["sig"])
+    np.testing.assert_array_equal(hists["bkg"], expected["bkg"])
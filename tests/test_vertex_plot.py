@@ -0,0 +1,65 @@
+import numpy as np
+
+from plotter.plot_classes.vertex_plot import VI_SHADES, make_VImats
+
+
+def make_VImats_baseline(true_vi, pred_vi, pred_pileup, pred_fake, pred_prompt, pred_disp):
+    """
+    Vertex index matrices of a jet built track pair by track pair, as by the original
+    VertexPlotBase, with the shades as entries.
+    """
+    n = len(true_vi)
+    mat_true = np.ones((n, n))
+    mat_pred = np.ones((n, n))
+
+    for i in range(n):
+        if true_vi[i] == -2:
+            mat_true[i][i] = 0
+        else:
+            for j in range(n):
+                if true_vi[j] == true_vi[i]:
+                    mat_true[i][j] = 0
+
+    for i, (pu, fk, pr, dp) in enumerate(zip(pred_pileup, pred_fake, pred_prompt, pred_disp)):
+        origin = max(pu, fk, pr, dp)
+        if (origin == pu) or (origin == fk):
+            pair = False
+            for j in range(n):
+                if pred_vi[j] == pred_vi[i]:
+                    mat_pred[i][j] = 0
+                    pair = True
+            if pair:
+                mat_pred[i][i] = 0.01
+            else:
+                mat_pred[i][i] = 0
+        elif (origin == pr) or (origin == dp):
+            for j in range(n):
+                if pred_vi[j] == pred_vi[i]:
+                    mat_pred[i][j] = 0
+    return [mat_true, mat_pred]
+
+
+def make_jet(rng, n_tracks):
+    """
+    Return the sorted truth vertex indices, predicted vertex indices and origin scores of a jet,
+    with pileup tracks (truth index -2) and tied origin scores.
+    """
+    true_vi = np.sort(rng.integers(-2, 4, n_tracks))
+    pred_vi = rng.integers(0, 5, n_tracks)
+    scores = rng.dirichlet(np.ones(4), n_tracks).astype(np.float32)
+    tied = rng.random(n_tracks) < 0.1
+    scores[tied, 3] = scores[tied].max(axis=1)
+    scores[tied, 1] = scores[tied, 3]
+    return true_vi, pred_vi, *scores.T
+
+
+def test_make_VImats_matches_baseline():
+    rng = np.random.default_rng(0)
+    for n_tracks in (0, 1, 7, 40):
+        jet = make_jet(rng, n_tracks)
+        mat_true, mat_pred = make_VImats(*jet)
+        expected_true, expected_pred = make_VImats_baseline(*jet)
+
+        assert mat_true.dtype == np.uint8 and mat_pred.dtype == np.uint8
+        np.testing.assert_array_equal(VI_SHADES[mat_true], expected_true)
+        np.testing.assert_array_equal(VI_SHADES[mat_pred], expected_pred)